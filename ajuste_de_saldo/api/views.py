@@ -5,10 +5,11 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from django.db import DatabaseError
-from django.db.models import Q
-from datetime import datetime
 
 from ..models import AjusteDeSaldo
+from backend.history_diff import diff_historial
+from backend.listing import ListSpec, listar, campos, relacion, usuario_anidado
+from reportes.cierres import PeriodoCerrado
 from .permissions import RolePermission
 
 
@@ -56,6 +57,8 @@ def create_ajuste_de_saldo(request):
 
         return Response(serialize_ajuste_de_saldo(ajuste), status=status.HTTP_201_CREATED)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -68,104 +71,26 @@ def create_ajuste_de_saldo(request):
         )
 
 
+LISTADO_AJUSTES_DE_SALDO = ListSpec(
+    queryset=AjusteDeSaldo.objects.select_related('usuario', 'cliente'),
+    serializer=serialize_ajuste_de_saldo,
+    search_fields=('cliente__nombre', 'observacion'),
+    filters={'cliente': 'cliente_id', 'usuario': 'usuario_id'},
+    date_ranges=('fecha',),
+    fields=campos(
+        'id', 'valor', 'observacion', 'fecha', 'created_at', 'updated_at', 'deleted_at',
+        usuario=usuario_anidado('usuario'),
+        cliente=relacion('cliente', 'nombre'),
+    ),
+)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_ajustes_de_saldo(request):
     """Listar ajustes de saldo con filtros y paginación"""
     try:
-        ajustes = AjusteDeSaldo.objects.select_related(
-            'usuario', 'cliente'
-        ).all()
-
-        # Filtro de búsqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            ajustes = ajustes.filter(
-                Q(cliente__nombre__icontains=search_query) |
-                Q(observacion__icontains=search_query)
-            )
-
-        # Filtro por cliente
-        cliente_id = request.query_params.get('cliente', None)
-        if cliente_id:
-            ajustes = ajustes.filter(cliente_id=cliente_id)
-
-        # Filtro por usuario
-        usuario_id = request.query_params.get('usuario', None)
-        if usuario_id:
-            ajustes = ajustes.filter(usuario_id=usuario_id)
-
-        # Filtro por fecha
-        fecha_start = request.query_params.get('fecha_start', None)
-        fecha_end = request.query_params.get('fecha_end', None)
-
-        if fecha_start:
-            try:
-                start_date = datetime.strptime(fecha_start, '%Y-%m-%d').date()
-                ajustes = ajustes.filter(fecha__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_start debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if fecha_end:
-            try:
-                end_date = datetime.strptime(fecha_end, '%Y-%m-%d').date()
-                ajustes = ajustes.filter(fecha__lte=end_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_end debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro por fecha de creación
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                ajustes = ajustes.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                ajustes = ajustes.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            ajustes = ajustes.filter(deleted_at__isnull=True)
-
-        # Ordenar
-        ajustes = ajustes.order_by('-created_at')
-
-        # Paginación
-        page_size_param = request.query_params.get('page_size', 10)
-        try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
-
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_ajustes = paginator.paginate_queryset(ajustes, request)
-
-        data = [serialize_ajuste_de_saldo(a) for a in paginated_ajustes]
-        return paginator.get_paginated_response(data)
-
+        return listar(request, LISTADO_AJUSTES_DE_SALDO)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener ajustes de saldo: {str(e)}"},
@@ -210,6 +135,8 @@ def update_ajuste_de_saldo(request, pk):
 
         return Response(serialize_ajuste_de_saldo(ajuste), status=status.HTTP_200_OK)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -233,6 +160,8 @@ def delete_ajuste_de_saldo(request, pk):
             {"message": "Ajuste de saldo eliminado correctamente"},
             status=status.HTTP_200_OK
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar ajuste de saldo: {str(e)}"},
@@ -253,6 +182,8 @@ def restore_ajuste_de_saldo(request, pk):
             )
         ajuste.restore()
         return Response(serialize_ajuste_de_saldo(ajuste), status=status.HTTP_200_OK)
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al restaurar ajuste de saldo: {str(e)}"},
@@ -271,6 +202,8 @@ def hard_delete_ajuste_de_saldo(request, pk):
             {"message": "Ajuste de saldo eliminado permanentemente"},
             status=status.HTTP_204_NO_CONTENT
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar ajuste de saldo: {str(e)}"},
@@ -284,7 +217,7 @@ def ajuste_de_saldo_history(request, pk):
     """Obtener el historial de cambios de un ajuste de saldo"""
     try:
         ajuste = get_object_or_404(AjusteDeSaldo.objects, pk=pk)
-        history = ajuste.history.all()
+        history = ajuste.history.select_related('history_user')
 
         # Paginación
         page_size_param = request.query_params.get('page_size', 10)
@@ -297,6 +230,10 @@ def ajuste_de_saldo_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
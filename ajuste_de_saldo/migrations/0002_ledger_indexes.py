@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ajuste_de_saldo', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ajustedesaldo',
+            index=models.Index(fields=['deleted_at', 'created_at'], name='ajuste_del_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ajustedesaldo',
+            index=models.Index(fields=['cliente', 'deleted_at', 'fecha'], name='ajuste_cli_del_fecha_idx'),
+        ),
+    ]
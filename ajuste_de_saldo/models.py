@@ -2,8 +2,9 @@ from django.db import models
 from django.conf import settings
 from clientes.models import Cliente 
 from simple_history.models import HistoricalRecords
+from backend.atomic import GuardadoAtomico
 
-class AjusteDeSaldo(models.Model):
+class AjusteDeSaldo(GuardadoAtomico, models.Model):
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -31,6 +32,10 @@ class AjusteDeSaldo(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Ajuste De Saldo'
         verbose_name_plural = 'Ajustes De Saldo'
+        indexes = [
+            models.Index(fields=['deleted_at', 'created_at'], name='ajuste_del_created_idx'),
+            models.Index(fields=['cliente', 'deleted_at', 'fecha'], name='ajuste_cli_del_fecha_idx'),
+        ]
 
     def __str__(self):
         return f'AjusteDeSaldo {self.id} - Cliente: {self.cliente} - Valor: {self.valor}'
@@ -0,0 +1,23 @@
+"""
+Escritura atómica de movimientos con totales materializados.
+
+Los saldos por cliente (clientes.saldos) y los resúmenes diarios por tarjeta
+(tarjetas.saldos) se actualizan en señales post_save / post_delete, es decir
+en escrituras separadas de la del movimiento. En autocommit, un error entre
+ambas dejaría el total desfasado.
+
+GuardadoAtomico envuelve save() en transaction.atomic(): el movimiento y los
+deltas de sus señales se confirman o se revierten juntos. delete() no lo
+necesita: el Collector de Django ya borra y envía post_delete dentro de una
+transacción.
+"""
+from django.db import router, transaction
+
+
+class GuardadoAtomico:
+    """Mixin de modelo: save() y sus señales en una sola transacción"""
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
@@ -0,0 +1,85 @@
+"""
+GET condicional (ETag / Last-Modified) para los endpoints que se consultan
+periódicamente.
+
+Los validadores se calculan con una consulta agregada (max(updated_at) y
+número de filas) sobre el mismo queryset que se va a devolver, más la huella
+de los query params y del formato de respuesta. Si el cliente envía
+If-None-Match / If-Modified-Since y nada cambió, se responde 304 sin leer ni
+serializar las filas.
+
+El número de filas cubre los borrados físicos y los registros que salen del
+filtro; los borrados lógicos y los cambios de etapa ya actualizan updated_at.
+If-Modified-Since solo compara la fecha: en los listados un borrado físico no
+la mueve, así que ahí se ignora y solo valida el ETag (usar_fecha=False).
+Los datos anidados de otras tablas (p. ej. el nombre del cliente dentro de un
+cotizador) no forman parte del validador salvo que se pasen en relaciones.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def huella(*partes):
+    return hashlib.sha1('|'.join(str(parte) for parte in partes).encode('utf-8')).hexdigest()
+
+
+def huella_peticion(request):
+    """Query params (ordenados) y formato de la respuesta: la misma URL en otro formato es otra representación"""
+    parametros = sorted((clave, sorted(valores)) for clave, valores in request.query_params.lists())
+    formato = getattr(getattr(request, 'accepted_renderer', None), 'format', '')
+    return huella(request.path, parametros, formato)
+
+
+def agregados_validadores(queryset, relaciones=()):
+    """
+    max(updated_at) y conteo del queryset ('ultimo', 'total'), y de cada
+    relación en relaciones (p. ej. 'precios'), en una sola consulta.
+    """
+    agregados = {'ultimo': Max('updated_at'), 'total': Count('pk', distinct=bool(relaciones))}
+    for relacion in relaciones:
+        agregados[f'{relacion}_ultimo'] = Max(f'{relacion}__updated_at')
+        agregados[f'{relacion}_total'] = Count(f'{relacion}__pk', distinct=True)
+    return queryset.order_by().aggregate(**agregados)
+
+
+def validadores(request, queryset, relaciones=(), valores=None):
+    """
+    (etag, last_modified) del queryset a partir de agregados_validadores();
+    valores permite pasar esos agregados si ya se calcularon (p. ej. para
+    reutilizar 'total' como conteo del paginador).
+    """
+    if valores is None:
+        valores = agregados_validadores(queryset, relaciones)
+
+    fechas = [valores['ultimo']] + [valores[f'{relacion}_ultimo'] for relacion in relaciones]
+    fechas = [fecha for fecha in fechas if fecha is not None]
+    ultimo = max(fechas) if fechas else None
+    etag = huella(queryset.model._meta.label, huella_peticion(request), *sorted(valores.items()))
+    return etag, ultimo
+
+
+def no_modificado(request, etag, ultimo, usar_fecha=True):
+    """
+    HttpResponseNotModified (con sus validadores) si el cliente ya tiene esta
+    versión, o None. Con usar_fecha=False If-Modified-Since no produce 304.
+    """
+    response = get_conditional_response(
+        request,
+        etag=quote_etag(etag),
+        last_modified=int(ultimo.timestamp()) if ultimo and usar_fecha else None,
+    )
+    if response is not None:
+        agregar_validadores(response, etag, ultimo)
+    return response
+
+
+def agregar_validadores(response, etag, ultimo):
+    """ETag / Last-Modified en la respuesta; no-cache obliga a revalidar en cada consulta"""
+    response['ETag'] = quote_etag(etag)
+    if ultimo:
+        response['Last-Modified'] = http_date(ultimo.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    return response
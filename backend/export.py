@@ -0,0 +1,58 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en lugar de guardarla"""
+
+    def write(self, value):
+        return value
+
+
+def _despues_de(campos, valores):
+    """Condición (a, b, ...) > (va, vb, ...) en orden lexicográfico"""
+    filtro = Q()
+    for i, campo in enumerate(campos):
+        condicion = Q(**{f'{campo}__gt': valores[i]})
+        for previo, valor in zip(campos[:i], valores[:i]):
+            condicion &= Q(**{previo: valor})
+        filtro |= condicion
+    return filtro
+
+
+def iterar_por_lotes(queryset, orden=('id',), chunk_size=2000):
+    """
+    Recorre un queryset de .values() en lotes de chunk_size por keyset sobre
+    los campos de `orden` (ascendente, el último debe ser único).
+
+    El driver de MySQL carga el resultado completo en memoria aunque se use
+    .iterator(), así que cada lote es una consulta independiente que busca
+    a partir de la última fila del lote anterior: la memoria queda acotada
+    a un lote sin importar cuántas filas devuelva la exportación.
+    """
+    queryset = queryset.order_by(*orden)
+    ultimo = None
+    while True:
+        lote_qs = queryset if ultimo is None else queryset.filter(_despues_de(orden, ultimo))
+        lote = list(lote_qs[:chunk_size].iterator(chunk_size=chunk_size))
+        yield from lote
+        if len(lote) < chunk_size:
+            return
+        ultimo = [lote[-1][campo] for campo in orden]
+
+
+def stream_csv(filas, columnas):
+    """Genera un CSV línea por línea a partir de diccionarios"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(columnas)
+    for fila in filas:
+        yield writer.writerow([fila[columna] for columna in columnas])
+
+
+def stream_ndjson(filas, columnas):
+    """Genera NDJSON (un objeto JSON por línea) a partir de diccionarios"""
+    for fila in filas:
+        yield json.dumps({columna: fila[columna] for columna in columnas}, cls=DjangoJSONEncoder) + '\n'
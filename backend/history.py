@@ -0,0 +1,169 @@
+"""
+Escritura de historial (simple_history) en lotes, fuera de la petición.
+
+BufferedHistoricalRecords se declara igual que HistoricalRecords. Con
+SIMPLE_HISTORY_BUFFERED = False (por defecto) se comporta exactamente igual.
+Con SIMPLE_HISTORY_BUFFERED = True:
+
+1. En el save()/delete() se arma el registro histórico (snapshot, fecha,
+   usuario y motivo del cambio se capturan en ese momento) pero no se inserta.
+2. Al confirmarse la transacción (transaction.on_commit) el registro pasa a
+   la cola del proceso; si la transacción se revierte, se descarta junto con
+   el cambio.
+3. Un hilo en segundo plano vacía la cola cada SIMPLE_HISTORY_FLUSH_INTERVAL
+   segundos, o antes si se acumulan SIMPLE_HISTORY_BATCH_SIZE registros, con
+   un bulk_create por modelo histórico.
+4. Al terminar el proceso (atexit) se vacía lo pendiente. Si un lote falla,
+   sus registros vuelven a la cola y se reintentan en el siguiente vaciado.
+
+En modo diferido la señal post_create_historical_record no se envía (el
+registro todavía no existe en la base de datos cuando termina el save()).
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from simple_history.models import HistoricalRecords
+from simple_history.signals import pre_create_historical_record
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryBuffer:
+    """Cola de registros históricos pendientes, compartida por todo el proceso"""
+
+    def __init__(self, batch_size=500, flush_interval=1.0, start_worker=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.start_worker = start_worker
+        self.pendientes = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.despertar = threading.Event()
+        self.detener = threading.Event()
+        self.worker = None
+
+    def add(self, using, history_instance):
+        with self.lock:
+            self.pendientes.append((using, history_instance))
+            lleno = len(self.pendientes) >= self.batch_size
+        self.ensure_worker()
+        if lleno:
+            self.despertar.set()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pendientes)
+
+    def flush(self):
+        """Inserta todo lo pendiente; devuelve cuántos registros se escribieron"""
+        with self.flush_lock:
+            with self.lock:
+                lote, self.pendientes = self.pendientes, []
+            if not lote:
+                return 0
+
+            grupos = defaultdict(list)
+            for using, history_instance in lote:
+                grupos[(type(history_instance), using)].append(history_instance)
+
+            escritos = 0
+            fallidos = []
+            for (model, using), registros in grupos.items():
+                try:
+                    model._default_manager.using(using).bulk_create(registros, batch_size=self.batch_size)
+                    escritos += len(registros)
+                except Exception:
+                    logger.exception('No se pudo escribir el historial de %s; se reintentará', model.__name__)
+                    fallidos.extend((using, registro) for registro in registros)
+
+            if fallidos:
+                with self.lock:
+                    self.pendientes[:0] = fallidos
+            return escritos
+
+    def ensure_worker(self):
+        if not self.start_worker or (self.worker is not None and self.worker.is_alive()):
+            return
+        with self.lock:
+            if self.worker is not None and self.worker.is_alive():
+                return
+            self.worker = threading.Thread(target=self.run, name='history-buffer', daemon=True)
+            self.worker.start()
+
+    def run(self):
+        while not self.detener.is_set():
+            self.despertar.wait(self.flush_interval)
+            self.despertar.clear()
+            close_old_connections()
+            self.flush()
+
+    def shutdown(self):
+        """Detiene el hilo y escribe lo pendiente (se registra con atexit)"""
+        self.detener.set()
+        self.despertar.set()
+        if self.worker is not None and self.worker is not threading.current_thread():
+            self.worker.join(timeout=self.flush_interval + 5)
+        self.flush()
+        if len(self):
+            logger.error('%s registros de historial no se pudieron escribir al terminar', len(self))
+
+
+history_buffer = HistoryBuffer(
+    batch_size=getattr(settings, 'SIMPLE_HISTORY_BATCH_SIZE', 500),
+    flush_interval=getattr(settings, 'SIMPLE_HISTORY_FLUSH_INTERVAL', 1.0),
+)
+atexit.register(history_buffer.shutdown)
+
+
+class BufferedHistoricalRecords(HistoricalRecords):
+    """HistoricalRecords que, con SIMPLE_HISTORY_BUFFERED, difiere el INSERT a history_buffer"""
+
+    def create_historical_record(self, instance, history_type, using=None):
+        if not getattr(settings, 'SIMPLE_HISTORY_BUFFERED', False):
+            return super().create_historical_record(instance, history_type, using=using)
+
+        using = using if self.use_base_model_db else None
+        history_date = getattr(instance, '_history_date', timezone.now())
+        history_user = self.get_history_user(instance)
+        history_change_reason = self.get_change_reason_for_object(instance, history_type, using)
+        manager = getattr(instance, self.manager_name)
+
+        attrs = {}
+        for field in self.fields_included(instance):
+            attrs[field.attname] = getattr(instance, field.attname)
+
+        relation_field = getattr(manager.model, 'history_relation', None)
+        if relation_field is not None:
+            attrs['history_relation'] = instance
+
+        history_instance = manager.model(
+            history_date=history_date,
+            history_type=history_type,
+            history_user=history_user,
+            history_change_reason=history_change_reason,
+            **attrs,
+        )
+
+        # Los historiales con m2m necesitan el id del registro para sus filas: se escriben en línea
+        if history_instance._history_m2m_fields:
+            return super().create_historical_record(instance, history_type, using=using)
+
+        pre_create_historical_record.send(
+            sender=manager.model,
+            instance=instance,
+            history_date=history_date,
+            history_user=history_user,
+            history_change_reason=history_change_reason,
+            history_instance=history_instance,
+            using=using,
+        )
+
+        transaction.on_commit(
+            lambda: history_buffer.add(using, history_instance),
+            using=using,
+        )
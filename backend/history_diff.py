@@ -0,0 +1,83 @@
+"""
+Modo diff para los endpoints *_history: en lugar del snapshot completo de
+cada registro devuelve solo los campos que cambiaron respecto al registro
+anterior del mismo objeto (HistoricalRecord.diff_against).
+
+El registro anterior al último de la página se busca con una sola consulta
+extra, así que cada página se puede mostrar sin pedir la siguiente.
+"""
+from decimal import Decimal
+
+from django.db.models import Q
+
+
+def serialize_history_user(user):
+    if user is None:
+        return None
+    return {
+        'id': user.id,
+        'username': user.username,
+        'name': f"{user.first_name} {user.last_name}".strip(),
+    }
+
+
+def valor_diff(valor):
+    """Los montos se devuelven como str, igual que en los snapshots"""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def registro_anterior(history, registro):
+    """Registro inmediatamente anterior (history_date, history_id) dentro del mismo historial"""
+    return history.filter(
+        Q(history_date__lt=registro.history_date) |
+        Q(history_date=registro.history_date, history_id__lt=registro.history_id)
+    ).order_by('-history_date', '-history_id').first()
+
+
+def cambios_creacion(registro):
+    """Un registro sin anterior (creación) reporta todos sus campos como nuevos"""
+    cambios = []
+    for field in registro.tracked_fields:
+        if not field.editable:
+            continue
+        valor = getattr(registro, field.attname)
+        if valor in (None, ''):
+            continue
+        cambios.append({'campo': field.name, 'anterior': None, 'nuevo': valor_diff(valor)})
+    return cambios
+
+
+def diff_historial(pagina, history):
+    """
+    Serializa una página de registros históricos (orden -history_date,
+    -history_id) con solo los campos modificados en cada uno. `history` es
+    el queryset completo del historial del objeto.
+    """
+    pagina = list(pagina)
+    if not pagina:
+        return []
+
+    anteriores = pagina[1:] + [registro_anterior(history, pagina[-1])]
+
+    data = []
+    for registro, anterior in zip(pagina, anteriores):
+        if anterior is None:
+            cambios = cambios_creacion(registro)
+        else:
+            delta = registro.diff_against(anterior)
+            cambios = [
+                {'campo': cambio.field, 'anterior': valor_diff(cambio.old), 'nuevo': valor_diff(cambio.new)}
+                for cambio in delta.changes
+            ]
+
+        data.append({
+            'history_id': registro.history_id,
+            'history_date': registro.history_date,
+            'history_type': registro.history_type,
+            'history_type_display': registro.get_history_type_display(),
+            'history_user': serialize_history_user(registro.history_user),
+            'cambios': cambios,
+        })
+    return data
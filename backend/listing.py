@@ -0,0 +1,383 @@
+"""
+Motor común de los endpoints list_*.
+
+Cada app declara su listado con un ListSpec (queryset base, serializador,
+campos de búsqueda, filtros por query param y rangos de fecha) y la vista
+solo llama a listar(request, SPEC). Todos los listados comparten así los
+mismos parámetros:
+
+- search: texto libre sobre search_fields (o la función search del spec)
+- <filtro>=valor: un parámetro por entrada de filters; el valor se valida
+  con el campo del modelo (ids enteros, opciones de choices)
+- start_date / end_date: rango inclusivo sobre created_at (YYYY-MM-DD)
+- <rango>_start / <rango>_end: rangos adicionales declarados en date_ranges
+- include_deleted=1: incluye los registros con borrado lógico
+- page / page_size: paginación por número de página (por defecto 10)
+- count=0: omite el COUNT(*); la respuesta no trae 'count'
+- cursor: paginación por cursor sobre (created_at, id), ver KeysetPagination
+- fields=a,b,c: devuelve solo esas claves de cada resultado
+- If-None-Match: 304 si el resultado no cambió (ver backend/conditional.py);
+  If-Modified-Since se ignora porque no ve los borrados físicos. Solo en la
+  paginación por número de página con count: los validadores se calculan
+  con una consulta agregada sobre todo el filtro, que es justo lo que
+  ?count=0 y ?cursor= evitan
+
+Si el spec declara sus campos (fields={clave: Campo}), ?fields= no
+serializa objetos completos: el listado hace un .values() con solo las
+columnas de las claves pedidas y sin los select_related/prefetch del
+queryset base, así que solo se hacen los JOIN de las relaciones pedidas.
+
+Todos los parámetros se validan antes de consultar la base de datos; un
+parámetro inválido produce 400 {"error": ...}.
+"""
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.encoding import force_str
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from .conditional import agregados_validadores, agregar_validadores, no_modificado, validadores
+from .pagination import CountedPageNumberPagination, KeysetPagination, InvalidCursor, NoCountPagination
+
+FORMATO_FECHA = '%Y-%m-%d'
+
+MENSAJES_FECHA = {
+    'start_date': "El formato de la fecha de inicio debe ser YYYY-MM-DD.",
+    'end_date': "El formato de la fecha de fin debe ser YYYY-MM-DD.",
+}
+
+DEFAULT_PAGE_SIZE = 10
+
+
+def leer_fecha(query_params, param):
+    """Fecha YYYY-MM-DD del query param (None si no viene); lanza ValueError si el formato es inválido"""
+    valor = query_params.get(param, None)
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, FORMATO_FECHA).date()
+    except ValueError:
+        raise ValueError(MENSAJES_FECHA.get(param, f"El formato de {param} debe ser YYYY-MM-DD."))
+
+
+def filtrar_rango_fechas(queryset, campo, query_params, param_inicio='start_date', param_fin='end_date'):
+    """
+    Filtra campo entre las fechas de param_inicio y param_fin (ambas
+    inclusivas: el fin cubre el día completo). Lanza ValueError si alguna
+    fecha tiene formato inválido.
+    """
+    inicio = leer_fecha(query_params, param_inicio)
+    fin = leer_fecha(query_params, param_fin)
+    if inicio:
+        queryset = queryset.filter(**{f'{campo}__gte': timezone.make_aware(datetime.combine(inicio, time.min))})
+    if fin:
+        queryset = queryset.filter(**{f'{campo}__lte': timezone.make_aware(datetime.combine(fin, time.max))})
+    return queryset
+
+
+def leer_campos(query_params):
+    """Claves pedidas en ?fields=a,b,c (None si no se pidió selección)"""
+    valor = query_params.get('fields', None)
+    if not valor:
+        return None
+    campos = [campo.strip() for campo in valor.split(',') if campo.strip()]
+    if not campos:
+        raise ValueError("El parámetro fields no contiene campos.")
+    return campos
+
+
+def seleccionar_campos(data, campos):
+    """Recorta cada resultado a las claves pedidas; lanza ValueError si alguna no existe"""
+    if not campos or not data:
+        return data
+    desconocidos = [campo for campo in campos if campo not in data[0]]
+    if desconocidos:
+        raise ValueError(
+            f"Campos inválidos: {', '.join(desconocidos)}. Opciones: {', '.join(data[0].keys())}"
+        )
+    return [{campo: fila[campo] for campo in campos} for fila in data]
+
+
+def valor_json(valor):
+    """Los montos se devuelven como str, igual que en los serialize_*"""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+class Campo:
+    """
+    Clave de un listado servida desde .values(): las columnas (rutas de
+    values) que necesita, las anotaciones que hay que agregar y la función
+    que arma el valor a partir de la fila.
+    """
+
+    def __init__(self, columnas, valor, anotaciones=None):
+        self.columnas = tuple(columnas)
+        self.valor = valor
+        self.anotaciones = dict(anotaciones or {})
+
+
+def columna(ruta):
+    """Columna tal cual (p. ej. 'placa', 'cliente_id' o 'etiqueta__nombre')"""
+    return Campo((ruta,), lambda fila: valor_json(fila[ruta]))
+
+
+def display(campo, choices):
+    """Equivalente a get_<campo>_display()"""
+    etiquetas = dict(choices)
+    return Campo((campo,), lambda fila: force_str(etiquetas.get(fila[campo], fila[campo]), strings_only=True))
+
+
+def relacion(nombre, *campos):
+    """Objeto anidado {'id': ..., campo: ...} de una FK, o None si no tiene"""
+    columnas = (f'{nombre}_id',) + tuple(f'{nombre}__{campo}' for campo in campos)
+
+    def valor(fila):
+        if fila[f'{nombre}_id'] is None:
+            return None
+        return {'id': fila[f'{nombre}_id'], **{campo: valor_json(fila[f'{nombre}__{campo}']) for campo in campos}}
+    return Campo(columnas, valor)
+
+
+def nombre_usuario(nombre):
+    """"Nombre Apellido" del usuario de la FK, o None si no tiene"""
+    columnas = (f'{nombre}_id', f'{nombre}__first_name', f'{nombre}__last_name')
+
+    def valor(fila):
+        if fila[f'{nombre}_id'] is None:
+            return None
+        return f"{fila[f'{nombre}__first_name']} {fila[f'{nombre}__last_name']}".strip()
+    return Campo(columnas, valor)
+
+
+def usuario_anidado(nombre):
+    """Objeto {'id': ..., 'name': ...} del usuario de la FK, o None si no tiene"""
+    nombre_completo = nombre_usuario(nombre)
+
+    def valor(fila):
+        if fila[f'{nombre}_id'] is None:
+            return None
+        return {'id': fila[f'{nombre}_id'], 'name': nombre_completo.valor(fila)}
+    return Campo(nombre_completo.columnas, valor)
+
+
+def campos(*columnas, **especiales):
+    """Declaración de fields de un ListSpec: columnas simples por nombre y el resto como Campo"""
+    declarados = {nombre: columna(nombre) for nombre in columnas}
+    declarados.update(especiales)
+    return declarados
+
+
+class ListSpec:
+    """
+    Descripción declarativa de un listado.
+
+    - queryset: QuerySet base o función que lo construye (p. ej. con Prefetch/annotate)
+    - serializer: función objeto -> dict (los serialize_* de cada app)
+    - search_fields: campos para ?search= (OR de icontains)
+    - search: función (queryset, texto) -> queryset, en lugar de search_fields
+    - filters: {query param: campo del modelo}, filtro por igualdad
+    - date_ranges: campos con rango ?<campo>_start / ?<campo>_end, además de created_at
+    - extra_filters: funciones (queryset, query_params) -> queryset que lanzan ValueError
+    - soft_delete: excluye deleted_at no nulo salvo ?include_deleted=1
+    - fields: {clave: Campo} que se pueden pedir con ?fields= (ver campos())
+    """
+
+    def __init__(self, queryset, serializer, search_fields=(), search=None, filters=None,
+                 date_ranges=(), extra_filters=(), soft_delete=True, ordering=('-created_at', '-id'),
+                 fields=None):
+        self.queryset = queryset
+        self.serializer = serializer
+        self.search_fields = tuple(search_fields)
+        self.search = search
+        self.filters = dict(filters or {})
+        self.date_ranges = tuple(date_ranges)
+        self.extra_filters = tuple(extra_filters)
+        self.soft_delete = soft_delete
+        self.ordering = tuple(ordering)
+        self.fields = dict(fields or {})
+
+    def get_queryset(self):
+        if callable(self.queryset):
+            return self.queryset()
+        return self.queryset.all()
+
+    @property
+    def model(self):
+        return self.get_queryset().model
+
+    def queryset_parcial(self, claves, con_cursor=False):
+        """
+        .values() con solo las columnas (y anotaciones) de las claves pedidas,
+        sobre el manager del modelo: sin select_related ni prefetch del
+        queryset base. Lanza ValueError si alguna clave no está declarada.
+        """
+        desconocidas = [clave for clave in claves if clave not in self.fields]
+        if desconocidas:
+            raise ValueError(
+                f"Campos inválidos: {', '.join(desconocidas)}. Opciones: {', '.join(self.fields)}"
+            )
+
+        columnas, anotaciones = [], {}
+        for clave in claves:
+            anotaciones.update(self.fields[clave].anotaciones)
+            columnas.extend(self.fields[clave].columnas)
+        if con_cursor:
+            columnas.extend(('id', 'created_at'))
+
+        queryset = self.model._default_manager.all()
+        if anotaciones:
+            queryset = queryset.annotate(**anotaciones)
+        return queryset.values(*dict.fromkeys(columnas))
+
+    def serializar_parcial(self, fila, claves):
+        return {clave: self.fields[clave].valor(fila) for clave in claves}
+
+    def campo_modelo(self, lookup):
+        """Campo del modelo al que apunta un lookup como 'cliente_id' o 'gasto__tarjeta_id'"""
+        model = self.model
+        partes = lookup.split('__')
+        for parte in partes[:-1]:
+            model = model._meta.get_field(parte).related_model
+        return model._meta.get_field(partes[-1])
+
+    def validar_filtro(self, param, lookup, valor):
+        """Convierte el valor del query param con el campo del modelo; lanza ValueError si no es válido"""
+        try:
+            field = self.campo_modelo(lookup)
+        except FieldDoesNotExist:
+            return valor
+        try:
+            valor = field.to_python(valor)
+        except ValidationError:
+            raise ValueError(f"Valor inválido para {param}: {valor}.")
+        if field.choices:
+            opciones = [str(opcion) for opcion, _ in field.flatchoices]
+            if str(valor) not in opciones:
+                raise ValueError(f"Valor inválido para {param}: {valor}. Opciones: {', '.join(opciones)}")
+        return valor
+
+    def filtrar(self, queryset, query_params):
+        """Aplica búsqueda, filtros, rangos de fecha y borrado lógico; lanza ValueError si algún parámetro es inválido"""
+        condiciones = {}
+        for param, lookup in self.filters.items():
+            valor = query_params.get(param, None)
+            if valor:
+                condiciones[lookup] = self.validar_filtro(param, lookup, valor)
+
+        search_query = query_params.get('search', None)
+        if search_query:
+            if self.search is not None:
+                queryset = self.search(queryset, search_query)
+            elif self.search_fields:
+                busqueda = Q()
+                for campo in self.search_fields:
+                    busqueda |= Q(**{f'{campo}__icontains': search_query})
+                queryset = queryset.filter(busqueda)
+
+        if condiciones:
+            queryset = queryset.filter(**condiciones)
+
+        for filtro in self.extra_filters:
+            queryset = filtro(queryset, query_params)
+
+        for campo in self.date_ranges:
+            queryset = filtrar_rango_fechas(queryset, campo, query_params, f'{campo}_start', f'{campo}_end')
+        queryset = filtrar_rango_fechas(queryset, 'created_at', query_params)
+
+        if self.soft_delete and query_params.get('include_deleted', None) != '1':
+            queryset = queryset.filter(deleted_at__isnull=True)
+
+        return queryset
+
+
+def get_page_size(query_params):
+    try:
+        page_size = int(query_params.get('page_size', DEFAULT_PAGE_SIZE))
+    except (ValueError, TypeError):
+        return DEFAULT_PAGE_SIZE
+    if page_size <= 0:
+        return DEFAULT_PAGE_SIZE
+    return page_size
+
+
+def listar(request, spec):
+    """
+    Respuesta paginada del listado descrito por spec.
+
+    Con ?cursor= pagina por cursor, con ?count=0 por número de página sin
+    COUNT(*), y en otro caso con PageNumberPagination (respuesta con count);
+    ese count sale de la misma consulta agregada de los validadores.
+    """
+    query_params = request.query_params
+    try:
+        claves = leer_campos(query_params)
+        parcial = bool(claves and spec.fields)
+        if parcial:
+            queryset = spec.queryset_parcial(claves, con_cursor='cursor' in query_params)
+        else:
+            queryset = spec.get_queryset()
+        queryset = spec.filtrar(queryset, query_params)
+        condicional = 'cursor' not in query_params and query_params.get('count', None) != '0'
+        if condicional:
+            # Validadores sobre el modelo sin joins ni anotaciones: mismas filas que el listado
+            base = spec.filtrar(spec.model._default_manager.all(), query_params)
+            agregados = agregados_validadores(base)
+            etag, ultimo = validadores(request, base, valores=agregados)
+    except ValueError as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if condicional:
+        # Sin la fecha: un borrado físico baja el total pero no max(updated_at)
+        response = no_modificado(request, etag, ultimo, usar_fecha=False)
+        if response is not None:
+            return response
+
+    if 'cursor' in query_params:
+        paginator = KeysetPagination()
+    else:
+        queryset = queryset.order_by(*spec.ordering)
+        if query_params.get('count', None) == '0':
+            paginator = NoCountPagination()
+        else:
+            paginator = CountedPageNumberPagination(agregados['total'])
+            paginator.page_size = get_page_size(query_params)
+
+    try:
+        pagina = paginator.paginate_queryset(queryset, request)
+    except InvalidCursor as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except NotFound as e:
+        return Response(
+            {"error": str(e.detail)},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if parcial:
+        response = paginator.get_paginated_response([spec.serializar_parcial(fila, claves) for fila in pagina])
+    else:
+        data = [spec.serializer(obj) for obj in pagina]
+        try:
+            data = seleccionar_campos(data, claves)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        response = paginator.get_paginated_response(data)
+
+    if condicional:
+        agregar_validadores(response, etag, ultimo)
+    return response
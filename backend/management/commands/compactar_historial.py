@@ -0,0 +1,157 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+# Máximo de history_id por DELETE: acota el IN (...) sin importar lo largo del historial del lote
+DELETE_BATCH_SIZE = 1000
+
+
+def modelos_historicos(labels=None):
+    """[(modelo, modelo histórico)] de los modelos registrados en simple_history"""
+    resultado = []
+    for model in apps.get_models():
+        manager_name = getattr(model._meta, 'simple_history_manager_attribute', None)
+        if manager_name is None:
+            continue
+        if labels and model._meta.label not in labels:
+            continue
+        resultado.append((model, getattr(model, manager_name).model))
+    return resultado
+
+
+def registros_a_eliminar(registros, campos):
+    """
+    Dado el historial antiguo de un objeto (ordenado del más viejo al más
+    nuevo) devuelve [(registro, motivo)] de lo que se retira de la tabla:
+
+    - 'sin_cambios': actualizaciones (~) idénticas al registro anterior
+    - 'compactado': snapshots intermedios; se conservan el primero y el último
+    """
+    eliminar = []
+    conservados = []
+    anterior = None
+    for registro in registros:
+        sin_cambios = (
+            anterior is not None
+            and registro['history_type'] == '~'
+            and all(registro[campo] == anterior[campo] for campo in campos)
+        )
+        anterior = registro
+        if sin_cambios:
+            eliminar.append((registro, 'sin_cambios'))
+        else:
+            conservados.append(registro)
+
+    eliminar.extend((registro, 'compactado') for registro in conservados[1:-1])
+    return eliminar
+
+
+class Command(BaseCommand):
+    help = (
+        'Archiva y elimina historial antiguo de simple_history: colapsa actualizaciones '
+        'sin cambios y conserva solo el primer y el último snapshot por registro'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=365, help='Compactar historial con más de N días')
+        parser.add_argument('--modelo', action='append', help='Limitar a uno o más modelos, ej. cotizador.Cotizador (repetible)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Objetos por lote (cada lote es una transacción corta)')
+        parser.add_argument('--archivo-dir', default=settings.HISTORY_ARCHIVE_DIR, help='Directorio de los archivos .ndjson.gz')
+        parser.add_argument('--dry-run', action='store_true', help='Solo reporta, no archiva ni elimina')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 0 or options['chunk_size'] <= 0:
+            raise CommandError('--dias debe ser >= 0 y --chunk-size mayor que 0.')
+
+        limite = timezone.now() - timedelta(days=options['dias'])
+        modelos = modelos_historicos(options['modelo'])
+        if options['modelo'] and len(modelos) != len(set(options['modelo'])):
+            encontrados = {model._meta.label for model, _ in modelos}
+            faltantes = sorted(set(options['modelo']) - encontrados)
+            raise CommandError(f"Modelos sin historial: {', '.join(faltantes)}")
+
+        if not options['dry_run']:
+            os.makedirs(options['archivo_dir'], exist_ok=True)
+
+        for model, history_model in modelos:
+            self.compactar(model, history_model, limite, options)
+
+    def compactar(self, model, history_model, limite, options):
+        # Igual que diff_against: los campos no editables (updated_at) no cuentan como cambio
+        campos = [field.attname for field in history_model.tracked_fields if field.editable]
+        columnas = [field.attname for field in history_model._meta.concrete_fields]
+        antiguos = history_model._default_manager.filter(history_date__lt=limite)
+        chunk_size = options['chunk_size']
+
+        archivo = None
+        ruta = None
+        if not options['dry_run']:
+            ruta = os.path.join(
+                options['archivo_dir'],
+                f"{history_model._meta.db_table}-{timezone.now():%Y%m%d%H%M%S}.ndjson.gz",
+            )
+
+        objetos = totales = 0
+        motivos = {'sin_cambios': 0, 'compactado': 0}
+        ultimo_id = None
+        try:
+            while True:
+                # Lote de objetos (por id) con historial antiguo
+                ids_qs = antiguos.order_by('id').values_list('id', flat=True).distinct()
+                if ultimo_id is not None:
+                    ids_qs = ids_qs.filter(id__gt=ultimo_id)
+                ids = list(ids_qs[:chunk_size])
+                if not ids:
+                    break
+                ultimo_id = ids[-1]
+                objetos += len(ids)
+
+                registros = antiguos.filter(id__in=ids).order_by('id', 'history_date', 'history_id').values(*columnas)
+                por_objeto = {}
+                for registro in registros:
+                    por_objeto.setdefault(registro['id'], []).append(registro)
+                totales += sum(len(r) for r in por_objeto.values())
+
+                eliminar = []
+                for historial in por_objeto.values():
+                    eliminar.extend(registros_a_eliminar(historial, campos))
+                for _, motivo in eliminar:
+                    motivos[motivo] += 1
+
+                if not eliminar or options['dry_run']:
+                    continue
+
+                # Se archiva antes de eliminar: si el proceso se corta, lo archivado sigue en la tabla
+                if archivo is None:
+                    archivo = gzip.open(ruta, 'wt', encoding='utf-8')
+                for registro, motivo in eliminar:
+                    archivo.write(json.dumps({'motivo': motivo, **registro}, cls=DjangoJSONEncoder) + '\n')
+                archivo.flush()
+
+                history_ids = [registro['history_id'] for registro, _ in eliminar]
+                for i in range(0, len(history_ids), DELETE_BATCH_SIZE):
+                    with transaction.atomic():
+                        history_model._default_manager.filter(
+                            history_id__in=history_ids[i:i + DELETE_BATCH_SIZE]
+                        ).delete()
+        finally:
+            if archivo is not None:
+                archivo.close()
+
+        eliminados = motivos['sin_cambios'] + motivos['compactado']
+        resumen = (
+            f"{model._meta.label}: {objetos} objetos, {totales} registros antiguos, "
+            f"{motivos['sin_cambios']} sin cambios y {motivos['compactado']} intermedios "
+            f"{'a eliminar' if options['dry_run'] else 'archivados y eliminados'}"
+        )
+        if archivo is not None:
+            resumen += f" -> {ruta}"
+        self.stdout.write(self.style.SUCCESS(resumen) if eliminados else resumen)
@@ -0,0 +1,212 @@
+import base64
+import json
+from functools import partial
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no se puede decodificar"""
+
+
+class KeysetPagination:
+    """
+    Paginación por cursor (keyset) sobre (created_at, id) descendente.
+
+    En lugar de OFFSET busca directamente la posición del cursor usando el
+    índice (created_at, id), por lo que el costo de una página profunda es
+    el mismo que el de la primera. El COUNT(*) solo se ejecuta si se pide
+    explícitamente con ?count=1.
+
+    Query params:
+    - cursor: cursor opaco devuelto en next/previous (vacío = primera página)
+    - page_size: tamaño de página (por defecto 10)
+    - count: '1' para incluir el total de registros
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    default_page_size = 10
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+
+        if request.query_params.get(self.count_query_param) == '1':
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        reverse = cursor is not None and cursor['direction'] == 'prev'
+
+        if cursor is not None:
+            created_at, pk = cursor['created_at'], cursor['id']
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                )
+
+        ordering = ('created_at', 'id') if reverse else ('-created_at', '-id')
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.default_page_size))
+        except (ValueError, TypeError):
+            return self.default_page_size
+        if page_size <= 0:
+            return self.default_page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, obj, direction):
+        # obj puede ser una instancia o una fila de .values() (listados con ?fields=)
+        if isinstance(obj, dict):
+            created_at, pk = obj['created_at'], obj['id']
+        else:
+            created_at, pk = obj.created_at, obj.id
+        payload = json.dumps({
+            'c': created_at.isoformat(),
+            'i': pk,
+            'd': direction,
+        }, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            created_at = parse_datetime(payload['c'])
+            pk = int(payload['i'])
+            direction = payload['d']
+        except (ValueError, TypeError, KeyError, UnicodeError):
+            raise InvalidCursor('El cursor es inválido.')
+        if created_at is None or direction not in ('next', 'prev'):
+            raise InvalidCursor('El cursor es inválido.')
+        return {'created_at': created_at, 'id': pk, 'direction': direction}
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1], 'next'))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[0], 'prev'))
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+
+class NoCountPagination:
+    """
+    Paginación por número de página (?page=) sin COUNT(*).
+
+    Pide page_size + 1 filas para saber si hay página siguiente, así que la
+    respuesta no incluye 'count'. Se usa en los listados con ?count=0.
+    """
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+    default_page_size = 10
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except (ValueError, TypeError):
+            raise NotFound('Página inválida.')
+        if self.page_number < 1:
+            raise NotFound('Página inválida.')
+
+        offset = (self.page_number - 1) * self.page_size
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.default_page_size))
+        except (ValueError, TypeError):
+            return self.default_page_size
+        if page_size <= 0:
+            return self.default_page_size
+        return page_size
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class CountedPaginator(Paginator):
+    """Paginator de Django con el total ya calculado: no ejecuta su propio COUNT(*)"""
+
+    def __init__(self, *args, count, **kwargs):
+        super().__init__(*args, **kwargs)
+        # count es cached_property: se precarga el valor en la instancia
+        self.__dict__['count'] = count
+
+
+class CountedPageNumberPagination(PageNumberPagination):
+    """
+    PageNumberPagination que reutiliza un conteo ya hecho, p. ej. el total
+    de la consulta de validadores del GET condicional (backend/conditional.py),
+    en lugar de un segundo COUNT(*) sobre el mismo filtro.
+    """
+
+    def __init__(self, count):
+        self.django_paginator_class = partial(CountedPaginator, count=count)
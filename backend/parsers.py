@@ -0,0 +1,54 @@
+import codecs
+import math
+import re
+
+import ujson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+# Solo los literales NaN / Infinity o un exponente de 3+ dígitos pueden dar un float no finito
+POSIBLE_NO_FINITO = re.compile(r'NaN|Infinity|[eE][+]?\d{3}')
+
+
+def valor_no_finito(data):
+    """Primer float NaN/inf dentro de data (dicts y listas anidados), o None"""
+    pendientes = [data]
+    while pendientes:
+        valor = pendientes.pop()
+        if isinstance(valor, float):
+            if not math.isfinite(valor):
+                return valor
+        elif isinstance(valor, dict):
+            pendientes.extend(valor.values())
+        elif isinstance(valor, list):
+            pendientes.extend(valor)
+    return None
+
+
+class UJSONParser(JSONParser):
+    """
+    JSONParser que decodifica con ujson.
+
+    ujson acepta NaN e Infinity; el JSONParser de DRF los rechaza en modo
+    estricto (STRICT_JSON, por defecto). Para validar igual, si el texto
+    puede contener un float no finito se recorre el resultado y se responde
+    ParseError.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        try:
+            decoded_stream = codecs.getreader(encoding)(stream)
+            texto = decoded_stream.read()
+            data = ujson.loads(texto)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+        if self.strict and POSIBLE_NO_FINITO.search(texto):
+            valor = valor_no_finito(data)
+            if valor is not None:
+                raise ParseError('JSON parse error - Out of range float values are not JSON compliant: %s' % valor)
+        return data
@@ -0,0 +1,93 @@
+"""
+Cache de datos de referencia (tablas pequeñas que cambian poco y se leen en
+casi todas las pantallas: etiquetas, tarjetas, precios de cada cliente).
+
+Dos niveles:
+
+1. Cache compartido (settings.CACHES['default'], Redis): el contenido ya
+   serializado, bajo una clave con versión `refcache:<nombre>:<version>`.
+   La versión vive en `refcache_version:<nombre>` e invalidar solo la sube,
+   igual que invalidar_usuario_cache(): lo que una petición concurrente
+   guarde con datos anteriores queda bajo una versión que ya nadie lee.
+2. Memoria del proceso: la última versión leída y su contenido. Durante
+   REFERENCE_CACHE_LOCAL_TTL segundos se sirve sin consultar Redis; después
+   solo se lee la versión (una clave pequeña) y el contenido se vuelve a
+   pedir únicamente si cambió.
+
+La invalidación se conecta a post_save / post_delete y se ejecuta al
+confirmar la transacción, para que nadie recargue el cache con datos que
+todavía no son visibles. Los update()/bulk_create() no envían señales: después
+de usarlos hay que llamar invalidar() explícitamente.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+
+class ReferenceCache:
+    """
+    Contenido cacheado de una tabla de referencia. `cargar(*args)` lo lee de
+    la base de datos; los args (p. ej. el id del cliente) forman parte de la
+    clave y cada combinación tiene su propia versión.
+    """
+
+    def __init__(self, nombre, cargar):
+        self.nombre = nombre
+        self.cargar = cargar
+        self.local = {}
+        self.lock = threading.Lock()
+
+    def clave(self, args):
+        return ':'.join([self.nombre, *(str(arg) for arg in args)])
+
+    def version_key(self, args):
+        return f'refcache_version:{self.clave(args)}'
+
+    def get(self, *args):
+        clave = self.clave(args)
+        ahora = time.monotonic()
+        local_ttl = getattr(settings, 'REFERENCE_CACHE_LOCAL_TTL', 2)
+
+        with self.lock:
+            entrada = self.local.get(clave)
+        if entrada is not None and ahora - entrada['leido'] < local_ttl:
+            return entrada['data']
+
+        version = cache.get(self.version_key(args), 0)
+        if entrada is not None and entrada['version'] == version:
+            data = entrada['data']
+        else:
+            data_key = f'refcache:{clave}:{version}'
+            data = cache.get(data_key)
+            if data is None:
+                data = self.cargar(*args)
+                cache.set(data_key, data, getattr(settings, 'REFERENCE_CACHE_TTL', 3600))
+
+        with self.lock:
+            self.local[clave] = {'version': version, 'data': data, 'leido': ahora}
+        return data
+
+    def invalidar(self, *args):
+        """Descarta el contenido cacheado (en todos los procesos) para esos args"""
+        with self.lock:
+            self.local.pop(self.clave(args), None)
+        try:
+            cache.incr(self.version_key(args))
+        except ValueError:
+            cache.set(self.version_key(args), 1, None)
+
+    def connect(self, model, args=lambda instance: ()):
+        """Invalida al guardar o borrar instancias de model; args(instance) da la clave afectada"""
+        def invalidar_instancia(sender, instance, raw=False, **kwargs):
+            if raw:
+                return
+            claves = args(instance)
+            transaction.on_commit(lambda: self.invalidar(*claves))
+
+        uid = f'refcache_{self.nombre}_{model._meta.label}'
+        post_save.connect(invalidar_instancia, sender=model, dispatch_uid=f'{uid}_save', weak=False)
+        post_delete.connect(invalidar_instancia, sender=model, dispatch_uid=f'{uid}_delete', weak=False)
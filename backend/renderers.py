@@ -0,0 +1,38 @@
+import ujson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class UJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer que serializa con ujson.
+
+    ujson codifica dict/list/str/int/float/Decimal en C; los demás tipos
+    (datetime, date, time, timedelta, UUID, QuerySet...) pasan por el
+    `default` del JSONEncoder de DRF, así que la salida es la misma que la
+    del renderer estándar. La única diferencia son los floats en notación
+    exponencial (1e-7 en lugar de 1e-07), que la API no devuelve: los montos
+    se serializan como str.
+    """
+    encoder_class = JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+
+        ret = ujson.dumps(
+            data,
+            ensure_ascii=self.ensure_ascii,
+            escape_forward_slashes=False,
+            allow_nan=not self.strict,
+            reject_bytes=False,
+            indent=indent or 0,
+            default=self.encoder_class().default,
+        )
+
+        # Igual que JSONRenderer: U+2028 y U+2029 son válidos en JSON pero no en JavaScript
+        ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        return ret.encode()
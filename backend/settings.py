@@ -14,6 +14,7 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
     'corsheaders',
     'channels',
     'simple_history',
+    'backend',
     'users',
     'clientes',
     'etiquetas',
@@ -56,7 +58,8 @@ INSTALLED_APPS = [
     'cargos_no_registrados',
     'ajuste_de_saldo',
     'gastos',
-    'utilidad_ocasional'
+    'utilidad_ocasional',
+    'reportes',
 ]
 
 MIDDLEWARE = [
@@ -91,11 +94,22 @@ TEMPLATES = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # JSON con ujson (backend/renderers.py, backend/parsers.py); para volver
+    # al json estándar usar rest_framework.renderers.JSONRenderer / parsers.JSONParser
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.renderers.UJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'backend.parsers.UJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 
@@ -106,6 +120,43 @@ SIMPLE_JWT = {
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',  # Agregar esta línea
 }
 
+# Segundos que el usuario autenticado permanece en cache (users/authentication.py)
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+
+# Cache. Por defecto en memoria del proceso (desarrollo y tests); con varios
+# workers debe ser compartido para que las invalidaciones lleguen a todos:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Cache de datos de referencia (backend/reference_cache.py): etiquetas, tarjetas y precios de clientes
+REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', '3600'))
+REFERENCE_CACHE_LOCAL_TTL = float(os.getenv('REFERENCE_CACHE_LOCAL_TTL', '2'))
+
+# 4x1000 (tarjetas/cuatro_por_mil.py): tarifas por fecha de vigencia (rige la última
+# con vigente_desde <= día del movimiento) y redondeo del gravamen
+CUATRO_POR_MIL_TARIFAS = [
+    ('2000-01-01', '0.004'),
+]
+CUATRO_POR_MIL_DECIMALES = 2
+CUATRO_POR_MIL_REDONDEO = 'ROUND_HALF_EVEN'
+
+# Resumen financiero (reportes/resumen.py): tiempo en cache de los periodos cerrados
+REPORTES_CACHE_TTL = int(os.getenv('REPORTES_CACHE_TTL', '86400'))
+
+# Historial diferido (backend/history.py): los modelos con BufferedHistoricalRecords
+# escriben su historial en lotes después del commit en lugar de dentro del save()
+SIMPLE_HISTORY_BUFFERED = os.getenv('SIMPLE_HISTORY_BUFFERED', 'False') == 'True'
+SIMPLE_HISTORY_BATCH_SIZE = int(os.getenv('SIMPLE_HISTORY_BATCH_SIZE', '500'))
+SIMPLE_HISTORY_FLUSH_INTERVAL = float(os.getenv('SIMPLE_HISTORY_FLUSH_INTERVAL', '1.0'))
+# Destino de los archivos de historial compactado (manage.py compactar_historial)
+HISTORY_ARCHIVE_DIR = os.getenv('HISTORY_ARCHIVE_DIR', str(BASE_DIR / 'history_archive'))
+
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 
@@ -170,6 +221,9 @@ AUTH_USER_MODEL = 'users.User'
 
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_ALLOW_CREDENTIALS = True
+# GET condicional (backend/conditional.py) desde el frontend
+CORS_ALLOW_HEADERS = (*default_headers, 'if-none-match', 'if-modified-since')
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified']
 
 # ASGI Configuration
 ASGI_APPLICATION = 'backend.asgi.application'
@@ -182,4 +236,9 @@ CHANNEL_LAYERS = {
             "hosts": [("127.0.0.1", 6379)],
         },
     },
-}
\ No newline at end of file
+}
+
+# Registro de usuarios en línea (users/presence.py), compartido entre workers
+PRESENCE_REDIS_URL = os.getenv('PRESENCE_REDIS_URL', 'redis://127.0.0.1:6379/0')
+# Segundos que una conexión sigue viva sin recibir ping
+PRESENCE_TTL = int(os.getenv('PRESENCE_TTL', '90'))
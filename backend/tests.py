@@ -0,0 +1,475 @@
+import gzip
+import json
+import os
+import tempfile
+import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from clientes.models import Cliente
+from etiquetas.models import Etiqueta
+from recepcion_pago.models import RecepcionPago
+from tarjetas.models import Tarjeta
+from users.models import User
+from . import history
+from .history_diff import diff_historial
+from .management.commands import compactar_historial
+from .parsers import UJSONParser
+from .renderers import UJSONRenderer
+from .management.commands.compactar_historial import registros_a_eliminar
+
+
+def registro(history_id, history_type, nombre):
+    return {'history_id': history_id, 'history_type': history_type, 'nombre': nombre}
+
+
+class RegistrosAEliminarTest(TestCase):
+    """Qué snapshots retira la compactación de un historial antiguo"""
+
+    def test_conserva_el_primero_y_el_ultimo(self):
+        historial = [
+            registro(1, '+', 'a'),
+            registro(2, '~', 'b'),
+            registro(3, '~', 'c'),
+            registro(4, '~', 'd'),
+        ]
+        eliminar = registros_a_eliminar(historial, ['nombre'])
+        self.assertEqual([(r['history_id'], motivo) for r, motivo in eliminar], [(2, 'compactado'), (3, 'compactado')])
+
+    def test_actualizaciones_sin_cambios(self):
+        historial = [
+            registro(1, '+', 'a'),
+            registro(2, '~', 'a'),
+            registro(3, '~', 'b'),
+            registro(4, '~', 'b'),
+        ]
+        eliminar = registros_a_eliminar(historial, ['nombre'])
+        self.assertEqual([(r['history_id'], motivo) for r, motivo in eliminar], [(2, 'sin_cambios'), (4, 'sin_cambios')])
+
+    def test_un_borrado_igual_al_anterior_no_es_sin_cambios(self):
+        historial = [registro(1, '+', 'a'), registro(2, '-', 'a')]
+        self.assertEqual(registros_a_eliminar(historial, ['nombre']), [])
+
+    def test_historial_corto_no_se_toca(self):
+        self.assertEqual(registros_a_eliminar([registro(1, '+', 'a')], ['nombre']), [])
+        self.assertEqual(registros_a_eliminar([registro(1, '+', 'a'), registro(2, '~', 'b')], ['nombre']), [])
+
+
+class CompactarHistorialTest(TestCase):
+    """El comando archiva antes de eliminar y --dry-run no toca nada"""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.archivo_dir = directorio.name
+
+        self.etiquetas = []
+        for i in range(3):
+            etiqueta = Etiqueta.objects.create(nombre=f'Etiqueta {i}')
+            for nombre in ('b', 'b', 'c', 'd'):
+                etiqueta.nombre = nombre
+                etiqueta.save()
+            self.etiquetas.append(etiqueta)
+        # 5 registros por etiqueta: +, ~b, ~b (sin cambios), ~c, ~d
+        Etiqueta.history.update(history_date=timezone.now() - timedelta(days=400))
+
+    def compactar(self, *args):
+        call_command(
+            'compactar_historial', '--modelo', 'etiquetas.Etiqueta', '--archivo-dir', self.archivo_dir,
+            *args, stdout=StringIO(),
+        )
+
+    def archivados(self):
+        filas = []
+        for nombre in os.listdir(self.archivo_dir):
+            with gzip.open(os.path.join(self.archivo_dir, nombre), 'rt', encoding='utf-8') as archivo:
+                filas.extend(json.loads(linea) for linea in archivo)
+        return filas
+
+    def test_dry_run_no_archiva_ni_elimina(self):
+        self.compactar('--dry-run')
+        self.assertEqual(Etiqueta.history.count(), 15)
+        self.assertEqual(os.listdir(self.archivo_dir), [])
+
+    def test_archiva_y_elimina(self):
+        antes = {r['history_id']: r for r in Etiqueta.history.values('history_id', 'nombre')}
+
+        self.compactar()
+
+        for etiqueta in self.etiquetas:
+            restantes = list(Etiqueta.history.filter(id=etiqueta.id).order_by('history_date', 'history_id'))
+            self.assertEqual([r.history_type for r in restantes], ['+', '~'])
+            self.assertEqual(restantes[-1].nombre, 'd')
+
+        archivados = self.archivados()
+        self.assertEqual(len(archivados), 9)
+        self.assertEqual(sorted(r['motivo'] for r in archivados), ['compactado'] * 6 + ['sin_cambios'] * 3)
+        for fila in archivados:
+            self.assertEqual(fila['nombre'], antes[fila['history_id']]['nombre'])
+            self.assertFalse(Etiqueta.history.filter(history_id=fila['history_id']).exists())
+
+    def test_historial_reciente_no_se_toca(self):
+        Etiqueta.history.update(history_date=timezone.now())
+        self.compactar()
+        self.assertEqual(Etiqueta.history.count(), 15)
+
+    def test_elimina_en_lotes_de_tamano_fijo(self):
+        with mock.patch.object(compactar_historial, 'DELETE_BATCH_SIZE', 2):
+            with CaptureQueriesContext(connection) as consultas:
+                self.compactar('--chunk-size', '3')
+
+        deletes = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('DELETE')]
+        # 9 registros a eliminar en un solo lote de objetos -> 5 DELETE de a lo sumo 2 ids
+        self.assertEqual(len(deletes), 5)
+        self.assertTrue(all(sql.rsplit('IN (', 1)[1].count(',') < 2 for sql in deletes))
+        self.assertEqual(Etiqueta.history.count(), 6)
+
+
+class ListarConteoTest(TestCase):
+    """El listado paginado usa el total de la consulta de validadores como count"""
+
+    def setUp(self):
+        usuario = User.objects.create(username='admin', email='admin@example.com', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(usuario)
+        for i in range(3):
+            Tarjeta.objects.create(numero=f'000{i}', titular='Titular', descripcion='Tarjeta')
+
+    def test_un_solo_conteo_por_pagina(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/tarjetas/list/', {'page_size': 2, 'page': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+        conteos = [q['sql'] for q in consultas.captured_queries if 'COUNT(' in q['sql']]
+        self.assertEqual(len(conteos), 1)
+
+    def test_pagina_fuera_de_rango(self):
+        response = self.client.get('/api/tarjetas/list/', {'page_size': 2, 'page': 5})
+        self.assertEqual(response.status_code, 404)
+
+
+
+class ListarTest(TestCase):
+    """listar(): validación de parámetros, ?fields= desde .values(), ?count=0 y rangos de fecha"""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='admin', email='admin@example.com', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+        self.tarjeta = Tarjeta.objects.create(numero='1234', titular='Titular', descripcion='Tarjeta')
+        self.recepciones = [
+            RecepcionPago.objects.create(
+                usuario=self.usuario, cliente=self.cliente, tarjeta=self.tarjeta, valor=Decimal('100.00'),
+                fecha=timezone.make_aware(datetime(2025, 1, dia, 18)),
+            )
+            for dia in (9, 10, 11)
+        ]
+        for recepcion in self.recepciones:
+            RecepcionPago.objects.filter(pk=recepcion.pk).update(created_at=recepcion.fecha)
+
+    def listar(self, **params):
+        return self.client.get('/api/recepcion_pago/list/', params)
+
+    def ids(self, **params):
+        response = self.listar(fields='id', **params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [fila['id'] for fila in response.data['results']]
+
+    def consulta_pagina(self, consultas):
+        """SQL de la consulta de la página (la única con LIMIT sobre recepciones_pago)"""
+        paginas = [
+            q['sql'] for q in consultas.captured_queries
+            if 'FROM "recepciones_pago"' in q['sql'] and 'LIMIT' in q['sql']
+        ]
+        self.assertEqual(len(paginas), 1)
+        return paginas[0]
+
+    def test_parametros_invalidos_sin_consultar(self):
+        for params in (
+            {'start_date': '2025/01/01'}, {'end_date': 'ayer'}, {'fecha_start': '01-01-2025'},
+            {'fecha_end': '2025-13-01'}, {'cliente': 'abc'}, {'fields': 'id,no_existe'}, {'fields': ' , '},
+        ):
+            with self.subTest(params=params), self.assertNumQueries(0):
+                response = self.listar(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/clientes/list/', {'medio_comunicacion': 'fax'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_fields_solo_con_las_claves_y_joins_pedidos(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.listar(fields='id,valor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0], {'id': self.recepciones[-1].id, 'valor': '100.00'})
+        self.assertNotIn('JOIN', self.consulta_pagina(consultas))
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.listar(fields='id,cliente,usuario')
+        self.assertEqual(response.data['results'][0], {
+            'id': self.recepciones[-1].id,
+            'cliente': {'id': self.cliente.id, 'nombre': 'Cliente'},
+            'usuario': {'id': self.usuario.id, 'name': ''},
+        })
+        sql = self.consulta_pagina(consultas)
+        self.assertEqual(sql.count('JOIN'), 2)
+        self.assertIn('"clientes"', sql)
+        self.assertNotIn('"tarjetas"', sql)
+
+    def test_sin_conteo(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.listar(count='0', page_size=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertFalse([q for q in consultas.captured_queries if 'COUNT(' in q['sql']])
+
+        response = self.listar(count='0', page_size=2, page=2)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_fecha_de_fin_incluye_el_dia_completo(self):
+        # Los registros son de las 18:00: antes fecha_end=2025-01-10 comparaba con la medianoche y lo dejaba fuera
+        diez = self.recepciones[1].id
+        self.assertEqual(self.ids(fecha_start='2025-01-10', fecha_end='2025-01-10'), [diez])
+        self.assertEqual(self.ids(start_date='2025-01-10', end_date='2025-01-10'), [diez])
+        self.assertEqual(self.ids(fecha_end='2025-01-09'), [self.recepciones[0].id])
+        self.assertEqual(self.ids(fecha_start='2025-01-11'), [self.recepciones[2].id])
+
+
+
+class ListadoCondicionalTest(TestCase):
+    """GET condicional en los listados: 304 solo por ETag, que sí ve los borrados físicos"""
+
+    def setUp(self):
+        usuario = User.objects.create(username='admin', email='admin@example.com', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(usuario)
+        self.tarjetas = [
+            Tarjeta.objects.create(numero=f'000{i}', titular='Titular', descripcion='Tarjeta') for i in range(3)
+        ]
+
+    def listar(self, **headers):
+        return self.client.get('/api/tarjetas/list/', {'page_size': 10}, **headers)
+
+    def borrar_la_mas_antigua(self):
+        # Borrado físico de una fila que no es la más reciente: max(updated_at) no cambia
+        with transaction.atomic():
+            Tarjeta.objects.filter(pk=self.tarjetas[0].pk).delete()
+
+    def test_etag_sin_cambios_y_tras_borrado_fisico(self):
+        response = self.listar()
+        etag = response['ETag']
+        self.assertEqual(self.listar(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.borrar_la_mas_antigua()
+        response = self.listar(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since_no_da_304_en_listados(self):
+        last_modified = self.listar()['Last-Modified']
+        self.assertEqual(self.listar(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+        self.borrar_la_mas_antigua()
+        response = self.listar(HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_detalle_sigue_aceptando_if_modified_since(self):
+        cliente = Cliente.objects.create(nombre='Cliente')
+        url = f'/api/clientes/{cliente.pk}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+
+class UJSONTest(TestCase):
+    """El parser y el renderer con ujson se comportan como los JSONParser / JSONRenderer de DRF"""
+
+    def parsear(self, parser, texto):
+        return parser.parse(BytesIO(texto.encode('utf-8')))
+
+    def test_rechaza_floats_no_finitos(self):
+        for texto in ('{"valor": NaN}', '[1, Infinity]', '{"a": {"b": [-Infinity]}}', '{"valor": 1e999}'):
+            with self.subTest(texto=texto):
+                with self.assertRaises(ParseError):
+                    self.parsear(UJSONParser(), texto)
+
+    def test_acepta_lo_mismo_que_drf(self):
+        for texto in ('{"valor": 1e10, "nombre": "NaN", "nota": "Infinity"}', '[1.5, -2, 1E+300]', '{}'):
+            with self.subTest(texto=texto):
+                self.assertEqual(self.parsear(UJSONParser(), texto), self.parsear(JSONParser(), texto))
+
+    def test_renderer_igual_byte_a_byte(self):
+        data = {
+            'id': 7,
+            'valor': Decimal('1500.50'),
+            'cero': Decimal('0.00'),
+            'fecha': datetime(2025, 3, 5, 12, 30, 1, 123456, tzinfo=dt_timezone.utc),
+            'dia': date(2025, 1, 31),
+            'hora': time(10, 5),
+            'token': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'texto': 'Año / “comillas” \u2028 <b>',
+            'nulo': None,
+            'activo': True,
+            'lista': [Decimal('1.10'), {'anidado': uuid.UUID(int=1)}, 2.5],
+        }
+        for media_type in ('application/json', 'application/json; indent=4'):
+            with self.subTest(media_type=media_type):
+                self.assertEqual(
+                    UJSONRenderer().render(data, media_type),
+                    JSONRenderer().render(data, media_type),
+                )
+
+
+@override_settings(SIMPLE_HISTORY_BUFFERED=True)
+class BufferedHistoryTest(TestCase):
+    """Con historial diferido ningún cambio confirmado se queda sin su registro histórico"""
+
+    def setUp(self):
+        self.buffer = history.HistoryBuffer(start_worker=False)
+        patcher = mock.patch.object(history, 'history_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.usuario = User.objects.create(username='contador', email='contador@example.com')
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+        self.tarjeta = Tarjeta.objects.create(numero='1234', titular='Titular', descripcion='Tarjeta')
+
+    def crear_recepcion(self, valor):
+        return RecepcionPago.objects.create(
+            usuario=self.usuario, cliente=self.cliente, tarjeta=self.tarjeta, valor=valor, fecha=timezone.now()
+        )
+
+    def crear_movimientos(self):
+        """Tres altas, una modificación y un borrado: cinco registros históricos"""
+        with self.captureOnCommitCallbacks(execute=True):
+            recepciones = [self.crear_recepcion(Decimal('100.00') * i) for i in range(1, 4)]
+            recepciones[0].valor = Decimal('150.00')
+            recepciones[0].save()
+            borrada_id = recepciones[1].id
+            recepciones[1].delete()
+        return recepciones, borrada_id
+
+    def test_historial_se_escribe_en_lote_al_vaciar(self):
+        recepciones, borrada_id = self.crear_movimientos()
+
+        self.assertEqual(RecepcionPago.history.count(), 0)
+        self.assertEqual(len(self.buffer), 5)
+
+        self.assertEqual(self.buffer.flush(), 5)
+        self.assertEqual(len(self.buffer), 0)
+
+        registros = RecepcionPago.history.filter(id=recepciones[0].id).order_by('history_date')
+        self.assertEqual([r.history_type for r in registros], ['+', '~'])
+        self.assertEqual([r.valor for r in registros], [Decimal('100.00'), Decimal('150.00')])
+        self.assertEqual(
+            list(RecepcionPago.history.filter(id=borrada_id).values_list('history_type', flat=True)),
+            ['-', '+'],
+        )
+
+    def test_cambio_revertido_no_deja_historial(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    self.crear_recepcion(Decimal('100.00'))
+                    raise DatabaseError('rollback')
+
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(RecepcionPago.objects.count(), 0)
+
+    def test_lote_fallido_se_reintenta(self):
+        self.crear_movimientos()
+
+        with mock.patch('django.db.models.query.QuerySet.bulk_create', side_effect=DatabaseError('sin conexión')):
+            with self.assertLogs('backend.history', level='ERROR'):
+                self.assertEqual(self.buffer.flush(), 0)
+
+        self.assertEqual(len(self.buffer), 5)
+        self.assertEqual(self.buffer.flush(), 5)
+        self.assertEqual(RecepcionPago.history.count(), 5)
+
+    def test_shutdown_escribe_lo_pendiente(self):
+        self.crear_movimientos()
+
+        self.buffer.shutdown()
+
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(RecepcionPago.history.count(), 5)
+
+
+class DiffHistorialTest(TestCase):
+    """?diff=1 en los historiales: cada registro contra el anterior, también en el borde de la página"""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='admin', email='admin@example.com', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+        self.etiqueta = Etiqueta.objects.create(nombre='Inicial', color='#000000', user=self.usuario)
+        for campo, valor in (('nombre', 'Segundo'), ('color', '#ffffff'), ('nombre', 'Final')):
+            setattr(self.etiqueta, campo, valor)
+            self.etiqueta.save()
+        # Misma history_date en todos: el desempate es history_id
+        Etiqueta.history.update(history_date=timezone.now())
+
+    def cambios(self, entrada):
+        """Cambios de la entrada sin updated_at, que cambia en cada guardado"""
+        return {
+            cambio['campo']: (cambio['anterior'], cambio['nuevo'])
+            for cambio in entrada['cambios'] if cambio['campo'] != 'updated_at'
+        }
+
+    def pagina(self, page):
+        response = self.client.get(
+            f'/api/etiquetas/{self.etiqueta.pk}/history/', {'diff': '1', 'page_size': 2, 'page': page}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_primer_registro_de_la_pagina_contra_el_de_la_pagina_siguiente(self):
+        primera = self.pagina(1)
+        self.assertEqual([self.cambios(entrada) for entrada in primera], [
+            {'nombre': ('Segundo', 'Final')},
+            {'color': ('#000000', '#ffffff')},
+        ])
+
+        segunda = self.pagina(2)
+        self.assertEqual(self.cambios(segunda[0]), {'nombre': ('Inicial', 'Segundo')})
+
+    def test_creacion_reporta_todos_los_campos(self):
+        creacion = self.pagina(2)[-1]
+        self.assertEqual(creacion['history_type'], '+')
+        self.assertEqual(self.cambios(creacion), {
+            'id': (None, self.etiqueta.pk),
+            'nombre': (None, 'Inicial'),
+            'color': (None, '#000000'),
+            'user': (None, self.usuario.pk),
+        })
+
+    def test_una_sola_consulta_extra_por_pagina(self):
+        history = self.etiqueta.history.select_related('history_user')
+        for pagina in (list(history[:2]), list(history[2:])):
+            with self.assertNumQueries(1):
+                diff_historial(pagina, history)
+        with self.assertNumQueries(0):
+            self.assertEqual(diff_historial([], history), [])
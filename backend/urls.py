@@ -38,4 +38,5 @@ urlpatterns = [
     path('api/ajuste_de_saldo/', include('ajuste_de_saldo.api.urls'), name="ajuste_de_saldo"),
     path('api/gastos/',             include('gastos.api.urls'),      name="gastos"),
     path('api/utilidad_ocasional/', include('utilidad_ocasional.api.urls'), name="utilidad_ocasional"),
+    path('api/reportes/',           include('reportes.api.urls'),    name="reportes"),
 ]
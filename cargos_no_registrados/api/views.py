@@ -5,23 +5,18 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from django.db import DatabaseError
-from django.db.models import Q
-from datetime import datetime
 from decimal import Decimal
 
 from ..models import CargoNoRegistrado
 from tarjetas.models import Tarjeta
+from tarjetas.cuatro_por_mil import calcular_cuatro_por_mil
 from clientes.models import Cliente
+from backend.history_diff import diff_historial
+from backend.listing import ListSpec, listar, campos, relacion, usuario_anidado
+from reportes.cierres import PeriodoCerrado
 from .permissions import RolePermission
 
 
-def calcular_cuatro_por_mil(valor, tarjeta):
-    """Calcula el cuatro por mil si la tarjeta lo tiene activo"""
-    if tarjeta.cuatro_por_mil == '1':
-        return (Decimal(valor) * Decimal('4')) / Decimal('1000')
-    return Decimal('0')
-
-
 def serialize_cargo_no_registrado(cargo):
     """Convierte un objeto CargoNoRegistrado a diccionario"""
     return {
@@ -102,7 +97,7 @@ def create_cargo_no_registrado(request):
             )
 
         valor = Decimal(request.data.get('valor'))
-        cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta)
+        cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta, request.data.get('fecha'))
         total = valor + cuatro_por_mil
 
         cargo = CargoNoRegistrado.objects.create(
@@ -118,6 +113,8 @@ def create_cargo_no_registrado(request):
 
         return Response(serialize_cargo_no_registrado(cargo), status=status.HTTP_201_CREATED)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -130,111 +127,27 @@ def create_cargo_no_registrado(request):
         )
 
 
+LISTADO_CARGOS_NO_REGISTRADOS = ListSpec(
+    queryset=CargoNoRegistrado.objects.select_related('usuario', 'cliente', 'tarjeta'),
+    serializer=serialize_cargo_no_registrado,
+    search_fields=('cliente__nombre', 'tarjeta__numero', 'tarjeta__titular', 'observacion'),
+    filters={'cliente': 'cliente_id', 'tarjeta': 'tarjeta_id', 'usuario': 'usuario_id'},
+    date_ranges=('fecha',),
+    fields=campos(
+        'id', 'valor', 'cuatro_por_mil', 'total', 'observacion', 'fecha', 'created_at', 'updated_at', 'deleted_at',
+        usuario=usuario_anidado('usuario'),
+        cliente=relacion('cliente', 'nombre'),
+        tarjeta=relacion('tarjeta', 'numero', 'titular', 'cuatro_por_mil'),
+    ),
+)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_cargos_no_registrados(request):
     """Listar cargos no registrados con filtros y paginación"""
     try:
-        cargos = CargoNoRegistrado.objects.select_related(
-            'usuario', 'cliente', 'tarjeta'
-        ).all()
-
-        # Filtro de búsqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            cargos = cargos.filter(
-                Q(cliente__nombre__icontains=search_query) |
-                Q(tarjeta__numero__icontains=search_query) |
-                Q(tarjeta__titular__icontains=search_query) |
-                Q(observacion__icontains=search_query)
-            )
-
-        # Filtro por cliente
-        cliente_id = request.query_params.get('cliente', None)
-        if cliente_id:
-            cargos = cargos.filter(cliente_id=cliente_id)
-
-        # Filtro por tarjeta
-        tarjeta_id = request.query_params.get('tarjeta', None)
-        if tarjeta_id:
-            cargos = cargos.filter(tarjeta_id=tarjeta_id)
-
-        # Filtro por usuario
-        usuario_id = request.query_params.get('usuario', None)
-        if usuario_id:
-            cargos = cargos.filter(usuario_id=usuario_id)
-
-        # Filtro por fecha
-        fecha_start = request.query_params.get('fecha_start', None)
-        fecha_end = request.query_params.get('fecha_end', None)
-
-        if fecha_start:
-            try:
-                start_date = datetime.strptime(fecha_start, '%Y-%m-%d').date()
-                cargos = cargos.filter(fecha__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_start debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if fecha_end:
-            try:
-                end_date = datetime.strptime(fecha_end, '%Y-%m-%d').date()
-                cargos = cargos.filter(fecha__lte=end_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_end debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro por fecha de creación
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                cargos = cargos.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                cargos = cargos.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            cargos = cargos.filter(deleted_at__isnull=True)
-
-        # Ordenar
-        cargos = cargos.order_by('-created_at')
-
-        # Paginación
-        page_size_param = request.query_params.get('page_size', 10)
-        try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
-
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_cargos = paginator.paginate_queryset(cargos, request)
-
-        data = [serialize_cargo_no_registrado(c) for c in paginated_cargos]
-        return paginator.get_paginated_response(data)
-
+        return listar(request, LISTADO_CARGOS_NO_REGISTRADOS)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener cargos no registrados: {str(e)}"},
@@ -306,16 +219,18 @@ def update_cargo_no_registrado(request, pk):
         cargo.observacion = request.data.get('observacion', cargo.observacion)
         cargo.fecha = request.data.get('fecha', cargo.fecha)
 
-        # Recalcular cuatro_por_mil y total si cambió valor o tarjeta
-        if 'valor' in request.data or 'tarjeta' in request.data:
+        # Recalcular cuatro_por_mil y total si cambió valor, tarjeta o fecha (la tasa depende de la fecha)
+        if 'valor' in request.data or 'tarjeta' in request.data or 'fecha' in request.data:
             valor = Decimal(cargo.valor)
-            cargo.cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta)
+            cargo.cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta, cargo.fecha)
             cargo.total = valor + cargo.cuatro_por_mil
 
         cargo.save()
 
         return Response(serialize_cargo_no_registrado(cargo), status=status.HTTP_200_OK)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -339,6 +254,8 @@ def delete_cargo_no_registrado(request, pk):
             {"message": "Cargo no registrado eliminado correctamente"},
             status=status.HTTP_200_OK
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar cargo no registrado: {str(e)}"},
@@ -359,6 +276,8 @@ def restore_cargo_no_registrado(request, pk):
             )
         cargo.restore()
         return Response(serialize_cargo_no_registrado(cargo), status=status.HTTP_200_OK)
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al restaurar cargo no registrado: {str(e)}"},
@@ -377,6 +296,8 @@ def hard_delete_cargo_no_registrado(request, pk):
             {"message": "Cargo no registrado eliminado permanentemente"},
             status=status.HTTP_204_NO_CONTENT
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar cargo no registrado: {str(e)}"},
@@ -390,7 +311,7 @@ def cargo_no_registrado_history(request, pk):
     """Obtener el historial de cambios de un cargo no registrado"""
     try:
         cargo = get_object_or_404(CargoNoRegistrado.objects, pk=pk)
-        history = cargo.history.all()
+        history = cargo.history.select_related('history_user')
 
         # Paginación
         page_size_param = request.query_params.get('page_size', 10)
@@ -403,6 +324,10 @@ def cargo_no_registrado_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
@@ -10,6 +10,8 @@ urlpatterns = [
     path('<int:pk>/restore/',       views.restore_client,     name='restore_client'),
     path('<int:pk>/hard-delete/',   views.hard_delete_client, name='hard_delete_client'),
     path('<int:pk>/history/',       views.client_history,     name='client_history'),
+    path('<int:pk>/saldo/',         views.get_saldo_cliente,  name='get_saldo_cliente'),
+    path('<int:pk>/estado-cuenta/', views.estado_cuenta_cliente, name='estado_cuenta_cliente'),
     # Precios del cliente
     path('<int:pk>/precios/',                       views.list_precios_cliente,   name='list_precios_cliente'),
     path('<int:pk>/precios/add/',                   views.add_precio_cliente,     name='add_precio_cliente'),
@@ -6,12 +6,21 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.db import DatabaseError
 from django.db.models import Q, Count, Prefetch
-from datetime import datetime
 
-from clientes.models import Cliente, MedioComunicacion, PrecioCliente
+from clientes.models import Cliente, ClienteSaldo, MedioComunicacion, PrecioCliente
+from clientes.saldos import recalcular_saldo
+from clientes.estado_cuenta import COLUMNAS_ESTADO_CUENTA, estado_de_cuenta, saldo_anterior
+from backend.export import stream_csv, stream_ndjson
+from backend.conditional import agregar_validadores, no_modificado, validadores
+from backend.history_diff import diff_historial
+from ..cache import precios_cliente
+from backend.listing import ListSpec, listar, leer_fecha, Campo, campos, columna, display, nombre_usuario
+from reportes.cierres import PeriodoCerrado
 from .permissions import RolePermission
 
 
@@ -141,83 +150,45 @@ def create_client(request):
         )
 
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'auxiliar', 'vendedor'])])
-def list_clients(request):
-    """Listar clientes con filtros y paginación"""
-    try:
-        clientes = Cliente.objects.select_related('usuario', 'created_by').prefetch_related(
-            Prefetch('precios', queryset=PrecioCliente.objects.filter(deleted_at__isnull=True))
-        ).annotate(
-            precios_count=Count('precios', filter=Q(precios__deleted_at__isnull=True))
-        )
-
-        # Filtro de búsqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            clientes = clientes.filter(
-                Q(nombre__icontains=search_query) |
-                Q(telefono__icontains=search_query) |
-                Q(direccion__icontains=search_query)
-            )
+PRECIOS_COUNT = {'precios_count': Count('precios', filter=Q(precios__deleted_at__isnull=True))}
 
-        # Filtro por medio de comunicación
-        medio_filter = request.query_params.get('medio_comunicacion', None)
-        if medio_filter:
-            clientes = clientes.filter(medio_comunicacion=medio_filter)
 
-        # Filtro por usuario asignado
-        usuario_filter = request.query_params.get('usuario', None)
-        if usuario_filter:
-            clientes = clientes.filter(usuario_id=usuario_filter)
+def clientes_con_precios():
+    """Clientes con sus precios activos precargados y el conteo de precios anotado"""
+    return Cliente.objects.select_related('usuario', 'created_by').prefetch_related(
+        Prefetch('precios', queryset=PrecioCliente.objects.filter(deleted_at__isnull=True))
+    ).annotate(**PRECIOS_COUNT)
 
-        # Filtro por fecha de creación
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
 
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                clientes = clientes.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+def serialize_cliente_listado(cliente):
+    """Serialización del listado: incluye los precios precargados y su conteo"""
+    return serialize_cliente(cliente, include_precios=True, include_precios_info=True, precios_prefetched=True)
 
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                clientes = clientes.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            clientes = clientes.filter(deleted_at__isnull=True)
-
-        # Ordenar
-        clientes = clientes.order_by('-created_at')
-
-        # Paginación
-        page_size_param = request.query_params.get('page_size', 10)
-        try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
 
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_clientes = paginator.paginate_queryset(clientes, request)
+LISTADO_CLIENTES = ListSpec(
+    queryset=clientes_con_precios,
+    serializer=serialize_cliente_listado,
+    search_fields=('nombre', 'telefono', 'direccion'),
+    filters={'medio_comunicacion': 'medio_comunicacion', 'usuario': 'usuario_id'},
+    fields=campos(
+        'id', 'color', 'nombre', 'telefono', 'direccion', 'medio_comunicacion', 'created_at', 'updated_at', 'deleted_at',
+        usuario=columna('usuario_id'),
+        usuario_name=nombre_usuario('usuario'),
+        medio_comunicacion_display=display('medio_comunicacion', MedioComunicacion.choices),
+        created_by=columna('created_by_id'),
+        created_by_name=nombre_usuario('created_by'),
+        precios_count=Campo(('precios_count',), lambda fila: fila['precios_count'], anotaciones=PRECIOS_COUNT),
+        tiene_precios=Campo(('precios_count',), lambda fila: fila['precios_count'] > 0, anotaciones=PRECIOS_COUNT),
+    ),
+)
 
-        data = [serialize_cliente(c, include_precios=True, include_precios_info=True, precios_prefetched=True) for c in paginated_clientes]
-        return paginator.get_paginated_response(data)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'auxiliar', 'vendedor'])])
+def list_clients(request):
+    """Listar clientes con filtros y paginación"""
+    try:
+        return listar(request, LISTADO_CLIENTES)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener clientes: {str(e)}"},
@@ -228,10 +199,21 @@ def list_clients(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'auxiliar', 'vendedor'])])
 def get_client(request, pk):
-    """Obtener un cliente por ID"""
+    """
+    Obtener un cliente por ID.
+
+    Responde 304 a If-None-Match / If-Modified-Since si ni el cliente ni sus
+    precios cambiaron (ver backend/conditional.py).
+    """
     try:
+        etag, ultimo = validadores(request, Cliente.objects.filter(pk=pk), relaciones=('precios',))
+        response = no_modificado(request, etag, ultimo)
+        if response is not None:
+            return response
+
         cliente = get_object_or_404(Cliente.objects.select_related('usuario', 'created_by'), pk=pk)
-        return Response(serialize_cliente(cliente), status=status.HTTP_200_OK)
+        response = Response(serialize_cliente(cliente), status=status.HTTP_200_OK)
+        return agregar_validadores(response, etag, ultimo)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener cliente: {str(e)}"},
@@ -369,6 +351,9 @@ def hard_delete_client(request, pk):
             {"message": "Cliente eliminado permanentemente"},
             status=status.HTTP_204_NO_CONTENT
         )
+    except PeriodoCerrado as e:
+        # Sus movimientos se borran en cascada
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar cliente: {str(e)}"},
@@ -382,7 +367,7 @@ def client_history(request, pk):
     """Obtener el historial de cambios de un cliente"""
     try:
         cliente = get_object_or_404(Cliente.objects, pk=pk)
-        history = cliente.history.all()
+        history = cliente.history.select_related('history_user')
 
         # Paginación
         page_size_param = request.query_params.get('page_size', 10)
@@ -395,6 +380,10 @@ def client_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
@@ -423,6 +412,121 @@ def client_history(request, pk):
         )
 
 
+# ==================== SALDO CLIENTE ====================
+
+def serialize_saldo(saldo):
+    """Convierte un objeto ClienteSaldo a diccionario"""
+    return {
+        'cliente_id': saldo.cliente_id,
+        'saldo': str(saldo.saldo),
+        'total_recepciones': str(saldo.total_recepciones),
+        'total_devoluciones': str(saldo.total_devoluciones),
+        'total_cargos': str(saldo.total_cargos),
+        'total_ajustes': str(saldo.total_ajustes),
+        'total_cotizaciones': str(saldo.total_cotizaciones),
+        'updated_at': saldo.updated_at,
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'auxiliar', 'vendedor', 'contador'])])
+def get_saldo_cliente(request, pk):
+    """Obtener el saldo materializado de un cliente"""
+    try:
+        saldo = ClienteSaldo.objects.filter(cliente_id=pk).first()
+        if saldo is None:
+            # Cliente sin saldo materializado todavía: se calcula una vez y queda guardado
+            get_object_or_404(Cliente.objects, pk=pk)
+            saldo = recalcular_saldo(pk)
+        return Response(serialize_saldo(saldo), status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response(
+            {"error": f"Error al obtener saldo: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def serialize_linea_estado_cuenta(linea):
+    """Línea del estado de cuenta con los montos como str"""
+    return {
+        'fecha': linea['fecha'],
+        'tipo': linea['tipo'],
+        'id': linea['id'],
+        'descripcion': linea['descripcion'],
+        'cargo': str(linea['cargo']),
+        'abono': str(linea['abono']),
+        'saldo': str(linea['saldo']),
+    }
+
+
+def stream_estado_cuenta_json(cliente, desde, hasta, saldo_inicial, lineas):
+    """Documento JSON generado por partes: la lista de movimientos nunca está completa en memoria"""
+    encabezado = {
+        'cliente': {'id': cliente.id, 'nombre': cliente.nombre},
+        'start_date': desde,
+        'end_date': hasta,
+        'saldo_inicial': str(saldo_inicial),
+    }
+    yield json.dumps(encabezado, cls=DjangoJSONEncoder)[:-1] + ', "movimientos": ['
+    saldo = saldo_inicial
+    for i, linea in enumerate(lineas):
+        saldo = linea['saldo']
+        yield (',' if i else '') + json.dumps(serialize_linea_estado_cuenta(linea), cls=DjangoJSONEncoder)
+    yield '], "saldo_final": ' + json.dumps(str(saldo)) + '}'
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'auxiliar', 'vendedor', 'contador'])])
+def estado_cuenta_cliente(request, pk):
+    """
+    Estado de cuenta del cliente en streaming: cotizaciones, recepciones,
+    devoluciones, cargos y ajustes en orden de fecha con el saldo acumulado.
+    Query params: start_date, end_date (YYYY-MM-DD) y formato json (defecto) | csv | ndjson.
+    """
+    try:
+        formato = request.query_params.get('formato', 'json')
+        if formato not in ('json', 'csv', 'ndjson'):
+            return Response(
+                {"error": "Formato inválido. Opciones: json, csv, ndjson"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cliente = Cliente.objects.filter(pk=pk).first()
+        if cliente is None:
+            return Response({"error": "Cliente no encontrado."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            desde = leer_fecha(request.query_params, 'start_date')
+            hasta = leer_fecha(request.query_params, 'end_date')
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        saldo_inicial = saldo_anterior(cliente.id, desde)
+        lineas = estado_de_cuenta(cliente.id, desde, hasta, saldo_inicial)
+
+        if formato == 'json':
+            return StreamingHttpResponse(
+                stream_estado_cuenta_json(cliente, desde, hasta, saldo_inicial, lineas),
+                content_type='application/json'
+            )
+        if formato == 'ndjson':
+            response = StreamingHttpResponse(
+                stream_ndjson(lineas, COLUMNAS_ESTADO_CUENTA), content_type='application/x-ndjson'
+            )
+        else:
+            response = StreamingHttpResponse(
+                stream_csv(lineas, COLUMNAS_ESTADO_CUENTA), content_type='text/csv; charset=utf-8'
+            )
+        response['Content-Disposition'] = f'attachment; filename="estado_cuenta_{cliente.id}.{formato}"'
+        return response
+
+    except Exception as e:
+        return Response(
+            {"error": f"Error al generar el estado de cuenta: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 # ==================== PRECIOS CLIENTE ====================
 
 @api_view(['POST'])
@@ -472,12 +576,14 @@ def add_precio_cliente(request, pk):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_precios_cliente(request, pk):
-    """Listar precios de un cliente"""
+    """Listar precios activos de un cliente (desde el cache de referencia, clientes/cache.py)"""
     try:
-        cliente = get_object_or_404(Cliente.objects, pk=pk)
-        precios = cliente.precios.filter(deleted_at__isnull=True)
-
-        data = [serialize_precio(p) for p in precios]
+        data = precios_cliente.get(pk)
+        if data is None:
+            return Response(
+                {"error": "Cliente no encontrado."},
+                status=status.HTTP_404_NOT_FOUND
+            )
         return Response(data, status=status.HTTP_200_OK)
 
     except Exception as e:
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ClientesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clientes'
+
+    def ready(self):
+        from .signals import connect_saldo_signals
+        from .cache import connect_cache_signals
+        connect_saldo_signals()
+        connect_cache_signals()
@@ -0,0 +1,22 @@
+from backend.reference_cache import ReferenceCache
+
+from .models import Cliente, PrecioCliente
+
+
+def cargar_precios_cliente(cliente_id):
+    """Precios activos del cliente, o None si el cliente no existe"""
+    from .api.views import serialize_precio
+    if not Cliente.objects.filter(pk=cliente_id).exists():
+        return None
+    precios = PrecioCliente.objects.filter(cliente_id=cliente_id, deleted_at__isnull=True)
+    return [serialize_precio(p) for p in precios]
+
+
+precios_cliente = ReferenceCache('precios_cliente', cargar_precios_cliente)
+
+
+def connect_cache_signals():
+    precios_cliente.connect(PrecioCliente, args=lambda precio: (precio.cliente_id,))
+    # Un cliente sin precios borrado físicamente no dispara señales de PrecioCliente:
+    # sin esto su [] cacheado se seguiría sirviendo en lugar del 404
+    precios_cliente.connect(Cliente, args=lambda cliente: (cliente.pk,))
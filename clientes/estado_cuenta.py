@@ -0,0 +1,120 @@
+"""
+Estado de cuenta de un cliente: todos sus movimientos vigentes en orden de
+fecha con el saldo acumulado.
+
+Las fuentes y su efecto en el saldo son las mismas de MOVIMIENTOS_SALDO
+(cotizaciones, recepciones, devoluciones, cargos y ajustes). Cada fuente se
+lee ordenada por (fecha, id) con iterar_por_lotes sobre su índice
+(cliente, deleted_at, fecha) y las cinco secuencias se combinan con
+heapq.merge (k-way merge): en memoria solo hay un lote por fuente, sin
+importar cuántos años de movimientos tenga el cliente. El saldo se acumula en
+la misma pasada.
+
+Cargo o abono depende del efecto (signo * monto), no de la fuente: un ajuste
+negativo figura como cargo, siempre con el valor absoluto.
+
+Con fecha de inicio, el saldo inicial es la suma de los movimientos
+anteriores (una consulta agregada por fuente).
+"""
+import heapq
+from datetime import datetime, time
+
+from django.apps import apps
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from backend.export import iterar_por_lotes
+
+from .saldos import CERO, MOVIMIENTOS_SALDO
+
+# modelo -> (tipo, campo de fecha, campos que describen el movimiento)
+FUENTES_ESTADO_CUENTA = {
+    'cotizador.Cotizador':                     ('cotizacion', 'created_at', ('descripcion', 'placa')),
+    'recepcion_pago.RecepcionPago':            ('recepcion', 'fecha', ('observacion',)),
+    'devoluciones.Devolucion':                 ('devolucion', 'fecha', ('observacion',)),
+    'cargos_no_registrados.CargoNoRegistrado': ('cargo', 'fecha', ('observacion',)),
+    'ajuste_de_saldo.AjusteDeSaldo':           ('ajuste', 'fecha', ('observacion',)),
+}
+
+COLUMNAS_ESTADO_CUENTA = ['fecha', 'tipo', 'id', 'descripcion', 'cargo', 'abono', 'saldo']
+
+CHUNK_SIZE = 2000
+
+
+def limites(desde=None, hasta=None):
+    """Fechas inclusivas -> (inicio, fin) aware para filtrar; None si no se indicó"""
+    inicio = timezone.make_aware(datetime.combine(desde, time.min)) if desde else None
+    fin = timezone.make_aware(datetime.combine(hasta, time.max)) if hasta else None
+    return inicio, fin
+
+
+def movimientos_fuente(label, orden, cliente_id, inicio, fin):
+    """Movimientos vigentes del cliente en una fuente, ordenados por (fecha, id)"""
+    tipo, campo_fecha, campos_descripcion = FUENTES_ESTADO_CUENTA[label]
+    _, signo, campos_monto = MOVIMIENTOS_SALDO[label]
+    movimientos = apps.get_model(label)._default_manager.filter(cliente_id=cliente_id, deleted_at__isnull=True)
+    if inicio:
+        movimientos = movimientos.filter(**{f'{campo_fecha}__gte': inicio})
+    if fin:
+        movimientos = movimientos.filter(**{f'{campo_fecha}__lte': fin})
+
+    filas = iterar_por_lotes(
+        movimientos.values('id', campo_fecha, *campos_monto, *campos_descripcion),
+        orden=(campo_fecha, 'id'),
+        chunk_size=CHUNK_SIZE,
+    )
+    for fila in filas:
+        yield {
+            'fecha': fila[campo_fecha],
+            'orden': orden,
+            'tipo': tipo,
+            'id': fila['id'],
+            'descripcion': ' - '.join(str(fila[c]) for c in campos_descripcion if fila[c]),
+            'monto': sum((fila[c] or CERO for c in campos_monto), CERO),
+            'signo': signo,
+        }
+
+
+def saldo_anterior(cliente_id, desde):
+    """Saldo del cliente antes del día desde (movimientos vigentes), una consulta por fuente"""
+    if not desde:
+        return CERO
+    inicio, _ = limites(desde)
+    saldo = CERO
+    for label, (_, campo_fecha, _) in FUENTES_ESTADO_CUENTA.items():
+        model = apps.get_model(label)
+        _, signo, campos_monto = MOVIMIENTOS_SALDO[label]
+        monto = F(campos_monto[0])
+        for campo in campos_monto[1:]:
+            monto = monto + F(campo)
+        total = model._default_manager.filter(
+            cliente_id=cliente_id, deleted_at__isnull=True, **{f'{campo_fecha}__lt': inicio}
+        ).aggregate(total=Sum(monto))['total']
+        saldo += signo * (total or CERO)
+    return saldo.quantize(CERO)
+
+
+def estado_de_cuenta(cliente_id, desde=None, hasta=None, saldo_inicial=CERO):
+    """
+    Genera las líneas del estado de cuenta en orden de fecha con el saldo
+    acumulado. Los empates de fecha se resuelven por el orden de las fuentes
+    y luego por id, así el resultado es estable entre consultas.
+    """
+    inicio, fin = limites(desde, hasta)
+    fuentes = [
+        movimientos_fuente(label, orden, cliente_id, inicio, fin)
+        for orden, label in enumerate(FUENTES_ESTADO_CUENTA)
+    ]
+    saldo = saldo_inicial
+    for movimiento in heapq.merge(*fuentes, key=lambda m: (m['fecha'], m['orden'], m['id'])):
+        efecto = movimiento['signo'] * movimiento['monto']
+        saldo += efecto
+        yield {
+            'fecha': movimiento['fecha'],
+            'tipo': movimiento['tipo'],
+            'id': movimiento['id'],
+            'descripcion': movimiento['descripcion'],
+            'cargo': -efecto if efecto < 0 else CERO,
+            'abono': efecto if efecto > 0 else CERO,
+            'saldo': saldo,
+        }
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from clientes.models import Cliente, ClienteSaldo
+from clientes.saldos import MOVIMIENTOS_SALDO, calcular_totales, construir_saldo
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero la tabla de saldos por cliente y reporta las diferencias encontradas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Solo reporta diferencias, no escribe')
+        parser.add_argument('--cliente', type=int, action='append', help='Limitar a uno o más clientes (repetible)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Clientes por lote')
+
+    def handle(self, *args, **options):
+        campos = [campo for campo, _, _ in MOVIMIENTOS_SALDO.values()] + ['saldo']
+        cliente_ids = options['cliente'] or list(Cliente.objects.order_by('id').values_list('id', flat=True))
+        batch_size = options['batch_size']
+
+        revisados = diferencias = 0
+        for i in range(0, len(cliente_ids), batch_size):
+            lote = cliente_ids[i:i + batch_size]
+            totales = calcular_totales(lote)
+            actuales = ClienteSaldo.objects.in_bulk(lote)
+
+            nuevos, modificados = [], []
+            for cliente_id in lote:
+                esperado = construir_saldo(cliente_id, totales.get(cliente_id, {}))
+                actual = actuales.get(cliente_id)
+                revisados += 1
+
+                if actual is None:
+                    nuevos.append(esperado)
+                    continue
+
+                campos_distintos = [c for c in campos if getattr(actual, c) != getattr(esperado, c)]
+                if not campos_distintos:
+                    continue
+
+                diferencias += 1
+                detalle = ', '.join(f'{c}: {getattr(actual, c)} -> {getattr(esperado, c)}' for c in campos_distintos)
+                self.stdout.write(self.style.WARNING(f'Cliente {cliente_id}: {detalle}'))
+                for c in campos:
+                    setattr(actual, c, getattr(esperado, c))
+                modificados.append(actual)
+
+            if options['check']:
+                continue
+
+            with transaction.atomic():
+                ClienteSaldo.objects.bulk_create(nuevos)
+                ClienteSaldo.objects.bulk_update(modificados, campos)
+
+        resumen = f'{revisados} clientes revisados, {diferencias} con diferencias'
+        if options['check']:
+            if diferencias:
+                # Código de salida distinto de cero para usarlo en monitoreo
+                raise CommandError(resumen, returncode=1)
+            self.stdout.write(resumen)
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{resumen}, saldos reconstruidos'))
@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-17 03:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_preciocliente_historicalpreciocliente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClienteSaldo',
+            fields=[
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='saldo', serialize=False, to='clientes.cliente')),
+                ('total_recepciones', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_devoluciones', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_cargos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_ajustes', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_cotizaciones', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('saldo', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Saldo Cliente',
+                'verbose_name_plural': 'Saldos Clientes',
+                'db_table': 'clientes_saldos',
+            },
+        ),
+    ]
@@ -84,3 +84,34 @@ class PrecioCliente(models.Model):
 
     def __str__(self):
         return f'{self.descripcion} - Ley: {self.precio_lay} - Comision: {self.comision}'
+
+
+class ClienteSaldo(models.Model):
+    """
+    Saldo materializado por cliente, actualizado de forma incremental por las
+    señales de clientes.signals. Se puede reconstruir con el comando
+    `python manage.py recalcular_saldos`.
+
+    saldo = recepciones + ajustes - devoluciones - cargos - cotizaciones
+    """
+    cliente = models.OneToOneField(
+        Cliente,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='saldo'
+    )
+    total_recepciones  = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_devoluciones = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_cargos       = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_ajustes      = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_cotizaciones = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    saldo              = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'clientes_saldos'
+        verbose_name = 'Saldo Cliente'
+        verbose_name_plural = 'Saldos Clientes'
+
+    def __str__(self):
+        return f'Saldo {self.cliente_id}: {self.saldo}'
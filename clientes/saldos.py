@@ -0,0 +1,135 @@
+"""
+Cálculo del saldo por cliente.
+
+Cada movimiento aporta a un total de ClienteSaldo con un signo:
+
+    RecepcionPago      +valor                   -> total_recepciones
+    AjusteDeSaldo      +valor                   -> total_ajustes
+    Devolucion         -valor                   -> total_devoluciones
+    CargoNoRegistrado  -valor                   -> total_cargos
+    Cotizador          -(precio_lay + comision) -> total_cotizaciones
+
+Los movimientos eliminados (soft delete) no aportan.
+"""
+from decimal import Decimal
+
+from django.apps import apps
+from django.db.models import F, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+
+from .models import ClienteSaldo
+
+
+# modelo -> (campo en ClienteSaldo, signo en el saldo, campos que suman el monto)
+MOVIMIENTOS_SALDO = {
+    'recepcion_pago.RecepcionPago':            ('total_recepciones', 1, ('valor',)),
+    'ajuste_de_saldo.AjusteDeSaldo':           ('total_ajustes', 1, ('valor',)),
+    'devoluciones.Devolucion':                 ('total_devoluciones', -1, ('valor',)),
+    'cargos_no_registrados.CargoNoRegistrado': ('total_cargos', -1, ('valor',)),
+    'cotizador.Cotizador':                     ('total_cotizaciones', -1, ('precio_lay', 'comision')),
+}
+
+CERO = Decimal('0.00')
+
+
+def monto_movimiento(valores, campos_monto):
+    """Suma los campos de monto; los valores pueden venir como str desde request.data"""
+    return sum((Decimal(str(valores[campo] or 0)) for campo in campos_monto), CERO)
+
+
+def aporte(valores, campos_monto):
+    """(cliente_id, monto) con el que un movimiento aporta a su total, o None si no aporta"""
+    if valores is None or valores['deleted_at'] is not None or not valores['cliente_id']:
+        return None
+    return valores['cliente_id'], monto_movimiento(valores, campos_monto)
+
+
+def valores_instancia(instance, campos_monto):
+    return {
+        'cliente_id': instance.cliente_id,
+        'deleted_at': instance.deleted_at,
+        **{campo: getattr(instance, campo) for campo in campos_monto},
+    }
+
+
+def valores_guardados(model, pk, campos_monto):
+    """Valores actualmente guardados en la base de datos para el movimiento"""
+    return model._default_manager.filter(pk=pk).values('cliente_id', 'deleted_at', *campos_monto).first()
+
+
+def aplicar_delta(cliente_id, campo, signo, delta, crear=True):
+    """
+    Suma `delta` al total `campo` del cliente con un UPDATE atómico (F()).
+    Si el cliente aún no tiene saldo materializado y `crear` es True, lo
+    calcula desde cero (el cálculo ya incluye el movimiento actual).
+    """
+    if not delta:
+        return
+    actualizados = ClienteSaldo.objects.filter(cliente_id=cliente_id).update(**{
+        campo: F(campo) + delta,
+        'saldo': F('saldo') + signo * delta,
+    })
+    if not actualizados and crear:
+        recalcular_saldo(cliente_id)
+
+
+def registrar_cambio(model, anterior, nuevo, crear=True):
+    """Aplica al saldo la diferencia entre el estado anterior y el nuevo de un movimiento"""
+    campo, signo, campos_monto = MOVIMIENTOS_SALDO[model._meta.label]
+    aporte_anterior = aporte(anterior, campos_monto)
+    aporte_nuevo = aporte(nuevo, campos_monto)
+
+    deltas = {}
+    if aporte_anterior:
+        deltas[aporte_anterior[0]] = deltas.get(aporte_anterior[0], CERO) - aporte_anterior[1]
+    if aporte_nuevo:
+        deltas[aporte_nuevo[0]] = deltas.get(aporte_nuevo[0], CERO) + aporte_nuevo[1]
+
+    for cliente_id, delta in deltas.items():
+        aplicar_delta(cliente_id, campo, signo, delta, crear=crear)
+
+
+def calcular_totales(cliente_ids=None):
+    """
+    Calcula desde cero los totales por cliente con un GROUP BY por tabla.
+    Devuelve {cliente_id: {campo: total, ...}} solo para clientes con movimientos.
+    """
+    totales = {}
+    for label, (campo, signo, campos_monto) in MOVIMIENTOS_SALDO.items():
+        model = apps.get_model(label)
+        monto = F(campos_monto[0])
+        for extra in campos_monto[1:]:
+            monto = monto + F(extra)
+
+        movimientos = model._default_manager.filter(deleted_at__isnull=True)
+        if cliente_ids is not None:
+            movimientos = movimientos.filter(cliente_id__in=cliente_ids)
+
+        filas = movimientos.order_by().values('cliente_id').annotate(
+            total=Coalesce(Sum(monto), Value(CERO), output_field=DecimalField(max_digits=14, decimal_places=2))
+        )
+        for fila in filas:
+            totales.setdefault(fila['cliente_id'], {})[campo] = fila['total'].quantize(CERO)
+    return totales
+
+
+def construir_saldo(cliente_id, totales):
+    """Arma un ClienteSaldo (sin guardar) a partir de los totales calculados"""
+    saldo = ClienteSaldo(cliente_id=cliente_id)
+    valor_saldo = CERO
+    for campo, signo, _ in MOVIMIENTOS_SALDO.values():
+        total = totales.get(campo, CERO)
+        setattr(saldo, campo, total)
+        valor_saldo += signo * total
+    saldo.saldo = valor_saldo
+    return saldo
+
+
+def recalcular_saldo(cliente_id):
+    """Recalcula y guarda el saldo de un cliente desde cero"""
+    totales = calcular_totales([cliente_id]).get(cliente_id, {})
+    saldo = construir_saldo(cliente_id, totales)
+    defaults = {campo: getattr(saldo, campo) for campo, _, _ in MOVIMIENTOS_SALDO.values()}
+    defaults['saldo'] = saldo.saldo
+    saldo, _ = ClienteSaldo.objects.update_or_create(cliente_id=cliente_id, defaults=defaults)
+    return saldo
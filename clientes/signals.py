@@ -0,0 +1,38 @@
+from django.apps import apps
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from .saldos import MOVIMIENTOS_SALDO, registrar_cambio, valores_guardados, valores_instancia
+
+
+def saldo_pre_save(sender, instance, raw=False, **kwargs):
+    """Guarda el estado previo del movimiento para calcular la diferencia en post_save"""
+    if raw:
+        return
+    _, _, campos_monto = MOVIMIENTOS_SALDO[sender._meta.label]
+    if instance._state.adding or instance.pk is None:
+        instance._saldo_anterior = None
+    else:
+        instance._saldo_anterior = valores_guardados(sender, instance.pk, campos_monto)
+
+
+def saldo_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _, _, campos_monto = MOVIMIENTOS_SALDO[sender._meta.label]
+    anterior = getattr(instance, '_saldo_anterior', None)
+    registrar_cambio(sender, anterior, valores_instancia(instance, campos_monto))
+    instance._saldo_anterior = None
+
+
+def saldo_post_delete(sender, instance, **kwargs):
+    # crear=False: en un borrado en cascada del cliente su saldo ya no existe
+    _, _, campos_monto = MOVIMIENTOS_SALDO[sender._meta.label]
+    registrar_cambio(sender, valores_instancia(instance, campos_monto), None, crear=False)
+
+
+def connect_saldo_signals():
+    for label in MOVIMIENTOS_SALDO:
+        model = apps.get_model(label)
+        pre_save.connect(saldo_pre_save, sender=model, dispatch_uid=f'saldo_pre_save_{label}')
+        post_save.connect(saldo_post_save, sender=model, dispatch_uid=f'saldo_post_save_{label}')
+        post_delete.connect(saldo_post_delete, sender=model, dispatch_uid=f'saldo_post_delete_{label}')
@@ -1,3 +1,305 @@
-from django.test import TestCase
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ajuste_de_saldo.models import AjusteDeSaldo
+from cargos_no_registrados.models import CargoNoRegistrado
+from cotizador.models import Cotizador
+from devoluciones.models import Devolucion
+from etiquetas.models import Etiqueta
+from recepcion_pago.models import RecepcionPago
+from tarjetas.models import Tarjeta
+from users.models import User
+from .estado_cuenta import estado_de_cuenta, saldo_anterior
+from .models import Cliente, ClienteSaldo, PrecioCliente
+from .saldos import MOVIMIENTOS_SALDO
+
+
+def a_las(dia, hora=12):
+    return timezone.make_aware(datetime.combine(dia, datetime.min.time()).replace(hour=hora))
+
+
+class ClienteSaldoTest(TestCase):
+    """El saldo materializado sigue a cada movimiento de las cinco tablas que lo alimentan"""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='contador', email='contador@example.com')
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+        self.otro_cliente = Cliente.objects.create(nombre='Otro cliente')
+        self.tarjeta = Tarjeta.objects.create(numero='1234', titular='Titular', descripcion='Tarjeta')
+        self.etiqueta = Etiqueta.objects.create(nombre='Etiqueta')
+        self.precio = PrecioCliente.objects.create(
+            cliente=self.cliente, descripcion='Precio', precio_lay=Decimal('0'), comision=Decimal('0')
+        )
+
+    def crear(self, model, valor, cliente=None):
+        """Crea un movimiento de `model` cuyo monto en el saldo es `valor`"""
+        cliente = cliente or self.cliente
+        if model is Cotizador:
+            return Cotizador.objects.create(
+                cliente=cliente, etiqueta=self.etiqueta, precio_cliente=self.precio,
+                descripcion='Cotización', precio_lay=valor - Decimal('10.00'), comision=Decimal('10.00'),
+                placa='ABC123', clindraje='150', modelo='2024', chasis='CH1',
+                numero_documento='1', nombre_completo='Nombre', telefono='1', correo='a@example.com', direccion='x',
+            )
+        campos = {'usuario': self.usuario, 'cliente': cliente, 'valor': valor, 'fecha': timezone.now()}
+        if model is not AjusteDeSaldo:
+            campos['tarjeta'] = self.tarjeta
+        return model.objects.create(**campos)
+
+    def cambiar_valor(self, movimiento, valor):
+        if isinstance(movimiento, Cotizador):
+            movimiento.precio_lay = valor - movimiento.comision
+        else:
+            movimiento.valor = valor
+        movimiento.save()
+
+    def saldo(self, cliente=None):
+        return ClienteSaldo.objects.get(cliente=cliente or self.cliente)
+
+    def assertSaldo(self, model, total, cliente=None):
+        campo, signo, _ = MOVIMIENTOS_SALDO[model._meta.label]
+        saldo = self.saldo(cliente)
+        self.assertEqual(getattr(saldo, campo), total)
+        self.assertEqual(saldo.saldo, signo * total)
+
+    def por_modelo(self, prueba):
+        """Ejecuta la prueba con cada una de las cinco tablas, partiendo de cero en cada una"""
+        for model in (RecepcionPago, AjusteDeSaldo, Devolucion, CargoNoRegistrado, Cotizador):
+            with self.subTest(model=model.__name__):
+                prueba(model)
+            model.objects.all().delete()
+            ClienteSaldo.objects.all().delete()
+
+    def test_crear_suma_al_saldo(self):
+        def prueba(model):
+            self.crear(model, Decimal('100.00'))
+            self.crear(model, Decimal('50.00'))
+            self.assertSaldo(model, Decimal('150.00'))
+
+        self.por_modelo(prueba)
+
+    def test_actualizar_valor_aplica_la_diferencia(self):
+        def prueba(model):
+            movimiento = self.crear(model, Decimal('100.00'))
+            self.cambiar_valor(movimiento, Decimal('80.00'))
+            self.assertSaldo(model, Decimal('80.00'))
+
+        self.por_modelo(prueba)
+
+    def test_cambiar_de_cliente_mueve_el_monto(self):
+        def prueba(model):
+            self.crear(model, Decimal('30.00'), cliente=self.otro_cliente)
+            movimiento = self.crear(model, Decimal('100.00'))
+            movimiento.cliente = self.otro_cliente
+            movimiento.save()
+            self.assertSaldo(model, Decimal('0.00'))
+            self.assertSaldo(model, Decimal('130.00'), cliente=self.otro_cliente)
+
+        self.por_modelo(prueba)
+
+    def test_soft_delete_y_restore(self):
+        def prueba(model):
+            movimiento = self.crear(model, Decimal('100.00'))
+            self.crear(model, Decimal('20.00'))
+            movimiento.deleted_at = timezone.now()
+            movimiento.save()
+            self.assertSaldo(model, Decimal('20.00'))
+            movimiento.deleted_at = None
+            movimiento.save()
+            self.assertSaldo(model, Decimal('120.00'))
+
+        self.por_modelo(prueba)
+
+    def test_hard_delete_resta_del_saldo(self):
+        def prueba(model):
+            movimiento = self.crear(model, Decimal('100.00'))
+            self.crear(model, Decimal('20.00'))
+            movimiento.delete()
+            self.assertSaldo(model, Decimal('20.00'))
+
+        self.por_modelo(prueba)
+
+    def test_hard_delete_de_un_movimiento_eliminado_no_cambia_el_saldo(self):
+        def prueba(model):
+            movimiento = self.crear(model, Decimal('100.00'))
+            movimiento.deleted_at = timezone.now()
+            movimiento.save()
+            movimiento.delete()
+            self.assertSaldo(model, Decimal('0.00'))
+
+        self.por_modelo(prueba)
+
+    def test_error_en_el_delta_revierte_el_movimiento(self):
+        def prueba(model):
+            self.crear(model, Decimal('20.00'))
+            with mock.patch('clientes.signals.registrar_cambio', side_effect=DatabaseError('sin conexión')):
+                with self.assertRaises(DatabaseError):
+                    self.crear(model, Decimal('100.00'))
+            self.assertEqual(model.objects.count(), 1)
+            self.assertSaldo(model, Decimal('20.00'))
+
+        self.por_modelo(prueba)
+
+    def test_recalcular_saldos_check(self):
+        self.crear(RecepcionPago, Decimal('100.00'))
+        self.crear(Cotizador, Decimal('40.00'))
+        salida = StringIO()
+        call_command('recalcular_saldos', '--check', stdout=salida)
+        self.assertIn('0 con diferencias', salida.getvalue())
+
+        ClienteSaldo.objects.filter(cliente=self.cliente).update(total_recepciones=Decimal('1.00'))
+        with self.assertRaises(CommandError):
+            call_command('recalcular_saldos', '--check', stdout=StringIO())
+        self.assertEqual(self.saldo().total_recepciones, Decimal('1.00'))
+
+        call_command('recalcular_saldos', stdout=StringIO())
+        saldo = self.saldo()
+        self.assertEqual(saldo.total_recepciones, Decimal('100.00'))
+        self.assertEqual(saldo.saldo, Decimal('60.00'))
+        call_command('recalcular_saldos', '--check', stdout=StringIO())
+
+
+@override_settings(REFERENCE_CACHE_LOCAL_TTL=0)
+class PreciosClienteCacheTest(TestCase):
+    """El cache de precios del cliente se descarta al cambiar sus precios o al borrar el cliente"""
+
+    def setUp(self):
+        cache.clear()
+        usuario = User.objects.create(username='admin', email='admin@example.com', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(usuario)
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+
+    def precios(self):
+        return self.client.get(f'/api/clientes/{self.cliente.pk}/precios/')
+
+    def test_nuevo_precio_invalida(self):
+        self.assertEqual(self.precios().data, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            PrecioCliente.objects.create(
+                cliente=self.cliente, descripcion='Precio', precio_lay=Decimal('10.00'), comision=Decimal('1.00')
+            )
+        self.assertEqual([p['descripcion'] for p in self.precios().data], ['Precio'])
+
+    def test_cliente_sin_precios_borrado_devuelve_404(self):
+        self.assertEqual(self.precios().status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            Cliente.objects.filter(pk=self.cliente.pk).delete()
+        self.assertEqual(self.precios().status_code, 404)
+
+
+class EstadoCuentaTest(TestCase):
+    """Estado de cuenta: orden de las fuentes combinadas, saldo inicial y formatos"""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='admin', email='admin@example.com', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+        self.tarjeta = Tarjeta.objects.create(numero='1234', titular='Titular', descripcion='Tarjeta')
+        self.etiqueta = Etiqueta.objects.create(nombre='Etiqueta')
+        self.precio = PrecioCliente.objects.create(
+            cliente=self.cliente, descripcion='Precio', precio_lay=Decimal('0'), comision=Decimal('0')
+        )
+
+        self.cotizacion = Cotizador.objects.create(
+            cliente=self.cliente, etiqueta=self.etiqueta, precio_cliente=self.precio,
+            descripcion='Cotización', precio_lay=Decimal('90.00'), comision=Decimal('10.00'),
+            placa='ABC123', clindraje='150', modelo='2024', chasis='CH1',
+            numero_documento='1', nombre_completo='Nombre', telefono='1', correo='a@example.com', direccion='x',
+        )
+        Cotizador.objects.filter(pk=self.cotizacion.pk).update(created_at=a_las(date(2025, 3, 2)))
+        self.recepcion = self.crear(RecepcionPago, '150.00', date(2025, 3, 3))
+        self.ajuste_negativo = self.crear(AjusteDeSaldo, '-20.00', date(2025, 3, 2))
+        self.devolucion = self.crear(Devolucion, '15.00', date(2025, 3, 1))
+        self.otra_recepcion = self.crear(RecepcionPago, '5.00', date(2025, 3, 3))
+        eliminada = self.crear(RecepcionPago, '1000.00', date(2025, 3, 2))
+        eliminada.deleted_at = timezone.now()
+        eliminada.save()
+
+    def crear(self, model, valor, dia):
+        campos = {'usuario': self.usuario, 'cliente': self.cliente, 'valor': Decimal(valor), 'fecha': a_las(dia)}
+        if model is not AjusteDeSaldo:
+            campos['tarjeta'] = self.tarjeta
+        return model.objects.create(**campos)
+
+    def estado_cuenta(self, **params):
+        response = self.client.get(f'/api/clientes/{self.cliente.pk}/estado-cuenta/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_orden_por_fecha_fuente_e_id(self):
+        lineas = list(estado_de_cuenta(self.cliente.id))
+        self.assertEqual(
+            [(linea['tipo'], linea['id']) for linea in lineas],
+            [
+                ('devolucion', self.devolucion.id),
+                # Mismo instante: cotizaciones antes que ajustes (orden de FUENTES_ESTADO_CUENTA)
+                ('cotizacion', self.cotizacion.id),
+                ('ajuste', self.ajuste_negativo.id),
+                ('recepcion', self.recepcion.id),
+                ('recepcion', self.otra_recepcion.id),
+            ],
+        )
+        self.assertEqual(
+            [linea['saldo'] for linea in lineas],
+            [Decimal('-15.00'), Decimal('-115.00'), Decimal('-135.00'), Decimal('15.00'), Decimal('20.00')],
+        )
+
+    def test_cargo_y_abono_segun_el_efecto_en_el_saldo(self):
+        lineas = {(linea['tipo'], linea['id']): linea for linea in estado_de_cuenta(self.cliente.id)}
+
+        ajuste = lineas[('ajuste', self.ajuste_negativo.id)]
+        self.assertEqual((ajuste['cargo'], ajuste['abono']), (Decimal('20.00'), Decimal('0.00')))
+        recepcion = lineas[('recepcion', self.recepcion.id)]
+        self.assertEqual((recepcion['cargo'], recepcion['abono']), (Decimal('0.00'), Decimal('150.00')))
+        cotizacion = lineas[('cotizacion', self.cotizacion.id)]
+        self.assertEqual((cotizacion['cargo'], cotizacion['abono']), (Decimal('100.00'), Decimal('0.00')))
+
+    def test_saldo_inicial_desde_start_date(self):
+        self.assertEqual(saldo_anterior(self.cliente.id, date(2025, 3, 3)), Decimal('-135.00'))
+        self.assertEqual(saldo_anterior(self.cliente.id, None), Decimal('0.00'))
+
+        documento = json.loads(self.estado_cuenta(start_date='2025-03-03'))
+        self.assertEqual(documento['saldo_inicial'], '-135.00')
+        self.assertEqual([m['id'] for m in documento['movimientos']], [self.recepcion.id, self.otra_recepcion.id])
+        self.assertEqual(documento['saldo_final'], '20.00')
+
+    def test_formato_json(self):
+        documento = json.loads(self.estado_cuenta(end_date='2025-03-02'))
+        self.assertEqual(documento['cliente'], {'id': self.cliente.id, 'nombre': 'Cliente'})
+        self.assertEqual(documento['saldo_inicial'], '0.00')
+        self.assertEqual([m['tipo'] for m in documento['movimientos']], ['devolucion', 'cotizacion', 'ajuste'])
+        self.assertEqual(documento['movimientos'][-1]['cargo'], '20.00')
+        self.assertEqual(documento['movimientos'][-1]['abono'], '0.00')
+        self.assertEqual(documento['saldo_final'], '-135.00')
+
+    def test_formato_csv(self):
+        filas = list(csv.DictReader(self.estado_cuenta(formato='csv').splitlines()))
+        self.assertEqual(len(filas), 5)
+        self.assertEqual(
+            [(f['tipo'], f['cargo'], f['abono'], f['saldo']) for f in filas[2:4]],
+            [('ajuste', '20.00', '0.00', '-135.00'), ('recepcion', '0.00', '150.00', '15.00')],
+        )
+
+    def test_formato_ndjson(self):
+        filas = [json.loads(linea) for linea in self.estado_cuenta(formato='ndjson').splitlines()]
+        self.assertEqual([f['id'] for f in filas][-2:], [self.recepcion.id, self.otra_recepcion.id])
+        self.assertEqual((filas[2]['cargo'], filas[2]['abono']), ('20.00', '0.00'))
+        self.assertEqual(filas[-1]['saldo'], '20.00')
+
+    def test_formato_invalido(self):
+        response = self.client.get(f'/api/clientes/{self.cliente.pk}/estado-cuenta/', {'formato': 'xml'})
+        self.assertEqual(response.status_code, 400)
@@ -5,6 +5,8 @@ urlpatterns = [
     # Cotizador
     path('list/',                   views.list_cotizadores,     name='list_cotizadores'),
     path('create/',                 views.create_cotizador,     name='create_cotizador'),
+    path('importar/',               views.importar_cotizadores, name='importar_cotizadores'),
+    path('tablero/',                views.tablero_cotizadores,  name='tablero_cotizadores'),
     path('<int:pk>/',               views.get_cotizador,        name='get_cotizador'),
     path('<int:pk>/update/',        views.update_cotizador,     name='update_cotizador'),
     path('<int:pk>/delete/',        views.delete_cotizador,     name='delete_cotizador'),
@@ -15,6 +17,7 @@ urlpatterns = [
     # Transiciones de estado
     path('<int:pk>/cambiar-estado/',  views.cambiar_estado,     name='cambiar_estado'),
     path('<int:pk>/revertir-estado/', views.revertir_estado,    name='revertir_estado'),
+    path('cambiar-estado-masivo/',    views.cambiar_estado_masivo, name='cambiar_estado_masivo'),
 
     # Pagos
     path('<int:cotizador_pk>/pagos/',        views.list_pagos,   name='list_pagos'),
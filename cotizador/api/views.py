@@ -4,13 +4,22 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
-from django.db import DatabaseError
-from django.db.models import Q
-from datetime import datetime
-
-from ..models import Cotizador, CotizadorPagos
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.db.models import Count, Q
+
+from ..models import (
+    Cotizador, CotizadorPagos, ETAPA_CHOICES, ESTADOS_ETAPA, TYPO_DOCUMENTO,
+    estados_desde_etapa, etapa_desde_estados, normalizar_busqueda,
+)
+from backend.listing import ListSpec, listar, filtrar_rango_fechas, Campo, campos, display, relacion, usuario_anidado
+from backend.conditional import agregar_validadores, no_modificado, validadores
+from backend.history_diff import diff_historial
+from ..importacion import ArchivoInvalido, ImportadorCotizadores, leer_filas
 from .permissions import RolePermission
 
+ETAPAS = [etapa for etapa, _ in ETAPA_CHOICES]
+
 
 def serialize_cotizador(cotizador):
     """Convierte un objeto Cotizador a diccionario"""
@@ -46,16 +55,58 @@ def serialize_cotizador(cotizador):
         'telefono': cotizador.telefono,
         'correo': cotizador.correo,
         'direccion': cotizador.direccion,
-        'cotizador_estado': cotizador.cotizador_estado,
-        'tramite_estado': cotizador.tramite_estado,
-        'confirmacion_estado': cotizador.confirmacion_estado,
-        'cargar_pdf_estado': cotizador.cargar_pdf_estado,
+        'etapa': cotizador.etapa,
+        'etapa_display': cotizador.get_etapa_display(),
+        # Flags anteriores derivados de la etapa, para compatibilidad
+        **cotizador.estados,
         'created_at': cotizador.created_at,
         'updated_at': cotizador.updated_at,
         'deleted_at': cotizador.deleted_at,
     }
 
 
+def filtrar_busqueda(cotizadores, search_query):
+    """
+    Filtra por placa, documento o chasis con búsqueda por prefijo sobre las
+    claves normalizadas (indexadas). El icontains sobre nombre_completo solo
+    se usa como respaldo cuando el texto no tiene dígitos (nombres libres).
+    """
+    termino = normalizar_busqueda(search_query)
+    filtro = Q()
+    if termino:
+        # istartswith se traduce a LIKE 'X%' y aprovecha el índice (las claves ya están en mayúsculas)
+        filtro = (
+            Q(placa_busqueda__istartswith=termino) |
+            Q(documento_busqueda__istartswith=termino) |
+            Q(chasis_busqueda__istartswith=termino)
+        )
+    if not any(c.isdigit() for c in search_query):
+        filtro |= Q(nombre_completo__icontains=search_query.strip())
+    return cotizadores.filter(filtro)
+
+
+def filtrar_etapa(cotizadores, query_params):
+    """
+    Filtra por ?etapa=. Por compatibilidad acepta los filtros anteriores
+    ?<x>_estado=1 (está en esa etapa) y ?<x>_estado=0 (no está en esa etapa).
+    Lanza ValueError si la etapa no existe.
+    """
+    etapa = query_params.get('etapa', None)
+    if etapa:
+        if etapa not in ETAPAS:
+            raise ValueError(f"Etapa inválida: {etapa}. Opciones: {', '.join(ETAPAS)}")
+        cotizadores = cotizadores.filter(etapa=etapa)
+
+    for campo, etapa_estado in ESTADOS_ETAPA.items():
+        valor = query_params.get(campo, None)
+        if valor == '1':
+            cotizadores = cotizadores.filter(etapa=etapa_estado)
+        elif valor == '0':
+            cotizadores = cotizadores.exclude(etapa=etapa_estado)
+
+    return cotizadores
+
+
 def serialize_pago(pago):
     """Convierte un objeto CotizadorPagos a diccionario"""
     return {
@@ -121,99 +172,76 @@ def create_cotizador(request):
         )
 
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def list_cotizadores(request):
-    """Listar cotizadores con filtros y paginación"""
-    try:
-        cotizadores = Cotizador.objects.select_related(
-            'usuario', 'cliente', 'etiqueta', 'precio_cliente'
-        ).all()
-
-        # Filtro de búsqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            cotizadores = cotizadores.filter(
-                Q(placa__icontains=search_query) |
-                Q(nombre_completo__icontains=search_query) |
-                Q(numero_documento__icontains=search_query) |
-                Q(chasis__icontains=search_query)
-            )
-
-        # Filtro por cliente
-        cliente_id = request.query_params.get('cliente', None)
-        if cliente_id:
-            cotizadores = cotizadores.filter(cliente_id=cliente_id)
-
-        # Filtro por etiqueta
-        etiqueta_id = request.query_params.get('etiqueta', None)
-        if etiqueta_id:
-            cotizadores = cotizadores.filter(etiqueta_id=etiqueta_id)
-
-        # Filtro por estados
-        cotizador_estado = request.query_params.get('cotizador_estado', None)
-        if cotizador_estado:
-            cotizadores = cotizadores.filter(cotizador_estado=cotizador_estado)
-
-        tramite_estado = request.query_params.get('tramite_estado', None)
-        if tramite_estado:
-            cotizadores = cotizadores.filter(tramite_estado=tramite_estado)
-
-        confirmacion_estado = request.query_params.get('confirmacion_estado', None)
-        if confirmacion_estado:
-            cotizadores = cotizadores.filter(confirmacion_estado=confirmacion_estado)
-
-        cargar_pdf_estado = request.query_params.get('cargar_pdf_estado', None)
-        if cargar_pdf_estado:
-            cotizadores = cotizadores.filter(cargar_pdf_estado=cargar_pdf_estado)
-
-        # Filtro por fecha de creación
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                cotizadores = cotizadores.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'vendedor'])])
+def importar_cotizadores(request):
+    """
+    Importa cotizadores desde un archivo CSV o XLSX (campo multipart 'archivo').
+    Las filas válidas se insertan por lotes; las inválidas se reportan con su
+    número de fila. Con dry_run=1 solo valida.
+    """
+    archivo = request.FILES.get('archivo')
+    if archivo is None:
+        return Response({"error": "El campo archivo es requerido."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                cotizadores = cotizadores.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+    dry_run = request.data.get('dry_run') in ('1', 'true', 'True')
+    try:
+        importador = ImportadorCotizadores(usuario=request.user, dry_run=dry_run)
+        reporte = importador.importar(leer_filas(archivo, archivo.name))
+        return Response(reporte, status=status.HTTP_200_OK)
 
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            cotizadores = cotizadores.filter(deleted_at__isnull=True)
+    except ArchivoInvalido as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except DatabaseError as e:
+        return Response(
+            {"error": f"Error de base de datos: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    except Exception as e:
+        return Response(
+            {"error": f"Error inesperado: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
 
-        # Ordenar
-        cotizadores = cotizadores.order_by('-created_at')
 
-        # Paginación
-        page_size_param = request.query_params.get('page_size', 10)
-        try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
+def estado_desde_etapa(campo):
+    """Flag anterior (<x>_estado) derivado de la columna etapa"""
+    return Campo(('etapa',), lambda fila: estados_desde_etapa(fila['etapa'])[campo])
+
+
+LISTADO_COTIZADORES = ListSpec(
+    queryset=Cotizador.objects.select_related('usuario', 'cliente', 'etiqueta', 'precio_cliente'),
+    serializer=serialize_cotizador,
+    search=filtrar_busqueda,
+    filters={'cliente': 'cliente_id', 'etiqueta': 'etiqueta_id'},
+    extra_filters=(filtrar_etapa,),
+    fields=campos(
+        'id', 'descripcion', 'precio_lay', 'comision', 'placa', 'clindraje', 'modelo', 'chasis',
+        'tipo_documento', 'numero_documento', 'nombre_completo', 'telefono', 'correo', 'direccion',
+        'etapa', 'created_at', 'updated_at', 'deleted_at',
+        usuario=usuario_anidado('usuario'),
+        cliente=relacion('cliente', 'nombre'),
+        etiqueta=relacion('etiqueta', 'nombre', 'color'),
+        precio_cliente=relacion('precio_cliente'),
+        tipo_documento_display=display('tipo_documento', TYPO_DOCUMENTO),
+        etapa_display=display('etapa', ETAPA_CHOICES),
+        **{campo: estado_desde_etapa(campo) for campo in ESTADOS_ETAPA},
+    ),
+)
 
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_cotizadores = paginator.paginate_queryset(cotizadores, request)
 
-        data = [serialize_cotizador(c) for c in paginated_cotizadores]
-        return paginator.get_paginated_response(data)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_cotizadores(request):
+    """
+    Listar cotizadores con filtros y paginación.
 
+    Por defecto pagina por número de página (?page=). Si se envía ?cursor=
+    (vacío para la primera página) usa paginación por cursor sobre
+    (created_at, id), sin COUNT(*) salvo que se pida ?count=1.
+    """
+    try:
+        return listar(request, LISTADO_COTIZADORES)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener cotizadores: {str(e)}"},
@@ -224,13 +252,24 @@ def list_cotizadores(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_cotizador(request, pk):
-    """Obtener un cotizador por ID"""
+    """
+    Obtener un cotizador por ID.
+
+    Responde 304 a If-None-Match / If-Modified-Since si ni el cotizador ni
+    su cliente o etiqueta cambiaron (ver backend/conditional.py).
+    """
     try:
+        etag, ultimo = validadores(request, Cotizador.objects.filter(pk=pk), relaciones=('cliente', 'etiqueta'))
+        response = no_modificado(request, etag, ultimo)
+        if response is not None:
+            return response
+
         cotizador = get_object_or_404(
             Cotizador.objects.select_related('usuario', 'cliente', 'etiqueta', 'precio_cliente'),
             pk=pk
         )
-        return Response(serialize_cotizador(cotizador), status=status.HTTP_200_OK)
+        response = Response(serialize_cotizador(cotizador), status=status.HTTP_200_OK)
+        return agregar_validadores(response, etag, ultimo)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener cotizador: {str(e)}"},
@@ -268,11 +307,15 @@ def update_cotizador(request, pk):
         cotizador.correo = request.data.get('correo', cotizador.correo)
         cotizador.direccion = request.data.get('direccion', cotizador.direccion)
 
-        # Actualizar estados
-        cotizador.cotizador_estado = request.data.get('cotizador_estado', cotizador.cotizador_estado)
-        cotizador.tramite_estado = request.data.get('tramite_estado', cotizador.tramite_estado)
-        cotizador.confirmacion_estado = request.data.get('confirmacion_estado', cotizador.confirmacion_estado)
-        cotizador.cargar_pdf_estado = request.data.get('cargar_pdf_estado', cotizador.cargar_pdf_estado)
+        # Actualizar etapa (acepta también los flags *_estado anteriores)
+        etapa = request.data.get('etapa') or etapa_desde_estados(request.data)
+        if etapa:
+            if etapa not in ETAPAS:
+                return Response(
+                    {"error": f"Etapa inválida: {etapa}. Opciones: {', '.join(ETAPAS)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            cotizador.etapa = etapa
 
         cotizador.save()
 
@@ -352,7 +395,7 @@ def cotizador_history(request, pk):
     """Obtener el historial de cambios de un cotizador"""
     try:
         cotizador = get_object_or_404(Cotizador.objects, pk=pk)
-        history = cotizador.history.all()
+        history = cotizador.history.select_related('history_user')
 
         # Paginación
         page_size_param = request.query_params.get('page_size', 10)
@@ -365,6 +408,10 @@ def cotizador_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
@@ -378,10 +425,8 @@ def cotizador_history(request, pk):
                 } if h.history_user else None,
                 'placa': h.placa,
                 'nombre_completo': h.nombre_completo,
-                'cotizador_estado': h.cotizador_estado,
-                'tramite_estado': h.tramite_estado,
-                'confirmacion_estado': h.confirmacion_estado,
-                'cargar_pdf_estado': h.cargar_pdf_estado,
+                'etapa': h.etapa,
+                **estados_desde_etapa(h.etapa),
             })
 
         return paginator.get_paginated_response(data)
@@ -397,22 +442,70 @@ def cotizador_history(request, pk):
 
 ESTADO_TRANSICIONES = {
     'tramite': {
-        'desde': 'cotizador_estado',
-        'hacia': 'tramite_estado',
+        'desde': 'cotizador',
+        'hacia': 'tramite',
         'nombre': 'Trámite'
     },
     'confirmacion': {
-        'desde': 'tramite_estado',
-        'hacia': 'confirmacion_estado',
+        'desde': 'tramite',
+        'hacia': 'confirmacion',
         'nombre': 'Confirmación'
     },
     'cargaro': {
-        'desde': 'confirmacion_estado',
-        'hacia': 'cargar_pdf_estado',
+        'desde': 'confirmacion',
+        'hacia': 'cargar_pdf',
         'nombre': 'Cargaro'
     },
 }
 
+REVERTIR_TRANSICIONES = {
+    'cotizador': {
+        'desde': 'tramite',
+        'hacia': 'cotizador',
+        'nombre': 'Cotizador'
+    },
+    'tramite': {
+        'desde': 'confirmacion',
+        'hacia': 'tramite',
+        'nombre': 'Trámite'
+    },
+    'confirmacion': {
+        'desde': 'cargar_pdf',
+        'hacia': 'confirmacion',
+        'nombre': 'Confirmación'
+    },
+}
+
+MAX_COTIZADORES_MASIVO = 1000
+
+
+def aplicar_transicion(ids, desde, hacia, user):
+    """
+    Mueve de la etapa `desde` a `hacia` los cotizadores de `ids` que siguen
+    en `desde` (compare-and-set: UPDATE ... WHERE etapa=<desde>) y escribe
+    su historial con bulk_create. Devuelve los ids que se movieron.
+
+    Las filas se bloquean antes del UPDATE para saber exactamente cuáles
+    cambió (MySQL no tiene UPDATE ... RETURNING).
+    """
+    with transaction.atomic():
+        movidos = list(
+            Cotizador.objects.select_for_update()
+            .filter(id__in=ids, etapa=desde)
+            .values_list('id', flat=True)
+        )
+        if movidos:
+            Cotizador.objects.filter(id__in=movidos, etapa=desde).update(
+                etapa=hacia,
+                updated_at=timezone.now(),
+            )
+            Cotizador.history.bulk_history_create(
+                list(Cotizador.objects.filter(id__in=movidos)),
+                update=True,
+                default_user=user,
+            )
+    return movidos
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'vendedor'])])
@@ -423,9 +516,9 @@ def cambiar_estado(request, pk):
     Body: { "paso": "tramite" | "confirmacion" | "cargaro" }
 
     Flujo:
-    - cotizador(1) → tramite: cotizador_estado=0, tramite_estado=1
-    - tramite(1) → confirmacion: tramite_estado=0, confirmacion_estado=1
-    - confirmacion(1) → cargaro: confirmacion_estado=0, cargar_pdf_estado=1
+    - cotizador → tramite
+    - tramite → confirmacion
+    - confirmacion → cargar_pdf (cargaro)
     """
     try:
         cotizador = get_object_or_404(Cotizador.objects, pk=pk)
@@ -444,28 +537,20 @@ def cambiar_estado(request, pk):
             )
 
         transicion = ESTADO_TRANSICIONES[paso]
-        campo_desde = transicion['desde']
-        campo_hacia = transicion['hacia']
-
-        # Verificar que el estado actual permita la transición
-        if getattr(cotizador, campo_desde) != '1':
-            return Response(
-                {"error": f"No se puede avanzar a {transicion['nombre']}. El estado anterior no está activo."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
-        # Verificar que no se haya pasado ya a este estado
-        if getattr(cotizador, campo_hacia) == '1':
+        # Realizar la transición solo si sigue en la etapa anterior
+        if not aplicar_transicion([cotizador.id], transicion['desde'], transicion['hacia'], request.user):
+            cotizador.refresh_from_db(fields=['etapa'])
+            if cotizador.etapa == transicion['hacia']:
+                error = f"El cotizador ya está en estado {transicion['nombre']}."
+            else:
+                error = f"No se puede avanzar a {transicion['nombre']}. El estado anterior no está activo."
             return Response(
-                {"error": f"El cotizador ya está en estado {transicion['nombre']}."},
+                {"error": error},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Realizar la transición
-        setattr(cotizador, campo_desde, '0')
-        setattr(cotizador, campo_hacia, '1')
-        cotizador.save()
-
+        cotizador.refresh_from_db()
         return Response({
             "message": f"Estado actualizado a {transicion['nombre']} correctamente",
             "cotizador": serialize_cotizador(cotizador)
@@ -487,32 +572,14 @@ def revertir_estado(request, pk):
     Body: { "paso": "cotizador" | "tramite" | "confirmacion" }
 
     Flujo inverso:
-    - tramite(1) → cotizador: tramite_estado=0, cotizador_estado=1
-    - confirmacion(1) → tramite: confirmacion_estado=0, tramite_estado=1
-    - cargaro(1) → confirmacion: cargar_pdf_estado=0, confirmacion_estado=1
+    - tramite → cotizador
+    - confirmacion → tramite
+    - cargar_pdf → confirmacion
     """
     try:
         cotizador = get_object_or_404(Cotizador.objects, pk=pk)
         paso = request.data.get('paso')
 
-        REVERTIR_TRANSICIONES = {
-            'cotizador': {
-                'desde': 'tramite_estado',
-                'hacia': 'cotizador_estado',
-                'nombre': 'Cotizador'
-            },
-            'tramite': {
-                'desde': 'confirmacion_estado',
-                'hacia': 'tramite_estado',
-                'nombre': 'Trámite'
-            },
-            'confirmacion': {
-                'desde': 'cargar_pdf_estado',
-                'hacia': 'confirmacion_estado',
-                'nombre': 'Confirmación'
-            },
-        }
-
         if not paso:
             return Response(
                 {"error": "El campo 'paso' es requerido. Opciones: cotizador, tramite, confirmacion"},
@@ -526,21 +593,15 @@ def revertir_estado(request, pk):
             )
 
         transicion = REVERTIR_TRANSICIONES[paso]
-        campo_desde = transicion['desde']
-        campo_hacia = transicion['hacia']
 
-        # Verificar que el estado actual permita la reversión
-        if getattr(cotizador, campo_desde) != '1':
+        # Realizar la reversión solo si sigue en la etapa actual esperada
+        if not aplicar_transicion([cotizador.id], transicion['desde'], transicion['hacia'], request.user):
             return Response(
                 {"error": f"No se puede revertir a {transicion['nombre']}. El estado actual no lo permite."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Realizar la reversión
-        setattr(cotizador, campo_desde, '0')
-        setattr(cotizador, campo_hacia, '1')
-        cotizador.save()
-
+        cotizador.refresh_from_db()
         return Response({
             "message": f"Estado revertido a {transicion['nombre']} correctamente",
             "cotizador": serialize_cotizador(cotizador)
@@ -553,6 +614,187 @@ def revertir_estado(request, pk):
         )
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'vendedor'])])
+def cambiar_estado_masivo(request):
+    """
+    Avanzar varios cotizadores al siguiente paso en una sola operación.
+
+    Body: { "ids": [1, 2, 3], "paso": "tramite" | "confirmacion" | "cargaro" }
+
+    Los cotizadores que siguen en la etapa de origen se mueven con un único
+    UPDATE ... WHERE etapa=<desde> y su historial se escribe con bulk_create.
+    Responde los ids actualizados y los que fallaron con el motivo.
+    """
+    try:
+        ids = request.data.get('ids')
+        paso = request.data.get('paso')
+
+        if not paso:
+            return Response(
+                {"error": "El campo 'paso' es requerido. Opciones: tramite, confirmacion, cargaro"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if paso not in ESTADO_TRANSICIONES:
+            return Response(
+                {"error": f"Paso inválido: {paso}. Opciones: tramite, confirmacion, cargaro"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not isinstance(ids, list) or not ids:
+            return Response(
+                {"error": "El campo 'ids' debe ser una lista de ids no vacía."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in ids))
+        except (ValueError, TypeError):
+            return Response(
+                {"error": "Todos los ids deben ser números enteros."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if len(ids) > MAX_COTIZADORES_MASIVO:
+            return Response(
+                {"error": f"Máximo {MAX_COTIZADORES_MASIVO} cotizadores por operación."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        transicion = ESTADO_TRANSICIONES[paso]
+        exitosos = set(aplicar_transicion(ids, transicion['desde'], transicion['hacia'], request.user))
+
+        pendientes = [pk for pk in ids if pk not in exitosos]
+        etapas = dict(Cotizador.objects.filter(id__in=pendientes).values_list('id', 'etapa'))
+
+        fallidos = []
+        for pk in pendientes:
+            etapa = etapas.get(pk)
+            if etapa is None:
+                error = "El cotizador no existe."
+            elif etapa == transicion['hacia']:
+                error = f"El cotizador ya está en estado {transicion['nombre']}."
+            else:
+                error = f"No se puede avanzar a {transicion['nombre']}. El estado anterior no está activo."
+            fallidos.append({'id': pk, 'error': error})
+
+        return Response({
+            "message": f"{len(exitosos)} cotizadores actualizados a {transicion['nombre']}",
+            "exitosos": [pk for pk in ids if pk in exitosos],
+            "fallidos": fallidos,
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response(
+            {"error": f"Error al cambiar estados: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+# ==================== TABLERO ====================
+
+TABLERO_LIMITE_DEFECTO = 20
+TABLERO_LIMITE_MAXIMO = 100
+
+
+def serialize_tarjeta_tablero(cotizador):
+    """Versión reducida del cotizador para las tarjetas del tablero"""
+    return {
+        'id': cotizador.id,
+        'cliente': {
+            'id': cotizador.cliente.id,
+            'nombre': cotizador.cliente.nombre,
+        } if cotizador.cliente else None,
+        'placa': cotizador.placa,
+        'numero_documento': cotizador.numero_documento,
+        'nombre_completo': cotizador.nombre_completo,
+        'precio_lay': str(cotizador.precio_lay),
+        'comision': str(cotizador.comision),
+        'created_at': cotizador.created_at,
+    }
+
+
+def agrupar_por_etiqueta(cotizadores):
+    """Agrupa las tarjetas por etiqueta manteniendo el orden en que aparecen"""
+    grupos = {}
+    for cotizador in cotizadores:
+        grupo = grupos.get(cotizador.etiqueta_id)
+        if grupo is None:
+            grupo = grupos[cotizador.etiqueta_id] = {
+                'etiqueta': {
+                    'id': cotizador.etiqueta.id,
+                    'nombre': cotizador.etiqueta.nombre,
+                    'color': cotizador.etiqueta.color,
+                } if cotizador.etiqueta else None,
+                'cotizadores': [],
+            }
+        grupo['cotizadores'].append(serialize_tarjeta_tablero(cotizador))
+    return list(grupos.values())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def tablero_cotizadores(request):
+    """
+    Tablero del flujo de cotizadores: total por etapa (un solo GROUP BY
+    sobre etapa) y las primeras `limit` tarjetas de cada etapa, agrupadas por
+    etiqueta, de la más reciente a la más antigua.
+
+    Query params: cliente, etiqueta, start_date, end_date (YYYY-MM-DD), limit
+    """
+    try:
+        cotizadores = Cotizador.objects.filter(deleted_at__isnull=True)
+
+        cliente_id = request.query_params.get('cliente', None)
+        if cliente_id:
+            cotizadores = cotizadores.filter(cliente_id=cliente_id)
+
+        etiqueta_id = request.query_params.get('etiqueta', None)
+        if etiqueta_id:
+            cotizadores = cotizadores.filter(etiqueta_id=etiqueta_id)
+
+        try:
+            cotizadores = filtrar_rango_fechas(cotizadores, 'created_at', request.query_params)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limite = int(request.query_params.get('limit', TABLERO_LIMITE_DEFECTO))
+        except (ValueError, TypeError):
+            limite = TABLERO_LIMITE_DEFECTO
+        limite = min(max(limite, 0), TABLERO_LIMITE_MAXIMO)
+
+        totales = dict(
+            cotizadores.order_by().values('etapa').annotate(total=Count('id')).values_list('etapa', 'total')
+        )
+
+        etapas = []
+        for etapa, nombre in ETAPA_CHOICES:
+            total = totales.get(etapa, 0)
+            tarjetas = []
+            if limite and total:
+                tarjetas = cotizadores.filter(etapa=etapa).select_related(
+                    'cliente', 'etiqueta'
+                ).order_by('-created_at', '-id')[:limite]
+            etapas.append({
+                'etapa': etapa,
+                'nombre': nombre,
+                'total': total,
+                'etiquetas': agrupar_por_etiqueta(tarjetas),
+            })
+
+        return Response({'etapas': etapas}, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response(
+            {"error": f"Error al obtener el tablero: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 # ==================== PAGOS ====================
 
 @api_view(['POST'])
@@ -0,0 +1,238 @@
+"""
+Importación masiva de cotizadores desde CSV o XLSX.
+
+El archivo se lee fila por fila (csv.DictReader / openpyxl en modo
+read_only) y se procesa por lotes de chunk_size filas:
+
+1. Las referencias (cliente, etiqueta, precio_cliente) se validan contra
+   conjuntos de ids activos cargados una sola vez al inicio; el precio debe
+   pertenecer al cliente de la fila.
+2. Los demás campos se validan con los campos del modelo (largo máximo,
+   decimales, choices, correo).
+3. Las filas válidas del lote se insertan con bulk_create_with_history
+   (cotizadores + historial) y el saldo de cada cliente afectado se ajusta con
+   un solo UPDATE por cliente, en la misma transacción del lote. bulk_create
+   no llama a save() ni envía señales, así que las claves de búsqueda y el
+   saldo se calculan aquí.
+
+Las filas con errores no se insertan y se reportan con su número de fila
+(la fila 1 es el encabezado).
+"""
+import csv
+import io
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from simple_history.utils import bulk_create_with_history
+
+from clientes.models import Cliente, PrecioCliente
+from clientes.saldos import MOVIMIENTOS_SALDO, CERO, aplicar_delta, monto_movimiento
+from etiquetas.models import Etiqueta
+
+from .models import Cotizador, normalizar_busqueda
+
+COLUMNAS_REQUERIDAS = [
+    'cliente', 'etiqueta', 'precio_cliente', 'descripcion', 'precio_lay', 'comision',
+    'placa', 'clindraje', 'modelo', 'chasis', 'numero_documento', 'nombre_completo',
+    'telefono', 'correo', 'direccion',
+]
+COLUMNAS_OPCIONALES = ['tipo_documento', 'etapa']
+CAMPOS_VALOR = [c for c in COLUMNAS_REQUERIDAS + COLUMNAS_OPCIONALES if c not in ('cliente', 'etiqueta', 'precio_cliente')]
+
+MAX_ERRORES_REPORTE = 1000
+
+
+class ArchivoInvalido(ValueError):
+    """El archivo no se puede leer o no tiene las columnas requeridas"""
+
+
+def normalizar_encabezado(encabezado):
+    return [str(columna or '').strip().lower() for columna in encabezado]
+
+
+def validar_encabezado(encabezado):
+    faltantes = [columna for columna in COLUMNAS_REQUERIDAS if columna not in encabezado]
+    if faltantes:
+        raise ArchivoInvalido(f"Faltan columnas en el archivo: {', '.join(faltantes)}")
+
+
+def leer_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    try:
+        lector = csv.reader(texto)
+        encabezado = normalizar_encabezado(next(lector, []))
+        validar_encabezado(encabezado)
+        for valores in lector:
+            if not any(valor.strip() for valor in valores):
+                continue
+            yield dict(zip(encabezado, valores))
+    except UnicodeDecodeError:
+        raise ArchivoInvalido("El archivo CSV debe estar en UTF-8.")
+    finally:
+        texto.detach()
+
+
+def leer_xlsx(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ArchivoInvalido("La importación de XLSX requiere openpyxl.")
+
+    try:
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+    except Exception:
+        raise ArchivoInvalido("No se pudo leer el archivo XLSX.")
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = normalizar_encabezado(next(filas, ()))
+        validar_encabezado(encabezado)
+        for valores in filas:
+            if all(valor is None or str(valor).strip() == '' for valor in valores):
+                continue
+            yield dict(zip(encabezado, ('' if valor is None else valor for valor in valores)))
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre):
+    """Filas del archivo como dicts {columna: valor}; el formato se toma de la extensión"""
+    nombre = (nombre or '').lower()
+    if nombre.endswith('.csv'):
+        return leer_csv(archivo)
+    if nombre.endswith('.xlsx'):
+        return leer_xlsx(archivo)
+    raise ArchivoInvalido("Formato no soportado. Opciones: .csv, .xlsx")
+
+
+def texto(valor):
+    """Valor de celda como texto; los números enteros de Excel llegan como int/float"""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+class ImportadorCotizadores:
+    """Valida e inserta cotizadores por lotes, acumulando el reporte de errores"""
+
+    def __init__(self, usuario=None, chunk_size=1000, dry_run=False):
+        self.usuario = usuario
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.total = 0
+        self.creados = 0
+        self.con_errores = 0
+        self.errores = []
+        self.campos = {campo: Cotizador._meta.get_field(campo) for campo in CAMPOS_VALOR}
+
+        # Referencias activas cargadas una sola vez
+        self.clientes = set(Cliente.objects.filter(deleted_at__isnull=True).values_list('id', flat=True))
+        self.etiquetas = set(Etiqueta.objects.filter(deleted_at__isnull=True).values_list('id', flat=True))
+        self.precios = dict(
+            PrecioCliente.objects.filter(deleted_at__isnull=True).values_list('id', 'cliente_id')
+        )
+
+    def referencia(self, fila, campo, errores):
+        valor = texto(fila.get(campo, ''))
+        if not valor:
+            errores.append(f"El campo {campo} es requerido.")
+            return None
+        try:
+            return int(valor)
+        except ValueError:
+            errores.append(f"El campo {campo} debe ser un id numérico.")
+            return None
+
+    def validar(self, fila):
+        """(cotizador sin guardar, []) o (None, [errores])"""
+        errores = []
+        cliente_id = self.referencia(fila, 'cliente', errores)
+        etiqueta_id = self.referencia(fila, 'etiqueta', errores)
+        precio_id = self.referencia(fila, 'precio_cliente', errores)
+
+        if cliente_id is not None and cliente_id not in self.clientes:
+            errores.append(f"El cliente {cliente_id} no existe o está eliminado.")
+        if etiqueta_id is not None and etiqueta_id not in self.etiquetas:
+            errores.append(f"La etiqueta {etiqueta_id} no existe o está eliminada.")
+        if precio_id is not None:
+            if precio_id not in self.precios:
+                errores.append(f"El precio {precio_id} no existe o está eliminado.")
+            elif cliente_id is not None and self.precios[precio_id] != cliente_id:
+                errores.append(f"El precio {precio_id} no pertenece al cliente {cliente_id}.")
+
+        valores = {}
+        for campo, field in self.campos.items():
+            valor = texto(fila.get(campo, ''))
+            if not valor:
+                if campo in COLUMNAS_REQUERIDAS:
+                    errores.append(f"El campo {campo} es requerido.")
+                continue
+            try:
+                valores[campo] = field.clean(valor, None)
+            except ValidationError as e:
+                errores.append(f"El campo {campo} no es válido: {' '.join(e.messages)}")
+
+        if errores:
+            return None, errores
+
+        cotizador = Cotizador(
+            cliente_id=cliente_id,
+            etiqueta_id=etiqueta_id,
+            precio_cliente_id=precio_id,
+            **valores,
+        )
+        cotizador.placa_busqueda = normalizar_busqueda(cotizador.placa)
+        cotizador.documento_busqueda = normalizar_busqueda(cotizador.numero_documento)
+        cotizador.chasis_busqueda = normalizar_busqueda(cotizador.chasis)
+        return cotizador, []
+
+    def registrar_errores(self, numero, errores):
+        self.con_errores += 1
+        if len(self.errores) < MAX_ERRORES_REPORTE:
+            self.errores.append({'fila': numero, 'errores': errores})
+
+    def insertar(self, lote):
+        """Inserta un lote válido con su historial y ajusta el saldo de los clientes, todo en una transacción"""
+        campo, signo, campos_monto = MOVIMIENTOS_SALDO[Cotizador._meta.label]
+        deltas = {}
+        for cotizador in lote:
+            monto = monto_movimiento({c: getattr(cotizador, c) for c in campos_monto}, campos_monto)
+            deltas[cotizador.cliente_id] = deltas.get(cotizador.cliente_id, CERO) + monto
+
+        with transaction.atomic():
+            bulk_create_with_history(lote, Cotizador, batch_size=self.chunk_size, default_user=self.usuario)
+            for cliente_id, delta in deltas.items():
+                aplicar_delta(cliente_id, campo, signo, delta)
+        self.creados += len(lote)
+
+    def importar(self, filas):
+        lote = []
+        for numero, fila in enumerate(filas, start=2):
+            self.total += 1
+            cotizador, errores = self.validar(fila)
+            if errores:
+                self.registrar_errores(numero, errores)
+                continue
+            lote.append(cotizador)
+            if len(lote) >= self.chunk_size:
+                self.vaciar(lote)
+                lote = []
+        self.vaciar(lote)
+        return self.reporte()
+
+    def vaciar(self, lote):
+        if not lote:
+            return
+        if self.dry_run:
+            self.creados += len(lote)
+            return
+        self.insertar(lote)
+
+    def reporte(self):
+        return {
+            'dry_run': self.dry_run,
+            'total_filas': self.total,
+            'creados': self.creados,
+            'con_errores': self.con_errores,
+            'errores': self.errores,
+            'errores_truncados': self.con_errores > len(self.errores),
+        }
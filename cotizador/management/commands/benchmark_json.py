@@ -0,0 +1,81 @@
+import time
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from backend.parsers import UJSONParser
+from backend.renderers import UJSONRenderer
+from clientes.models import Cliente, PrecioCliente
+from cotizador.api.views import serialize_cotizador
+from cotizador.models import Cotizador
+from etiquetas.models import Etiqueta
+
+
+class Command(BaseCommand):
+    help = 'Compara JSONRenderer/JSONParser de DRF contra los de ujson sobre una página de cotizadores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help='Cotizadores por página')
+        parser.add_argument('--iterations', type=int, default=200, help='Repeticiones por medición')
+
+    def handle(self, *args, **options):
+        rows, iterations = options['rows'], options['iterations']
+        pagina = self.construir_pagina(rows)
+
+        resultados = []
+        for nombre, renderer, parser in (
+            ('json (DRF)', JSONRenderer(), JSONParser()),
+            ('ujson', UJSONRenderer(), UJSONParser()),
+        ):
+            contenido = renderer.render(pagina)
+            render = self.medir(lambda: renderer.render(pagina), iterations)
+            parse = self.medir(lambda: parser.parse(BytesIO(contenido)), iterations)
+            resultados.append((nombre, render, parse, len(contenido)))
+
+        self.stdout.write(f'Página de {rows} cotizadores, {iterations} iteraciones (ms por página)')
+        self.stdout.write(f'{"":<12}{"render":>10}{"parse":>10}{"bytes":>10}')
+        for nombre, render, parse, tamano in resultados:
+            self.stdout.write(f'{nombre:<12}{render:>10.3f}{parse:>10.3f}{tamano:>10}')
+
+        base, rapido = resultados[0], resultados[1]
+        self.stdout.write(self.style.SUCCESS(
+            f'render x{base[1] / rapido[1]:.1f}, parse x{base[2] / rapido[2]:.1f}'
+        ))
+
+    def medir(self, funcion, iterations):
+        funcion()
+        inicio = time.perf_counter()
+        for _ in range(iterations):
+            funcion()
+        return (time.perf_counter() - inicio) * 1000 / iterations
+
+    def construir_pagina(self, rows):
+        """Página como la que devuelve list_cotizadores, armada en memoria (sin base de datos)"""
+        ahora = timezone.now()
+        cliente = Cliente(id=1, nombre='Cliente de prueba')
+        etiqueta = Etiqueta(id=1, nombre='Urgente', color='#d32f2f')
+        precio = PrecioCliente(id=1, cliente=cliente, descripcion='Tarifa', precio_lay=Decimal('150000.00'), comision=Decimal('25000.00'))
+
+        resultados = []
+        for i in range(1, rows + 1):
+            cotizador = Cotizador(
+                id=i, cliente=cliente, etiqueta=etiqueta, precio_cliente=precio,
+                descripcion='Traspaso de vehículo con levantamiento de prenda',
+                precio_lay=Decimal('150000.00') + i, comision=Decimal('25000.50'),
+                placa=f'ABC{i:03d}', clindraje='1600', modelo='2020', chasis=f'9BWZZZ377VT{i:06d}',
+                numero_documento=f'{1000000000 + i}', nombre_completo='Juan Pérez Gómez',
+                telefono='3001234567', correo='juan@example.com', direccion='Calle 10 # 20-30, Bogotá',
+                created_at=ahora, updated_at=ahora,
+            )
+            resultados.append(serialize_cotizador(cotizador))
+
+        return {
+            'count': rows,
+            'next': 'http://localhost/api/cotizador/list/?page=2',
+            'previous': None,
+            'results': resultados,
+        }
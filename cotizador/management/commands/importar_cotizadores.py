@@ -0,0 +1,46 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from cotizador.importacion import ArchivoInvalido, ImportadorCotizadores, leer_filas
+
+
+class Command(BaseCommand):
+    help = 'Importa cotizadores desde un archivo CSV o XLSX y reporta los errores por fila'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument('--usuario', help='Email del usuario registrado en el historial de los cotizadores creados')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Filas por lote insertado')
+        parser.add_argument('--dry-run', action='store_true', help='Solo valida, no inserta')
+        parser.add_argument('--reporte', help='Ruta donde guardar el reporte completo en JSON')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            User = get_user_model()
+            try:
+                usuario = User.objects.get_by_natural_key(options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"El usuario {options['usuario']} no existe")
+
+        importador = ImportadorCotizadores(
+            usuario=usuario, chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+        )
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                reporte = importador.importar(leer_filas(archivo, options['archivo']))
+        except (OSError, ArchivoInvalido) as e:
+            raise CommandError(str(e))
+
+        for error in reporte['errores'][:20]:
+            self.stdout.write(self.style.WARNING(f"Fila {error['fila']}: {' '.join(error['errores'])}"))
+        if options['reporte']:
+            with open(options['reporte'], 'w', encoding='utf-8') as salida:
+                json.dump(reporte, salida, ensure_ascii=False, indent=2)
+
+        accion = 'validadas' if options['dry_run'] else 'creados'
+        self.stdout.write(self.style.SUCCESS(
+            f"{reporte['total_filas']} filas, {reporte['creados']} {accion}, {reporte['con_errores']} con errores"
+        ))
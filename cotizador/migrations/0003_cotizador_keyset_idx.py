@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizador', '0002_rename_cargaro_estado_cotizador_cargar_pdf_estado_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cotizador',
+            index=models.Index(fields=['deleted_at', 'created_at', 'id'], name='cotizador_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2 on 2026-10-17 03:30
+
+import re
+
+from django.db import migrations, models
+
+
+def normalizar(valor):
+    return re.sub(r'[\W_]+', '', (valor or '').upper())
+
+
+def poblar_claves_busqueda(apps, schema_editor):
+    Cotizador = apps.get_model('cotizador', 'Cotizador')
+    lote = []
+    for cotizador in Cotizador.objects.only('id', 'placa', 'numero_documento', 'chasis').iterator(chunk_size=2000):
+        cotizador.placa_busqueda = normalizar(cotizador.placa)
+        cotizador.documento_busqueda = normalizar(cotizador.numero_documento)
+        cotizador.chasis_busqueda = normalizar(cotizador.chasis)
+        lote.append(cotizador)
+        if len(lote) >= 2000:
+            Cotizador.objects.bulk_update(lote, ['placa_busqueda', 'documento_busqueda', 'chasis_busqueda'])
+            lote = []
+    if lote:
+        Cotizador.objects.bulk_update(lote, ['placa_busqueda', 'documento_busqueda', 'chasis_busqueda'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizador', '0003_cotizador_keyset_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cotizador',
+            name='chasis_busqueda',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='cotizador',
+            name='documento_busqueda',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='cotizador',
+            name='placa_busqueda',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(poblar_claves_busqueda, migrations.RunPython.noop),
+    ]
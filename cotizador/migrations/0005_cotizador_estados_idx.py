@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizador', '0004_cotizador_claves_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cotizador',
+            index=models.Index(fields=['deleted_at', 'cotizador_estado', 'tramite_estado', 'confirmacion_estado', 'cargar_pdf_estado'], name='cotizador_estados_idx'),
+        ),
+    ]
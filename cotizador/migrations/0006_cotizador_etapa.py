@@ -0,0 +1,90 @@
+# Generated by Django 4.2 on 2026-10-17 03:41
+
+from django.db import migrations, models
+
+
+ETAPA_CHOICES = [('cotizador', 'Cotizador'), ('tramite', 'Trámite'), ('confirmacion', 'Confirmación'), ('cargar_pdf', 'Cargar PDF')]
+
+# En orden del flujo: si hay varios flags en '1' queda la etapa más avanzada
+ESTADOS_ETAPA = [
+    ('cotizador_estado', 'cotizador'),
+    ('tramite_estado', 'tramite'),
+    ('confirmacion_estado', 'confirmacion'),
+    ('cargar_pdf_estado', 'cargar_pdf'),
+]
+
+
+def poblar_etapa(apps, schema_editor):
+    for nombre in ('Cotizador', 'HistoricalCotizador'):
+        model = apps.get_model('cotizador', nombre)
+        for campo, etapa in ESTADOS_ETAPA[1:]:
+            model.objects.filter(**{campo: '1'}).update(etapa=etapa)
+
+
+def poblar_estados(apps, schema_editor):
+    for nombre in ('Cotizador', 'HistoricalCotizador'):
+        model = apps.get_model('cotizador', nombre)
+        model.objects.update(**{campo: '0' for campo, _ in ESTADOS_ETAPA})
+        for campo, etapa in ESTADOS_ETAPA:
+            model.objects.filter(etapa=etapa).update(**{campo: '1'})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizador', '0005_cotizador_estados_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cotizador',
+            name='etapa',
+            field=models.CharField(choices=ETAPA_CHOICES, default='cotizador', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='historicalcotizador',
+            name='etapa',
+            field=models.CharField(choices=ETAPA_CHOICES, default='cotizador', max_length=20),
+        ),
+        migrations.RunPython(poblar_etapa, poblar_estados),
+        migrations.RemoveIndex(
+            model_name='cotizador',
+            name='cotizador_estados_idx',
+        ),
+        migrations.RemoveField(
+            model_name='cotizador',
+            name='cargar_pdf_estado',
+        ),
+        migrations.RemoveField(
+            model_name='cotizador',
+            name='confirmacion_estado',
+        ),
+        migrations.RemoveField(
+            model_name='cotizador',
+            name='cotizador_estado',
+        ),
+        migrations.RemoveField(
+            model_name='cotizador',
+            name='tramite_estado',
+        ),
+        migrations.RemoveField(
+            model_name='historicalcotizador',
+            name='cargar_pdf_estado',
+        ),
+        migrations.RemoveField(
+            model_name='historicalcotizador',
+            name='confirmacion_estado',
+        ),
+        migrations.RemoveField(
+            model_name='historicalcotizador',
+            name='cotizador_estado',
+        ),
+        migrations.RemoveField(
+            model_name='historicalcotizador',
+            name='tramite_estado',
+        ),
+        migrations.AddIndex(
+            model_name='cotizador',
+            index=models.Index(fields=['etapa', 'deleted_at', 'created_at', 'id'], name='cotizador_etapa_idx'),
+        ),
+    ]
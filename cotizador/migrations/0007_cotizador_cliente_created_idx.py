@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizador', '0006_cotizador_etapa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cotizador',
+            index=models.Index(fields=['cliente', 'deleted_at', 'created_at', 'id'], name='cotizador_cli_del_created_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-17 04:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cotizador', '0007_cotizador_cliente_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cotizador',
+            name='usuario',
+            field=models.ForeignKey(blank=True, help_text='Usuario asociado al cotizador', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cotizadores', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='historicalcotizador',
+            name='usuario',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='Usuario asociado al cotizador', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
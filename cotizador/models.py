@@ -1,8 +1,12 @@
+import re
+
 from django.db import models
 from clientes.models import Cliente, PrecioCliente
 from etiquetas.models import Etiqueta
 from django.conf import settings
 from simple_history.models import HistoricalRecords
+from backend.history import BufferedHistoricalRecords
+from backend.atomic import GuardadoAtomico
 
 TYPO_DOCUMENTO = [
     ('CC', 'Cédula de Ciudadanía'),
@@ -11,13 +15,43 @@ TYPO_DOCUMENTO = [
     ('PAS', 'Pasaporte'),
 ]
 
-ESTADO_CHOICES = [
-    ('0', 'Inactivo'),
-    ('1', 'Activo'),
+ETAPA_CHOICES = [
+    ('cotizador', 'Cotizador'),
+    ('tramite', 'Trámite'),
+    ('confirmacion', 'Confirmación'),
+    ('cargar_pdf', 'Cargar PDF'),
 ]
+
+# Flags de estado anteriores ('0'/'1') -> etapa que representan, en orden del flujo
+ESTADOS_ETAPA = {
+    'cotizador_estado': 'cotizador',
+    'tramite_estado': 'tramite',
+    'confirmacion_estado': 'confirmacion',
+    'cargar_pdf_estado': 'cargar_pdf',
+}
+
+
+def estados_desde_etapa(etapa):
+    """Los cuatro flags anteriores equivalentes a una etapa ('1' solo en la etapa actual)"""
+    return {campo: '1' if etapa == valor else '0' for campo, valor in ESTADOS_ETAPA.items()}
+
+
+def etapa_desde_estados(estados):
+    """Etapa equivalente a una combinación de flags anteriores: la más avanzada en '1', o None"""
+    etapa = None
+    for campo, valor in ESTADOS_ETAPA.items():
+        if str(estados.get(campo)) == '1':
+            etapa = valor
+    return etapa
+
+
+def normalizar_busqueda(valor):
+    """Normaliza un texto para búsqueda: mayúsculas, sin espacios ni puntuación ('abc-12 3' -> 'ABC123')"""
+    return re.sub(r'[\W_]+', '', (valor or '').upper())
+
 # Create your models here.
-class Cotizador(models.Model):
-    usuario        = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.SET_NULL,related_name='cotizadores',help_text='Usuario asociado al cotizador'),
+class Cotizador(GuardadoAtomico, models.Model):
+    usuario        = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.SET_NULL,null=True,blank=True,related_name='cotizadores',help_text='Usuario asociado al cotizador')
     cliente        = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='cotizadores')
     etiqueta       = models.ForeignKey(Etiqueta, on_delete=models.CASCADE, related_name='cotizadores')
     precio_cliente = models.ForeignKey(PrecioCliente, on_delete=models.CASCADE, related_name='cotizadores')
@@ -38,10 +72,13 @@ class Cotizador(models.Model):
     correo           = models.EmailField()
     direccion        = models.TextField()
 
-    cotizador_estado     = models.CharField(max_length=1, choices=ESTADO_CHOICES, default='1')
-    tramite_estado       = models.CharField(max_length=1, choices=ESTADO_CHOICES, default='0')
-    confirmacion_estado  = models.CharField(max_length=1, choices=ESTADO_CHOICES, default='0')
-    cargar_pdf_estado    = models.CharField(max_length=1, choices=ESTADO_CHOICES, default='0')
+    # Posición en el flujo; reemplaza a los flags cotizador/tramite/confirmacion/cargar_pdf_estado
+    etapa = models.CharField(max_length=20, choices=ETAPA_CHOICES, default='cotizador')
+
+    # Claves de búsqueda normalizadas, se sincronizan en save()
+    placa_busqueda     = models.CharField(max_length=20, db_index=True, editable=False, default='')
+    documento_busqueda = models.CharField(max_length=50, db_index=True, editable=False, default='')
+    chasis_busqueda    = models.CharField(max_length=50, db_index=True, editable=False, default='')
 
     #image_url = models.ImageField(upload_to='cotizadores/images/', null=True, blank=True)
     #pdf_url   = models.FileField(upload_to='cotizadores/pdfs/', null=True, blank=True)
@@ -50,21 +87,43 @@ class Cotizador(models.Model):
     updated_at  = models.DateTimeField(auto_now=True)
     deleted_at  = models.DateTimeField(null=True, blank=True)
 
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords(excluded_fields=['placa_busqueda', 'documento_busqueda', 'chasis_busqueda'])
 
     class Meta:
         db_table = 'cotizadores'
         ordering = ['-created_at']
         verbose_name = 'Cotizador'
         verbose_name_plural = 'Cotizadores'
+        indexes = [
+            # Paginación por cursor: WHERE deleted_at IS NULL ORDER BY created_at, id
+            models.Index(fields=['deleted_at', 'created_at', 'id'], name='cotizador_keyset_idx'),
+            # Filtro por etapa (tablero, listados) ordenado por created_at, id
+            models.Index(fields=['etapa', 'deleted_at', 'created_at', 'id'], name='cotizador_etapa_idx'),
+            # Estado de cuenta del cliente (clientes/estado_cuenta.py) ordenado por created_at, id
+            models.Index(fields=['cliente', 'deleted_at', 'created_at', 'id'], name='cotizador_cli_del_created_idx'),
+        ]
 
     def __str__(self):
         return f'Cotizador {self.id} - Cliente: {self.cliente.nombre}'
     
+    def save(self, *args, **kwargs):
+        self.placa_busqueda = normalizar_busqueda(self.placa)
+        self.documento_busqueda = normalizar_busqueda(self.numero_documento)
+        self.chasis_busqueda = normalizar_busqueda(self.chasis)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'placa_busqueda', 'documento_busqueda', 'chasis_busqueda'}
+        super().save(*args, **kwargs)
+
     @property
     def is_deleted(self):
         return self.deleted_at is not None
 
+    @property
+    def estados(self):
+        """Flags de estado anteriores derivados de la etapa (compatibilidad con el frontend)"""
+        return estados_desde_etapa(self.etapa)
+
     def soft_delete(self):
         from django.utils import timezone
         self.deleted_at = timezone.now()
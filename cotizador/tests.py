@@ -1,3 +1,662 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from clientes.models import Cliente, ClienteSaldo, PrecioCliente
+from etiquetas.models import Etiqueta
+from users.models import User
+
+from . import importacion
+from .api import views
+from .models import ETAPA_CHOICES, ESTADOS_ETAPA, Cotizador, estados_desde_etapa
+
+
+class CotizadoresMixin:
+    """Usuario autenticado y los datos mínimos para crear cotizadores"""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='admin', email='admin@example.com', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+        self.etiqueta = Etiqueta.objects.create(nombre='Etiqueta')
+        self.precio = PrecioCliente.objects.create(
+            cliente=self.cliente, descripcion='Precio', precio_lay=Decimal('90.00'), comision=Decimal('10.00')
+        )
+
+    def crear(self, **campos):
+        datos = {
+            'cliente': self.cliente, 'etiqueta': self.etiqueta, 'precio_cliente': self.precio,
+            'descripcion': 'Cotización', 'precio_lay': Decimal('90.00'), 'comision': Decimal('10.00'),
+            'placa': 'ABC123', 'clindraje': '150', 'modelo': '2024', 'chasis': 'CH1',
+            'numero_documento': '1', 'nombre_completo': 'Nombre', 'telefono': '1',
+            'correo': 'a@example.com', 'direccion': 'x',
+        }
+        datos.update(campos)
+        return Cotizador.objects.create(**datos)
+
+
+def cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+class KeysetPaginationTest(CotizadoresMixin, TestCase):
+    """Paginación por cursor de list_cotizadores: enlaces, empates de created_at y cursores inválidos"""
+
+    def setUp(self):
+        super().setUp()
+        self.cotizadores = [self.crear(placa=f'P{i}') for i in range(5)]
+        base = timezone.make_aware(datetime(2025, 1, 1, 12))
+        # Tres filas con el mismo created_at: el orden lo define el id
+        for i, cotizador in enumerate(self.cotizadores):
+            creado = base + timedelta(minutes=min(i, 2))
+            Cotizador.objects.filter(pk=cotizador.pk).update(created_at=creado)
+        # Orden esperado: -created_at, -id
+        self.esperados = [c.id for c in reversed(self.cotizadores)]
+
+    def listar(self, url='/api/cotizador/list/', **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_siguiente_y_anterior(self):
+        primera = self.listar(cursor='', page_size=2)
+        self.assertEqual([c['id'] for c in primera['results']], self.esperados[:2])
+        self.assertIsNone(primera['previous'])
+        self.assertNotIn('count', primera)
+
+        segunda = self.listar(primera['next'])
+        self.assertEqual([c['id'] for c in segunda['results']], self.esperados[2:4])
+
+        anterior = self.listar(segunda['previous'])
+        self.assertEqual([c['id'] for c in anterior['results']], self.esperados[:2])
+
+        tercera = self.listar(segunda['next'])
+        self.assertEqual([c['id'] for c in tercera['results']], self.esperados[4:])
+        self.assertIsNone(tercera['next'])
+
+    def test_empates_de_created_at_no_repiten_ni_saltan_filas(self):
+        vistos = []
+        data = self.listar(cursor='', page_size=1)
+        while True:
+            vistos.extend(c['id'] for c in data['results'])
+            if not data['next']:
+                break
+            data = self.listar(data['next'])
+        self.assertEqual(vistos, self.esperados)
+
+        # Y de vuelta hacia atrás desde la última página
+        hacia_atras = []
+        while data['previous']:
+            data = self.listar(data['previous'])
+            hacia_atras = [c['id'] for c in data['results']] + hacia_atras
+        self.assertEqual(hacia_atras, self.esperados[:-1])
+
+    def test_cursor_con_fields(self):
+        primera = self.listar(cursor='', page_size=3, fields='id,placa')
+        self.assertEqual(primera['results'][0], {'id': self.esperados[0], 'placa': 'P4'})
+        segunda = self.listar(primera['next'])
+        self.assertEqual([c['id'] for c in segunda['results']], self.esperados[3:])
+
+    def test_usuario_del_cotizador(self):
+        Cotizador.objects.filter(pk=self.cotizadores[-1].pk).update(usuario=self.usuario)
+        data = self.listar(cursor='', page_size=1, fields='id,usuario')
+        self.assertEqual(data['results'][0]['usuario'], {'id': self.usuario.id, 'name': ''})
+        data = self.listar(cursor='', page_size=2)
+        self.assertEqual([c['usuario'] for c in data['results']], [{'id': self.usuario.id, 'name': ''}, None])
+
+    def test_count_solo_si_se_pide(self):
+        data = self.listar(cursor='', page_size=2, count='1')
+        self.assertEqual(data['count'], 5)
+
+    def test_cursor_invalido_responde_400(self):
+        validos = {'c': timezone.now().isoformat(), 'i': 1, 'd': 'next'}
+        invalidos = [
+            'no-es-base64!',
+            base64.urlsafe_b64encode(b'no es json').decode('ascii'),
+            cursor({**validos, 'd': 'lateral'}),
+            cursor({**validos, 'c': 'ayer'}),
+            cursor({**validos, 'i': 'uno'}),
+            cursor({'c': validos['c'], 'd': 'next'}),
+            cursor(['lista']),
+        ]
+        for valor in invalidos:
+            with self.subTest(cursor=valor):
+                response = self.client.get('/api/cotizador/list/', {'cursor': valor})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+
+class MigracionTestCase(TransactionTestCase):
+    """
+    Lleva la app cotizador a migrate_from, deja que la prueba cargue datos
+    con los modelos históricos y migra a migrate_to. Al terminar vuelve a la
+    última migración.
+    """
+    migrate_from = None
+    migrate_to = None
+
+    def migrar(self, nombre):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('cotizador', nombre)])
+        executor.loader.build_graph()
+        return executor.loader.project_state([('cotizador', nombre)]).apps
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+        self.etiqueta = Etiqueta.objects.create(nombre='Etiqueta')
+        self.precio = PrecioCliente.objects.create(
+            cliente=self.cliente, descripcion='Precio', precio_lay=Decimal('90.00'), comision=Decimal('10.00')
+        )
+        self.apps = self.migrar(self.migrate_from)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def crear_historico(self, **campos):
+        Cotizador = self.apps.get_model('cotizador', 'Cotizador')
+        datos = {
+            'cliente_id': self.cliente.id, 'etiqueta_id': self.etiqueta.id, 'precio_cliente_id': self.precio.id,
+            'descripcion': 'Cotización', 'precio_lay': Decimal('90.00'), 'comision': Decimal('10.00'),
+            'placa': 'ABC123', 'clindraje': '150', 'modelo': '2024', 'chasis': 'CH1',
+            'numero_documento': '1', 'nombre_completo': 'Nombre', 'telefono': '1',
+            'correo': 'a@example.com', 'direccion': 'x',
+        }
+        datos.update(campos)
+        return Cotizador.objects.create(**datos)
+
+
+class ClavesBusquedaTest(CotizadoresMixin, TestCase):
+    """save() mantiene las claves *_busqueda y la búsqueda del listado es por prefijo sobre ellas"""
+
+    def buscar(self, texto):
+        response = self.client.get('/api/cotizador/list/', {'search': texto, 'fields': 'id'})
+        self.assertEqual(response.status_code, 200)
+        return {c['id'] for c in response.data['results']}
+
+    def test_save_sincroniza_las_claves(self):
+        cotizador = self.crear(placa='abc-12 3', numero_documento='1.020.304', chasis='9bw_zz.377')
+        cotizador.refresh_from_db()
+        self.assertEqual(
+            (cotizador.placa_busqueda, cotizador.documento_busqueda, cotizador.chasis_busqueda),
+            ('ABC123', '1020304', '9BWZZ377'),
+        )
+
+        cotizador.placa = 'xyz 789'
+        cotizador.save(update_fields=['placa'])
+        cotizador.refresh_from_db()
+        self.assertEqual(cotizador.placa_busqueda, 'XYZ789')
+
+    def test_busqueda_por_prefijo_sin_importar_mayusculas_ni_separadores(self):
+        placa = self.crear(placa='ABC 123', numero_documento='55', chasis='ZZ1')
+        documento = self.crear(placa='QWE987', numero_documento='1.020.304', chasis='ZZ2')
+        chasis = self.crear(placa='RTY456', numero_documento='66', chasis='9BW-ZZZ-377')
+
+        self.assertEqual(self.buscar('abc-1'), {placa.id})
+        self.assertEqual(self.buscar('Abc.123'), {placa.id})
+        self.assertEqual(self.buscar('1020'), {documento.id})
+        self.assertEqual(self.buscar('9bw zzz'), {chasis.id})
+        # Solo prefijo: 'BC1' está dentro de la placa pero no al inicio
+        self.assertEqual(self.buscar('bc1'), set())
+
+    def test_nombre_como_respaldo_sin_digitos(self):
+        cotizador = self.crear(nombre_completo='María Pérez', placa='ZZZ999')
+        self.assertEqual(self.buscar('pérez'), {cotizador.id})
+
+
+class ClavesBusquedaMigracionTest(MigracionTestCase):
+    """0004 rellena las claves de búsqueda de los cotizadores existentes"""
+    migrate_from = '0003_cotizador_keyset_idx'
+    migrate_to = '0004_cotizador_claves_busqueda'
+
+    def test_rellena_las_claves(self):
+        cotizador = self.crear_historico(placa='abc-123', numero_documento='1.020.304', chasis='9bw zz')
+
+        apps = self.migrar(self.migrate_to)
+
+        cotizador = apps.get_model('cotizador', 'Cotizador').objects.get(pk=cotizador.pk)
+        self.assertEqual(
+            (cotizador.placa_busqueda, cotizador.documento_busqueda, cotizador.chasis_busqueda),
+            ('ABC123', '1020304', '9BWZZ'),
+        )
+
+
+class CambioEstadoMasivoTest(CotizadoresMixin, TestCase):
+    """cambiar_estado_masivo: reporte por id, compare-and-set sobre la etapa, límite e historial"""
+
+    def setUp(self):
+        super().setUp()
+        self.en_cotizador = [self.crear(placa=f'C{i}') for i in range(2)]
+        self.en_tramite = self.crear(placa='T1', etapa='tramite')
+        self.en_confirmacion = self.crear(placa='F1', etapa='confirmacion')
+
+    def cambiar(self, ids, paso='tramite'):
+        return self.client.post('/api/cotizador/cambiar-estado-masivo/', {'ids': ids, 'paso': paso}, format='json')
+
+    def test_reporte_por_id(self):
+        a, b = self.en_cotizador
+        ids = [a.id, self.en_tramite.id, b.id, self.en_confirmacion.id, 999999, a.id]
+
+        response = self.cambiar(ids)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['exitosos'], [a.id, b.id])
+        self.assertEqual(response.data['fallidos'], [
+            {'id': self.en_tramite.id, 'error': 'El cotizador ya está en estado Trámite.'},
+            {'id': self.en_confirmacion.id, 'error': 'No se puede avanzar a Trámite. El estado anterior no está activo.'},
+            {'id': 999999, 'error': 'El cotizador no existe.'},
+        ])
+        self.assertEqual(
+            dict(Cotizador.objects.values_list('id', 'etapa')),
+            {a.id: 'tramite', b.id: 'tramite', self.en_tramite.id: 'tramite', self.en_confirmacion.id: 'confirmacion'},
+        )
+
+    def test_filas_fuera_de_la_etapa_de_origen_no_se_tocan(self):
+        antes = {c.id: (c.etapa, c.updated_at) for c in Cotizador.objects.all()}
+        historial = Cotizador.history.count()
+
+        movidos = views.aplicar_transicion(
+            [self.en_tramite.id, self.en_confirmacion.id], 'cotizador', 'tramite', self.usuario
+        )
+
+        self.assertEqual(movidos, [])
+        self.assertEqual({c.id: (c.etapa, c.updated_at) for c in Cotizador.objects.all()}, antes)
+        self.assertEqual(Cotizador.history.count(), historial)
+
+    def test_historial_en_lote(self):
+        a, b = self.en_cotizador
+        with self.assertNumQueries(6):
+            # SAVEPOINT, SELECT ... FOR UPDATE, UPDATE, SELECT de las filas movidas, un INSERT del historial, RELEASE
+            movidos = views.aplicar_transicion([a.id, b.id, self.en_tramite.id], 'cotizador', 'tramite', self.usuario)
+
+        self.assertEqual(sorted(movidos), [a.id, b.id])
+        for cotizador in (a, b):
+            ultimo = Cotizador.history.filter(id=cotizador.id).latest('history_date', 'history_id')
+            self.assertEqual((ultimo.history_type, ultimo.etapa), ('~', 'tramite'))
+            self.assertEqual(ultimo.history_user_id, self.usuario.id)
+        self.assertEqual(Cotizador.history.filter(id=self.en_tramite.id).count(), 1)
+
+    def test_limite_de_ids(self):
+        response = self.cambiar(list(range(1, views.MAX_COTIZADORES_MASIVO + 2)))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(views.MAX_COTIZADORES_MASIVO, 1000)
+
+        response = self.cambiar(list(range(1, views.MAX_COTIZADORES_MASIVO + 1)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['exitosos']) + len(response.data['fallidos']), 1000)
+
+    def test_parametros_invalidos(self):
+        for datos in ({'ids': [1], 'paso': 'archivar'}, {'ids': [], 'paso': 'tramite'},
+                      {'ids': '1,2', 'paso': 'tramite'}, {'ids': [1, 'dos'], 'paso': 'tramite'}, {'ids': [1]}):
+            with self.subTest(datos=datos):
+                response = self.client.post('/api/cotizador/cambiar-estado-masivo/', datos, format='json')
+                self.assertEqual(response.status_code, 400)
+
+
+class TableroCotizadoresTest(CotizadoresMixin, TestCase):
+    """tablero_cotizadores: totales por etapa, tope por etapa, agrupación por etiqueta y número de consultas"""
+
+    def setUp(self):
+        super().setUp()
+        self.urgente = Etiqueta.objects.create(nombre='Urgente', color='#ff0000')
+        self.revision = Etiqueta.objects.create(nombre='Revisión')
+        base = timezone.make_aware(datetime(2025, 3, 1, 12))
+        filas = [
+            ('cotizador', self.etiqueta), ('cotizador', self.urgente), ('cotizador', self.etiqueta),
+            ('cotizador', self.urgente), ('tramite', self.urgente), ('confirmacion', self.revision),
+        ]
+        self.cotizadores = []
+        for i, (etapa, etiqueta) in enumerate(filas):
+            cotizador = self.crear(placa=f'P{i}', etapa=etapa, etiqueta=etiqueta)
+            Cotizador.objects.filter(pk=cotizador.pk).update(created_at=base + timedelta(hours=i))
+            self.cotizadores.append(cotizador)
+        # Eliminado: no cuenta ni aparece
+        self.crear(placa='BORRADO', etapa='cargar_pdf', deleted_at=timezone.now())
+
+    def tablero(self, **params):
+        response = self.client.get('/api/cotizador/tablero/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {etapa['etapa']: etapa for etapa in response.data['etapas']}
+
+    def ids(self, etapa):
+        return [[c['id'] for c in grupo['cotizadores']] for grupo in etapa['etiquetas']]
+
+    def test_totales_por_etapa(self):
+        etapas = self.tablero()
+        self.assertEqual(list(etapas), ['cotizador', 'tramite', 'confirmacion', 'cargar_pdf'])
+        self.assertEqual({etapa: datos['total'] for etapa, datos in etapas.items()},
+                         {'cotizador': 4, 'tramite': 1, 'confirmacion': 1, 'cargar_pdf': 0})
+        self.assertEqual(etapas['cargar_pdf']['etiquetas'], [])
+
+    def test_agrupa_por_etiqueta_en_orden_de_aparicion(self):
+        etapas = self.tablero()
+        c = [cotizador.id for cotizador in self.cotizadores]
+
+        cotizador = etapas['cotizador']['etiquetas']
+        # El más reciente es P3 (Urgente): ese grupo va primero
+        self.assertEqual([grupo['etiqueta'] for grupo in cotizador], [
+            {'id': self.urgente.id, 'nombre': 'Urgente', 'color': '#ff0000'},
+            {'id': self.etiqueta.id, 'nombre': 'Etiqueta', 'color': '#1976d2'},
+        ])
+        self.assertEqual(self.ids(etapas['cotizador']), [[c[3], c[1]], [c[2], c[0]]])
+        self.assertEqual(etapas['confirmacion']['etiquetas'][0]['etiqueta']['nombre'], 'Revisión')
+        self.assertEqual(cotizador[0]['cotizadores'][0]['cliente'], {'id': self.cliente.id, 'nombre': 'Cliente'})
+
+    def test_tope_por_etapa(self):
+        c = [cotizador.id for cotizador in self.cotizadores]
+        etapas = self.tablero(limit=3)
+        # El total sigue siendo el de la etapa completa
+        self.assertEqual(etapas['cotizador']['total'], 4)
+        self.assertEqual(self.ids(etapas['cotizador']), [[c[3], c[1]], [c[2]]])
+
+        etapas = self.tablero(limit=0)
+        self.assertEqual(etapas['cotizador']['total'], 4)
+        self.assertTrue(all(datos['etiquetas'] == [] for datos in etapas.values()))
+
+    def test_filtros(self):
+        etapas = self.tablero(etiqueta=self.urgente.id)
+        self.assertEqual({etapa: datos['total'] for etapa, datos in etapas.items()},
+                         {'cotizador': 2, 'tramite': 1, 'confirmacion': 0, 'cargar_pdf': 0})
+
+        response = self.client.get('/api/cotizador/tablero/', {'start_date': '01/03/2025'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_numero_de_consultas(self):
+        # Un GROUP BY más una consulta por etapa con tarjetas, sin importar cuántas haya
+        with self.assertNumQueries(4):
+            self.tablero()
+        for i in range(10):
+            self.crear(placa=f'N{i}', etiqueta=self.urgente if i % 2 else self.revision)
+        with self.assertNumQueries(4):
+            self.tablero()
+        with self.assertNumQueries(1):
+            self.tablero(limit=0)
+
+
+class EtapaMigracionTest(MigracionTestCase):
+    """0006 reemplaza los cuatro flags *_estado por la columna etapa, también en el historial"""
+    migrate_from = '0005_cotizador_estados_idx'
+    migrate_to = '0006_cotizador_etapa'
+
+    COMBINACIONES = [
+        # (cotizador, tramite, confirmacion, cargar_pdf) -> etapa esperada
+        (('1', '0', '0', '0'), 'cotizador'),
+        (('1', '1', '0', '0'), 'tramite'),
+        (('1', '1', '1', '0'), 'confirmacion'),
+        (('0', '1', '0', '1'), 'cargar_pdf'),
+        (('1', '0', '1', '0'), 'confirmacion'),
+        (('0', '0', '0', '0'), 'cotizador'),
+    ]
+
+    def flags(self, valores):
+        return dict(zip(ESTADOS_ETAPA, valores))
+
+    def crear_historial(self, apps, cotizador):
+        """Fila del historial con los valores actuales del cotizador (como la escribiría simple_history)"""
+        Historico = apps.get_model('cotizador', 'HistoricalCotizador')
+        campos = {campo.attname for campo in Historico._meta.concrete_fields}
+        datos = {
+            campo.attname: getattr(cotizador, campo.attname)
+            for campo in cotizador._meta.concrete_fields if campo.attname in campos
+        }
+        return Historico.objects.create(**datos, history_date=timezone.now(), history_type='~')
+
+    def test_gana_la_etapa_mas_avanzada(self):
+        filas = []
+        for valores, esperada in self.COMBINACIONES:
+            cotizador = self.crear_historico(**self.flags(valores))
+            historial = self.crear_historial(self.apps, cotizador)
+            filas.append((cotizador.pk, historial.history_id, esperada))
+
+        apps = self.migrar(self.migrate_to)
+
+        Cotizador = apps.get_model('cotizador', 'Cotizador')
+        Historico = apps.get_model('cotizador', 'HistoricalCotizador')
+        for pk, history_id, esperada in filas:
+            with self.subTest(pk=pk, esperada=esperada):
+                self.assertEqual(Cotizador.objects.get(pk=pk).etapa, esperada)
+                self.assertEqual(Historico.objects.get(history_id=history_id).etapa, esperada)
+
+    def test_reversa_restaura_los_flags(self):
+        apps = self.migrar(self.migrate_to)
+        Cotizador = apps.get_model('cotizador', 'Cotizador')
+        filas = []
+        for etapa, _ in ETAPA_CHOICES:
+            cotizador = Cotizador.objects.create(
+                cliente_id=self.cliente.id, etiqueta_id=self.etiqueta.id, precio_cliente_id=self.precio.id,
+                descripcion='Cotización', precio_lay=Decimal('90.00'), comision=Decimal('10.00'),
+                placa='ABC123', clindraje='150', modelo='2024', chasis='CH1', numero_documento='1',
+                nombre_completo='Nombre', telefono='1', correo='a@example.com', direccion='x', etapa=etapa,
+            )
+            historial = self.crear_historial(apps, cotizador)
+            filas.append((cotizador.pk, historial.history_id, etapa))
+
+        apps = self.migrar(self.migrate_from)
+
+        Cotizador = apps.get_model('cotizador', 'Cotizador')
+        Historico = apps.get_model('cotizador', 'HistoricalCotizador')
+        for pk, history_id, etapa in filas:
+            with self.subTest(etapa=etapa):
+                esperados = estados_desde_etapa(etapa)
+                for fila in (Cotizador.objects.get(pk=pk), Historico.objects.get(history_id=history_id)):
+                    self.assertEqual({campo: getattr(fila, campo) for campo in ESTADOS_ETAPA}, esperados)
+
+
+class EstadosAnterioresTest(CotizadoresMixin, TestCase):
+    """Los clientes que aún envían los flags *_estado siguen funcionando sobre la columna etapa"""
+
+    def setUp(self):
+        super().setUp()
+        self.por_etapa = {etapa: self.crear(placa=etapa.upper(), etapa=etapa) for etapa, _ in ETAPA_CHOICES}
+
+    def listar(self, **params):
+        response = self.client.get('/api/cotizador/list/', {**params, 'fields': 'id'})
+        self.assertEqual(response.status_code, 200, response.data)
+        return {fila['id'] for fila in response.data['results']}
+
+    def ids(self, *etapas):
+        return {self.por_etapa[etapa].id for etapa in etapas}
+
+    def test_filtros_por_flag(self):
+        self.assertEqual(self.listar(tramite_estado='1'), self.ids('tramite'))
+        self.assertEqual(self.listar(cotizador_estado='0'), self.ids('tramite', 'confirmacion', 'cargar_pdf'))
+        self.assertEqual(self.listar(cotizador_estado='0', cargar_pdf_estado='0'), self.ids('tramite', 'confirmacion'))
+        self.assertEqual(self.listar(confirmacion_estado='1', etapa='confirmacion'), self.ids('confirmacion'))
+        self.assertEqual(self.listar(confirmacion_estado='1', etapa='tramite'), set())
+
+    def test_el_listado_sigue_exponiendo_los_flags(self):
+        response = self.client.get('/api/cotizador/list/', {'etapa': 'confirmacion'})
+        fila = response.data['results'][0]
+        self.assertEqual({campo: fila[campo] for campo in ESTADOS_ETAPA}, estados_desde_etapa('confirmacion'))
+
+    def flags_en_cero(self):
+        return {campo: '0' for campo in ESTADOS_ETAPA}
+
+    def test_update_con_flags_anteriores(self):
+        cotizador = self.por_etapa['cotizador']
+        url = f'/api/cotizador/{cotizador.id}/update/'
+
+        response = self.client.put(url, {'cotizador_estado': '1', 'tramite_estado': '1'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        cotizador.refresh_from_db()
+        self.assertEqual(cotizador.etapa, 'tramite')
+
+        # Todos en '0' no cambia la etapa
+        response = self.client.put(url, self.flags_en_cero(), format='json')
+        self.assertEqual(response.status_code, 200)
+        cotizador.refresh_from_db()
+        self.assertEqual(cotizador.etapa, 'tramite')
+
+        # etapa tiene prioridad sobre los flags
+        response = self.client.put(url, {'etapa': 'confirmacion', 'cargar_pdf_estado': '1'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        cotizador.refresh_from_db()
+        self.assertEqual(cotizador.etapa, 'confirmacion')
+        self.assertEqual(
+            Cotizador.history.filter(id=cotizador.id).order_by('history_date', 'history_id').last().etapa,
+            'confirmacion',
+        )
+
+
+class ImportacionCotizadoresTest(CotizadoresMixin, TestCase):
+    """importar_cotizadores / ImportadorCotizadores: reporte por fila, dry_run, claves, saldo, historial y lotes"""
+
+    def setUp(self):
+        super().setUp()
+        self.otro_cliente = Cliente.objects.create(nombre='Otro')
+        self.otro_precio = PrecioCliente.objects.create(
+            cliente=self.otro_cliente, descripcion='Precio', precio_lay=Decimal('50.00'), comision=Decimal('5.00')
+        )
+
+    def fila(self, **campos):
+        datos = {
+            'cliente': self.cliente.id, 'etiqueta': self.etiqueta.id, 'precio_cliente': self.precio.id,
+            'descripcion': 'Importado', 'precio_lay': '90.00', 'comision': '10.00', 'placa': 'ABC123',
+            'clindraje': '150', 'modelo': '2024', 'chasis': 'CH1', 'numero_documento': '1',
+            'nombre_completo': 'Nombre', 'telefono': '1', 'correo': 'a@example.com', 'direccion': 'x',
+        }
+        datos.update(campos)
+        return datos
+
+    def archivo_csv(self, filas, columnas=None):
+        columnas = columnas or list(filas[0])
+        salida = io.StringIO()
+        escritor = csv.DictWriter(salida, fieldnames=columnas, extrasaction='ignore')
+        escritor.writeheader()
+        escritor.writerows(filas)
+        return SimpleUploadedFile('cotizadores.csv', salida.getvalue().encode('utf-8'), content_type='text/csv')
+
+    def importar(self, archivo, **datos):
+        return self.client.post('/api/cotizador/importar/', {'archivo': archivo, **datos}, format='multipart')
+
+    def saldo(self, cliente):
+        return ClienteSaldo.objects.filter(cliente=cliente).values(
+            'total_cotizaciones', 'saldo'
+        ).first()
+
+    def test_errores_por_fila(self):
+        filas = [
+            self.fila(placa='OK1'),
+            self.fila(cliente=999999),
+            self.fila(precio_cliente=self.otro_precio.id),
+            self.fila(tipo_documento='DNI'),
+            self.fila(precio_lay='noventa', correo=''),
+        ]
+        response = self.importar(self.archivo_csv(filas, list(self.fila()) + ['tipo_documento']))
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            {clave: response.data[clave] for clave in ('total_filas', 'creados', 'con_errores', 'errores_truncados')},
+            {'total_filas': 5, 'creados': 1, 'con_errores': 4, 'errores_truncados': False},
+        )
+        errores = {error['fila']: error['errores'] for error in response.data['errores']}
+        self.assertEqual(errores[3], [
+            'El cliente 999999 no existe o está eliminado.',
+            f'El precio {self.precio.id} no pertenece al cliente 999999.',
+        ])
+        self.assertEqual(errores[4], [f'El precio {self.otro_precio.id} no pertenece al cliente {self.cliente.id}.'])
+        self.assertEqual(len(errores[5]), 1)
+        self.assertTrue(errores[5][0].startswith('El campo tipo_documento no es válido'))
+        self.assertEqual(len(errores[6]), 2)
+        self.assertTrue(errores[6][0].startswith('El campo precio_lay no es válido'))
+        self.assertEqual(errores[6][1], 'El campo correo es requerido.')
+        self.assertEqual(list(Cotizador.objects.values_list('placa', flat=True)), ['OK1'])
+
+    def test_columna_faltante(self):
+        columnas = [columna for columna in self.fila() if columna != 'placa']
+        response = self.importar(self.archivo_csv([self.fila()], columnas))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Faltan columnas en el archivo: placa')
+
+        response = self.importar(SimpleUploadedFile('cotizadores.txt', b'x'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_dry_run_no_inserta(self):
+        response = self.importar(self.archivo_csv([self.fila(), self.fila(cliente='x')]), dry_run='1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['dry_run'], response.data['creados'], response.data['con_errores']),
+                         (True, 1, 1))
+        self.assertFalse(Cotizador.objects.exists())
+        self.assertFalse(Cotizador.history.exists())
+        self.assertIsNone(self.saldo(self.cliente))
+
+    def test_xlsx_y_claves_de_busqueda(self):
+        from openpyxl import Workbook
+
+        libro = Workbook()
+        hoja = libro.active
+        fila = self.fila(placa='abc-123', numero_documento=1020304, chasis='9bw zz')
+        hoja.append(list(fila))
+        hoja.append(list(fila.values()))
+        contenido = io.BytesIO()
+        libro.save(contenido)
+
+        response = self.importar(SimpleUploadedFile('cotizadores.xlsx', contenido.getvalue()))
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['creados'], 1)
+        cotizador = Cotizador.objects.get()
+        self.assertEqual(cotizador.numero_documento, '1020304')
+        self.assertEqual(
+            (cotizador.placa_busqueda, cotizador.documento_busqueda, cotizador.chasis_busqueda),
+            ('ABC123', '1020304', '9BWZZ'),
+        )
+
+    def test_saldo_igual_que_con_save(self):
+        # Mismo movimiento previo en los dos clientes: el saldo ya está materializado
+        for cliente, precio in ((self.cliente, self.precio), (self.otro_cliente, self.otro_precio)):
+            self.crear(cliente=cliente, precio_cliente=precio, placa='PREVIO')
+
+        filas = [self.fila(precio_lay='90.00', comision='10.00'), self.fila(precio_lay='12.35', comision='0.40')]
+        self.importar(self.archivo_csv(filas))
+        for fila in filas:
+            self.crear(cliente=self.otro_cliente, precio_cliente=self.otro_precio,
+                       precio_lay=Decimal(fila['precio_lay']), comision=Decimal(fila['comision']))
+
+        self.assertEqual(self.saldo(self.cliente), self.saldo(self.otro_cliente))
+        self.assertEqual(self.saldo(self.cliente), {
+            'total_cotizaciones': Decimal('212.75'), 'saldo': Decimal('-212.75'),
+        })
+
+    def test_historial_con_el_usuario_que_importa(self):
+        self.importar(self.archivo_csv([self.fila(placa='H1'), self.fila(placa='H2')]))
+
+        historial = Cotizador.history.all()
+        self.assertEqual(historial.count(), 2)
+        self.assertEqual({(h.history_type, h.history_user_id) for h in historial}, {('+', self.usuario.id)})
+
+    def test_lote_fallido_revierte_filas_y_saldo(self):
+        self.crear(placa='PREVIO')
+        antes = self.saldo(self.cliente)
+        aplicar_delta = importacion.aplicar_delta
+        llamadas = []
+
+        def falla_en_el_segundo_lote(*args, **kwargs):
+            llamadas.append(args)
+            if len(llamadas) > 1:
+                raise DatabaseError('sin conexión')
+            return aplicar_delta(*args, **kwargs)
+
+        importador = importacion.ImportadorCotizadores(usuario=self.usuario, chunk_size=2)
+        filas = [self.fila(placa=f'L{i}', precio_lay='10.00', comision='0.00') for i in range(3)]
+        with mock.patch.object(importacion, 'aplicar_delta', falla_en_el_segundo_lote):
+            with self.assertRaises(DatabaseError):
+                importador.importar(iter(filas))
+
+        # El primer lote quedó completo; del segundo no queda ni la fila ni su historial ni su saldo
+        self.assertEqual(sorted(Cotizador.objects.values_list('placa', flat=True)), ['L0', 'L1', 'PREVIO'])
+        self.assertFalse(Cotizador.history.filter(placa='L2').exists())
+        self.assertEqual(self.saldo(self.cliente)['total_cotizaciones'], antes['total_cotizaciones'] + Decimal('20.00'))
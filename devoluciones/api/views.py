@@ -5,23 +5,18 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from django.db import DatabaseError
-from django.db.models import Q
-from datetime import datetime
 from decimal import Decimal
 
 from ..models import Devolucion
 from tarjetas.models import Tarjeta
+from tarjetas.cuatro_por_mil import calcular_cuatro_por_mil
 from clientes.models import Cliente
+from backend.history_diff import diff_historial
+from backend.listing import ListSpec, listar, campos, relacion, usuario_anidado
+from reportes.cierres import PeriodoCerrado
 from .permissions import RolePermission
 
 
-def calcular_cuatro_por_mil(valor, tarjeta):
-    """Calcula el cuatro por mil si la tarjeta lo tiene activo"""
-    if tarjeta.cuatro_por_mil == '1':
-        return (Decimal(valor) * Decimal('4')) / Decimal('1000')
-    return Decimal('0')
-
-
 def serialize_devolucion(devolucion):
     """Convierte un objeto Devolucion a diccionario"""
     return {
@@ -102,7 +97,7 @@ def create_devolucion(request):
             )
 
         valor = Decimal(request.data.get('valor'))
-        cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta)
+        cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta, request.data.get('fecha'))
         total = valor + cuatro_por_mil
 
         devolucion = Devolucion.objects.create(
@@ -118,6 +113,8 @@ def create_devolucion(request):
 
         return Response(serialize_devolucion(devolucion), status=status.HTTP_201_CREATED)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -130,111 +127,27 @@ def create_devolucion(request):
         )
 
 
+LISTADO_DEVOLUCIONES = ListSpec(
+    queryset=Devolucion.objects.select_related('usuario', 'cliente', 'tarjeta'),
+    serializer=serialize_devolucion,
+    search_fields=('cliente__nombre', 'tarjeta__numero', 'tarjeta__titular', 'observacion'),
+    filters={'cliente': 'cliente_id', 'tarjeta': 'tarjeta_id', 'usuario': 'usuario_id'},
+    date_ranges=('fecha',),
+    fields=campos(
+        'id', 'valor', 'cuatro_por_mil', 'total', 'observacion', 'fecha', 'created_at', 'updated_at', 'deleted_at',
+        usuario=usuario_anidado('usuario'),
+        cliente=relacion('cliente', 'nombre'),
+        tarjeta=relacion('tarjeta', 'numero', 'titular', 'cuatro_por_mil'),
+    ),
+)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_devoluciones(request):
     """Listar devoluciones con filtros y paginación"""
     try:
-        devoluciones = Devolucion.objects.select_related(
-            'usuario', 'cliente', 'tarjeta'
-        ).all()
-
-        # Filtro de búsqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            devoluciones = devoluciones.filter(
-                Q(cliente__nombre__icontains=search_query) |
-                Q(tarjeta__numero__icontains=search_query) |
-                Q(tarjeta__titular__icontains=search_query) |
-                Q(observacion__icontains=search_query)
-            )
-
-        # Filtro por cliente
-        cliente_id = request.query_params.get('cliente', None)
-        if cliente_id:
-            devoluciones = devoluciones.filter(cliente_id=cliente_id)
-
-        # Filtro por tarjeta
-        tarjeta_id = request.query_params.get('tarjeta', None)
-        if tarjeta_id:
-            devoluciones = devoluciones.filter(tarjeta_id=tarjeta_id)
-
-        # Filtro por usuario
-        usuario_id = request.query_params.get('usuario', None)
-        if usuario_id:
-            devoluciones = devoluciones.filter(usuario_id=usuario_id)
-
-        # Filtro por fecha
-        fecha_start = request.query_params.get('fecha_start', None)
-        fecha_end = request.query_params.get('fecha_end', None)
-
-        if fecha_start:
-            try:
-                start_date = datetime.strptime(fecha_start, '%Y-%m-%d').date()
-                devoluciones = devoluciones.filter(fecha__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_start debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if fecha_end:
-            try:
-                end_date = datetime.strptime(fecha_end, '%Y-%m-%d').date()
-                devoluciones = devoluciones.filter(fecha__lte=end_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_end debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro por fecha de creación
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                devoluciones = devoluciones.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                devoluciones = devoluciones.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            devoluciones = devoluciones.filter(deleted_at__isnull=True)
-
-        # Ordenar
-        devoluciones = devoluciones.order_by('-created_at')
-
-        # Paginación
-        page_size_param = request.query_params.get('page_size', 10)
-        try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
-
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_devoluciones = paginator.paginate_queryset(devoluciones, request)
-
-        data = [serialize_devolucion(d) for d in paginated_devoluciones]
-        return paginator.get_paginated_response(data)
-
+        return listar(request, LISTADO_DEVOLUCIONES)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener devoluciones: {str(e)}"},
@@ -306,16 +219,18 @@ def update_devolucion(request, pk):
         devolucion.observacion = request.data.get('observacion', devolucion.observacion)
         devolucion.fecha = request.data.get('fecha', devolucion.fecha)
 
-        # Recalcular cuatro_por_mil y total si cambió valor o tarjeta
-        if 'valor' in request.data or 'tarjeta' in request.data:
+        # Recalcular cuatro_por_mil y total si cambió valor, tarjeta o fecha (la tasa depende de la fecha)
+        if 'valor' in request.data or 'tarjeta' in request.data or 'fecha' in request.data:
             valor = Decimal(devolucion.valor)
-            devolucion.cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta)
+            devolucion.cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta, devolucion.fecha)
             devolucion.total = valor + devolucion.cuatro_por_mil
 
         devolucion.save()
 
         return Response(serialize_devolucion(devolucion), status=status.HTTP_200_OK)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -339,6 +254,8 @@ def delete_devolucion(request, pk):
             {"message": "Devolución eliminada correctamente"},
             status=status.HTTP_200_OK
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar devolución: {str(e)}"},
@@ -359,6 +276,8 @@ def restore_devolucion(request, pk):
             )
         devolucion.restore()
         return Response(serialize_devolucion(devolucion), status=status.HTTP_200_OK)
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al restaurar devolución: {str(e)}"},
@@ -377,6 +296,8 @@ def hard_delete_devolucion(request, pk):
             {"message": "Devolución eliminada permanentemente"},
             status=status.HTTP_204_NO_CONTENT
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar devolución: {str(e)}"},
@@ -390,7 +311,7 @@ def devolucion_history(request, pk):
     """Obtener el historial de cambios de una devolución"""
     try:
         devolucion = get_object_or_404(Devolucion.objects, pk=pk)
-        history = devolucion.history.all()
+        history = devolucion.history.select_related('history_user')
 
         # Paginación
         page_size_param = request.query_params.get('page_size', 10)
@@ -403,6 +324,10 @@ def devolucion_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
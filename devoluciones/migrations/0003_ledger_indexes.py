@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devoluciones', '0002_devolucion_cuatro_por_mil_devolucion_total_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='devolucion',
+            index=models.Index(fields=['deleted_at', 'created_at'], name='devolucion_del_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='devolucion',
+            index=models.Index(fields=['cliente', 'deleted_at', 'fecha'], name='devolucion_cli_del_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='devolucion',
+            index=models.Index(fields=['tarjeta', 'deleted_at', 'fecha'], name='devolucion_tar_del_fecha_idx'),
+        ),
+    ]
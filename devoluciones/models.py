@@ -3,8 +3,9 @@ from django.conf import settings
 from clientes.models import Cliente
 from tarjetas.models import Tarjeta
 from simple_history.models import HistoricalRecords
+from backend.atomic import GuardadoAtomico
 
-class Devolucion(models.Model):
+class Devolucion(GuardadoAtomico, models.Model):
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -41,6 +42,11 @@ class Devolucion(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Devolucion'
         verbose_name_plural = 'Devoluciones'
+        indexes = [
+            models.Index(fields=['deleted_at', 'created_at'], name='devolucion_del_created_idx'),
+            models.Index(fields=['cliente', 'deleted_at', 'fecha'], name='devolucion_cli_del_fecha_idx'),
+            models.Index(fields=['tarjeta', 'deleted_at', 'fecha'], name='devolucion_tar_del_fecha_idx'),
+        ]
 
     def __str__(self):
         return f'Devolucion {self.id} - Cliente: {self.cliente} - Tarjeta: {self.tarjeta} - Valor: {self.valor}'
@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('list/',                   views.list_etiquetas,       name='list_etiquetas'),
+    path('activas/',                views.list_etiquetas_activas, name='list_etiquetas_activas'),
     path('create/',                 views.create_etiqueta,      name='create_etiqueta'),
     path('<int:pk>/',               views.get_etiqueta,         name='get_etiqueta'),
     path('<int:pk>/update/',        views.update_etiqueta,      name='update_etiqueta'),
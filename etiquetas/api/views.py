@@ -5,10 +5,11 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from django.db import DatabaseError
-from django.db.models import Q
-from datetime import datetime
 
 from etiquetas.models import Etiqueta
+from backend.history_diff import diff_historial
+from ..cache import etiquetas_activas
+from backend.listing import ListSpec, listar, campos, columna, nombre_usuario
 from .permissions import RolePermission
 
 
@@ -60,65 +61,40 @@ def create_etiqueta(request):
         )
 
 
+LISTADO_ETIQUETAS = ListSpec(
+    queryset=Etiqueta.objects.select_related('user'),
+    serializer=serialize_etiqueta,
+    search_fields=('nombre',),
+    fields=campos(
+        'id', 'nombre', 'color', 'created_at', 'updated_at', 'deleted_at',
+        user=columna('user_id'),
+        user_name=nombre_usuario('user'),
+    ),
+)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_etiquetas(request):
     """Listar etiquetas con filtros y paginación"""
     try:
-        etiquetas = Etiqueta.objects.select_related('user').all()
-
-        # Filtro de búsqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            etiquetas = etiquetas.filter(nombre__icontains=search_query)
-
-        # Filtro por fecha de creación
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                etiquetas = etiquetas.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                etiquetas = etiquetas.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            etiquetas = etiquetas.filter(deleted_at__isnull=True)
-
-        # Ordenar
-        etiquetas = etiquetas.order_by('-created_at')
-
-        # Paginación
-        page_size_param = request.query_params.get('page_size', 10)
-        try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
-
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_etiquetas = paginator.paginate_queryset(etiquetas, request)
+        return listar(request, LISTADO_ETIQUETAS)
+    except Exception as e:
+        return Response(
+            {"error": f"Error al obtener etiquetas: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
 
-        data = [serialize_etiqueta(e) for e in paginated_etiquetas]
-        return paginator.get_paginated_response(data)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_etiquetas_activas(request):
+    """
+    Todas las etiquetas activas, sin paginar, ordenadas por nombre (selectores).
+    Se sirven desde el cache de referencia (etiquetas/cache.py).
+    """
+    try:
+        return Response(etiquetas_activas.get(), status=status.HTTP_200_OK)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener etiquetas: {str(e)}"},
@@ -228,7 +204,7 @@ def etiqueta_history(request, pk):
     """Obtener el historial de cambios de una etiqueta"""
     try:
         etiqueta = get_object_or_404(Etiqueta.objects, pk=pk)
-        history = etiqueta.history.all()
+        history = etiqueta.history.select_related('history_user')
 
         # Paginación
         page_size_param = request.query_params.get('page_size', 10)
@@ -241,6 +217,10 @@ def etiqueta_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
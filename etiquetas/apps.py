@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EtiquetasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'etiquetas'
+
+    def ready(self):
+        from .cache import connect_cache_signals
+        connect_cache_signals()
@@ -0,0 +1,16 @@
+from backend.reference_cache import ReferenceCache
+
+from .models import Etiqueta
+
+
+def cargar_etiquetas_activas():
+    from .api.views import serialize_etiqueta
+    etiquetas = Etiqueta.objects.select_related('user').filter(deleted_at__isnull=True).order_by('nombre', 'id')
+    return [serialize_etiqueta(e) for e in etiquetas]
+
+
+etiquetas_activas = ReferenceCache('etiquetas_activas', cargar_etiquetas_activas)
+
+
+def connect_cache_signals():
+    etiquetas_activas.connect(Etiqueta)
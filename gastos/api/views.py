@@ -5,22 +5,17 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from django.db import DatabaseError
-from django.db.models import Q
-from datetime import datetime
 from decimal import Decimal
 
 from ..models import Gasto, GastoRelacion
 from tarjetas.models import Tarjeta
+from tarjetas.cuatro_por_mil import calcular_cuatro_por_mil
+from backend.history_diff import diff_historial
+from backend.listing import ListSpec, listar, campos, relacion, usuario_anidado
+from reportes.cierres import PeriodoCerrado
 from .permissions import RolePermission
 
 
-def calcular_cuatro_por_mil(valor, tarjeta):
-    """Calcula el cuatro por mil si la tarjeta lo tiene activo"""
-    if tarjeta.cuatro_por_mil == '1':
-        return (Decimal(valor) * Decimal('4')) / Decimal('1000')
-    return Decimal('0')
-
-
 # ==================== GASTO ====================
 
 def serialize_gasto(gasto):
@@ -78,68 +73,23 @@ def create_gasto(request):
         )
 
 
+LISTADO_GASTOS = ListSpec(
+    queryset=Gasto.objects.select_related('user'),
+    serializer=serialize_gasto,
+    search_fields=('nombre', 'descripcion'),
+    fields=campos(
+        'id', 'nombre', 'descripcion', 'created_at', 'updated_at', 'deleted_at',
+        user=usuario_anidado('user'),
+    ),
+)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_gastos(request):
     """Listar gastos con filtros y paginación"""
     try:
-        gastos = Gasto.objects.select_related('user').all()
-
-        # Filtro de búsqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            gastos = gastos.filter(
-                Q(nombre__icontains=search_query) |
-                Q(descripcion__icontains=search_query)
-            )
-
-        # Filtro por fecha de creación
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                gastos = gastos.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                gastos = gastos.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            gastos = gastos.filter(deleted_at__isnull=True)
-
-        # Ordenar
-        gastos = gastos.order_by('-created_at')
-
-        # Paginación
-        page_size_param = request.query_params.get('page_size', 10)
-        try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
-
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_gastos = paginator.paginate_queryset(gastos, request)
-
-        data = [serialize_gasto(g) for g in paginated_gastos]
-        return paginator.get_paginated_response(data)
-
+        return listar(request, LISTADO_GASTOS)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener gastos: {str(e)}"},
@@ -239,6 +189,9 @@ def hard_delete_gasto(request, pk):
             {"message": "Gasto eliminado permanentemente"},
             status=status.HTTP_204_NO_CONTENT
         )
+    except PeriodoCerrado as e:
+        # Sus relaciones se borran en cascada
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar gasto: {str(e)}"},
@@ -252,7 +205,7 @@ def gasto_history(request, pk):
     """Obtener el historial de cambios de un gasto"""
     try:
         gasto = get_object_or_404(Gasto.objects, pk=pk)
-        history = gasto.history.all()
+        history = gasto.history.select_related('history_user')
 
         page_size_param = request.query_params.get('page_size', 10)
         try:
@@ -264,6 +217,10 @@ def gasto_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
@@ -369,7 +326,7 @@ def create_gasto_relacion(request):
             )
 
         valor = Decimal(request.data.get('valor'))
-        cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta)
+        cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta, request.data.get('fecha'))
         total = valor + cuatro_por_mil
 
         relacion = GastoRelacion.objects.create(
@@ -385,6 +342,8 @@ def create_gasto_relacion(request):
 
         return Response(serialize_gasto_relacion(relacion), status=status.HTTP_201_CREATED)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -397,111 +356,27 @@ def create_gasto_relacion(request):
         )
 
 
+LISTADO_GASTO_RELACIONES = ListSpec(
+    queryset=GastoRelacion.objects.select_related('usuario', 'gasto', 'tarjeta'),
+    serializer=serialize_gasto_relacion,
+    search_fields=('gasto__nombre', 'tarjeta__numero', 'tarjeta__titular', 'observacion'),
+    filters={'gasto': 'gasto_id', 'tarjeta': 'tarjeta_id', 'usuario': 'usuario_id'},
+    date_ranges=('fecha',),
+    fields=campos(
+        'id', 'valor', 'cuatro_por_mil', 'total', 'observacion', 'fecha', 'created_at', 'updated_at', 'deleted_at',
+        usuario=usuario_anidado('usuario'),
+        gasto=relacion('gasto', 'nombre'),
+        tarjeta=relacion('tarjeta', 'numero', 'titular', 'cuatro_por_mil'),
+    ),
+)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_gasto_relaciones(request):
     """Listar relaciones de gasto con filtros y paginación"""
     try:
-        relaciones = GastoRelacion.objects.select_related(
-            'usuario', 'gasto', 'tarjeta'
-        ).all()
-
-        # Filtro de búsqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            relaciones = relaciones.filter(
-                Q(gasto__nombre__icontains=search_query) |
-                Q(tarjeta__numero__icontains=search_query) |
-                Q(tarjeta__titular__icontains=search_query) |
-                Q(observacion__icontains=search_query)
-            )
-
-        # Filtro por gasto
-        gasto_id = request.query_params.get('gasto', None)
-        if gasto_id:
-            relaciones = relaciones.filter(gasto_id=gasto_id)
-
-        # Filtro por tarjeta
-        tarjeta_id = request.query_params.get('tarjeta', None)
-        if tarjeta_id:
-            relaciones = relaciones.filter(tarjeta_id=tarjeta_id)
-
-        # Filtro por usuario
-        usuario_id = request.query_params.get('usuario', None)
-        if usuario_id:
-            relaciones = relaciones.filter(usuario_id=usuario_id)
-
-        # Filtro por fecha
-        fecha_start = request.query_params.get('fecha_start', None)
-        fecha_end = request.query_params.get('fecha_end', None)
-
-        if fecha_start:
-            try:
-                start_date = datetime.strptime(fecha_start, '%Y-%m-%d').date()
-                relaciones = relaciones.filter(fecha__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_start debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if fecha_end:
-            try:
-                end_date = datetime.strptime(fecha_end, '%Y-%m-%d').date()
-                relaciones = relaciones.filter(fecha__lte=end_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_end debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro por fecha de creación
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                relaciones = relaciones.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                relaciones = relaciones.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            relaciones = relaciones.filter(deleted_at__isnull=True)
-
-        # Ordenar
-        relaciones = relaciones.order_by('-created_at')
-
-        # Paginación
-        page_size_param = request.query_params.get('page_size', 10)
-        try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
-
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_relaciones = paginator.paginate_queryset(relaciones, request)
-
-        data = [serialize_gasto_relacion(r) for r in paginated_relaciones]
-        return paginator.get_paginated_response(data)
-
+        return listar(request, LISTADO_GASTO_RELACIONES)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener relaciones de gasto: {str(e)}"},
@@ -573,16 +448,18 @@ def update_gasto_relacion(request, pk):
         relacion.observacion = request.data.get('observacion', relacion.observacion)
         relacion.fecha = request.data.get('fecha', relacion.fecha)
 
-        # Recalcular cuatro_por_mil y total si cambió valor o tarjeta
-        if 'valor' in request.data or 'tarjeta' in request.data:
+        # Recalcular cuatro_por_mil y total si cambió valor, tarjeta o fecha (la tasa depende de la fecha)
+        if 'valor' in request.data or 'tarjeta' in request.data or 'fecha' in request.data:
             valor = Decimal(relacion.valor)
-            relacion.cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta)
+            relacion.cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta, relacion.fecha)
             relacion.total = valor + relacion.cuatro_por_mil
 
         relacion.save()
 
         return Response(serialize_gasto_relacion(relacion), status=status.HTTP_200_OK)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -606,6 +483,8 @@ def delete_gasto_relacion(request, pk):
             {"message": "Relación de gasto eliminada correctamente"},
             status=status.HTTP_200_OK
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar relación de gasto: {str(e)}"},
@@ -626,6 +505,8 @@ def restore_gasto_relacion(request, pk):
             )
         relacion.restore()
         return Response(serialize_gasto_relacion(relacion), status=status.HTTP_200_OK)
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al restaurar relación de gasto: {str(e)}"},
@@ -644,6 +525,8 @@ def hard_delete_gasto_relacion(request, pk):
             {"message": "Relación de gasto eliminada permanentemente"},
             status=status.HTTP_204_NO_CONTENT
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar relación de gasto: {str(e)}"},
@@ -657,7 +540,7 @@ def gasto_relacion_history(request, pk):
     """Obtener el historial de cambios de una relación de gasto"""
     try:
         relacion = get_object_or_404(GastoRelacion.objects, pk=pk)
-        history = relacion.history.all()
+        history = relacion.history.select_related('history_user')
 
         page_size_param = request.query_params.get('page_size', 10)
         try:
@@ -669,6 +552,10 @@ def gasto_relacion_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gastos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gastorelacion',
+            index=models.Index(fields=['deleted_at', 'created_at'], name='gasto_rel_del_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gastorelacion',
+            index=models.Index(fields=['tarjeta', 'deleted_at', 'fecha'], name='gasto_rel_tar_del_fecha_idx'),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from tarjetas.models import Tarjeta
 from simple_history.models import HistoricalRecords
+from backend.history import BufferedHistoricalRecords
+from backend.atomic import GuardadoAtomico
 
 # Create your models here.
 class Gasto(models.Model):
@@ -43,7 +45,7 @@ class Gasto(models.Model):
         self.deleted_at = None
         self.save()
     
-class GastoRelacion(models.Model):
+class GastoRelacion(GuardadoAtomico, models.Model):
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -74,13 +76,17 @@ class GastoRelacion(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
     class Meta:
         db_table = 'gasto_relaciones'
         ordering = ['-created_at']
         verbose_name = 'Relación Gasto'
         verbose_name_plural = 'Relaciones Gasto'
+        indexes = [
+            models.Index(fields=['deleted_at', 'created_at'], name='gasto_rel_del_created_idx'),
+            models.Index(fields=['tarjeta', 'deleted_at', 'fecha'], name='gasto_rel_tar_del_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Gasto: {self.gasto.nombre} - Tarjeta: {self.tarjeta.numero}"
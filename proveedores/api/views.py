@@ -5,11 +5,11 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from django.db import DatabaseError
-from django.db.models import Q
-from datetime import datetime
 
 from proveedores.models import Proveedor
 from etiquetas.models import Etiqueta
+from backend.history_diff import diff_historial
+from backend.listing import ListSpec, listar, campos, columna, nombre_usuario
 from .permissions import RolePermission
 
 
@@ -70,70 +70,28 @@ def create_proveedor(request):
         )
 
 
+LISTADO_PROVEEDORES = ListSpec(
+    queryset=Proveedor.objects.select_related('user', 'etiqueta'),
+    serializer=serialize_proveedor,
+    search_fields=('nombre',),
+    filters={'etiqueta': 'etiqueta_id'},
+    fields=campos(
+        'id', 'nombre', 'color', 'created_at', 'updated_at', 'deleted_at',
+        user=columna('user_id'),
+        user_name=nombre_usuario('user'),
+        etiqueta=columna('etiqueta_id'),
+        etiqueta_nombre=columna('etiqueta__nombre'),
+        etiqueta_color=columna('etiqueta__color'),
+    ),
+)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_proveedores(request):
     """Listar proveedores con filtros y paginacion"""
     try:
-        proveedores = Proveedor.objects.select_related('user', 'etiqueta').all()
-
-        # Filtro de busqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            proveedores = proveedores.filter(nombre__icontains=search_query)
-
-        # Filtro por etiqueta
-        etiqueta_id = request.query_params.get('etiqueta', None)
-        if etiqueta_id:
-            proveedores = proveedores.filter(etiqueta_id=etiqueta_id)
-
-        # Filtro por fecha de creacion
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                proveedores = proveedores.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                proveedores = proveedores.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            proveedores = proveedores.filter(deleted_at__isnull=True)
-
-        # Ordenar
-        proveedores = proveedores.order_by('-created_at')
-
-        # Paginacion
-        page_size_param = request.query_params.get('page_size', 10)
-        try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
-
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_proveedores = paginator.paginate_queryset(proveedores, request)
-
-        data = [serialize_proveedor(p) for p in paginated_proveedores]
-        return paginator.get_paginated_response(data)
-
+        return listar(request, LISTADO_PROVEEDORES)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener proveedores: {str(e)}"},
@@ -250,7 +208,7 @@ def proveedor_history(request, pk):
     """Obtener el historial de cambios de un proveedor"""
     try:
         proveedor = get_object_or_404(Proveedor.objects, pk=pk)
-        history = proveedor.history.all()
+        history = proveedor.history.select_related('history_user')
 
         # Paginacion
         page_size_param = request.query_params.get('page_size', 10)
@@ -263,6 +221,10 @@ def proveedor_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path('list/',                   views.list_recepciones_pago,       name='list_recepciones_pago'),
     path('create/',                 views.create_recepcion_pago,       name='create_recepcion_pago'),
+    path('create-batch/',           views.create_recepciones_pago_lote, name='create_recepciones_pago_lote'),
+    path('export/',                 views.export_recepciones_pago,     name='export_recepciones_pago'),
     path('<int:pk>/',               views.get_recepcion_pago,          name='get_recepcion_pago'),
     path('<int:pk>/update/',        views.update_recepcion_pago,       name='update_recepcion_pago'),
     path('<int:pk>/delete/',        views.delete_recepcion_pago,       name='delete_recepcion_pago'),
@@ -3,25 +3,29 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db import DatabaseError
-from django.db.models import Q
-from datetime import datetime
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from collections import defaultdict
 from decimal import Decimal
+from simple_history.utils import bulk_create_with_history
 
 from ..models import RecepcionPago
 from tarjetas.models import Tarjeta
+from tarjetas.cuatro_por_mil import TablaTarifas, aplica, calcular_cuatro_por_mil
 from clientes.models import Cliente
+from clientes.saldos import MOVIMIENTOS_SALDO, aplicar_delta as aplicar_delta_cliente
+from tarjetas.saldos import MOVIMIENTOS_TARJETA, dia_movimiento, aplicar_delta as aplicar_delta_tarjeta
+from reportes.resumen import invalidar_resumen
+from backend.export import iterar_por_lotes, stream_csv, stream_ndjson
+from backend.history_diff import diff_historial
+from backend.listing import ListSpec, listar, campos, relacion, usuario_anidado
+from reportes.cierres import PeriodoCerrado, mes_de, validar_periodo_abierto
 from .permissions import RolePermission
 
 
-def calcular_cuatro_por_mil(valor, tarjeta):
-    """Calcula el cuatro por mil si la tarjeta lo tiene activo"""
-    if tarjeta.cuatro_por_mil == '1':
-        return (Decimal(valor) * Decimal('4')) / Decimal('1000')
-    return Decimal('0')
-
-
 def serialize_recepcion_pago(recepcion):
     """Convierte un objeto RecepcionPago a diccionario"""
     return {
@@ -51,6 +55,21 @@ def serialize_recepcion_pago(recepcion):
     }
 
 
+LISTADO_RECEPCIONES_PAGO = ListSpec(
+    queryset=RecepcionPago.objects.select_related('usuario', 'cliente', 'tarjeta'),
+    serializer=serialize_recepcion_pago,
+    search_fields=('cliente__nombre', 'tarjeta__numero', 'tarjeta__titular', 'observacion'),
+    filters={'cliente': 'cliente_id', 'tarjeta': 'tarjeta_id', 'usuario': 'usuario_id'},
+    date_ranges=('fecha',),
+    fields=campos(
+        'id', 'valor', 'cuatro_por_mil', 'total', 'observacion', 'fecha', 'created_at', 'updated_at', 'deleted_at',
+        usuario=usuario_anidado('usuario'),
+        cliente=relacion('cliente', 'nombre'),
+        tarjeta=relacion('tarjeta', 'numero', 'titular', 'cuatro_por_mil'),
+    ),
+)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'contador'])])
 def create_recepcion_pago(request):
@@ -102,7 +121,7 @@ def create_recepcion_pago(request):
             )
 
         valor = Decimal(request.data.get('valor'))
-        cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta)
+        cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta, request.data.get('fecha'))
         total = valor + cuatro_por_mil
 
         recepcion = RecepcionPago.objects.create(
@@ -118,6 +137,8 @@ def create_recepcion_pago(request):
 
         return Response(serialize_recepcion_pago(recepcion), status=status.HTTP_201_CREATED)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -130,114 +151,256 @@ def create_recepcion_pago(request):
         )
 
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def list_recepciones_pago(request):
-    """Listar recepciones de pago con filtros y paginación"""
+MAX_MOVIMIENTOS_LOTE = 500
+
+
+def validar_movimiento(movimiento, clientes, tarjetas, tarifas):
+    """
+    Valida una fila del lote contra los clientes y tarjetas ya cargados y
+    calcula su 4x1000 con la tabla de tarifas del lote.
+    Devuelve (RecepcionPago sin guardar, []) o (None, [errores]).
+    """
+    if not isinstance(movimiento, dict):
+        return None, ["La fila debe ser un objeto."]
+
+    errores = []
+    for field in ['cliente', 'tarjeta', 'valor', 'fecha']:
+        if not movimiento.get(field):
+            errores.append(f"El campo {field} es requerido.")
+    if errores:
+        return None, errores
+
+    cliente = clientes.get(str(movimiento['cliente']))
+    if cliente is None:
+        errores.append("El cliente especificado no existe.")
+    elif cliente.deleted_at is not None:
+        errores.append("El cliente especificado está eliminado.")
+
+    tarjeta = tarjetas.get(str(movimiento['tarjeta']))
+    if tarjeta is None:
+        errores.append("La tarjeta especificada no existe.")
+    elif tarjeta.deleted_at is not None:
+        errores.append("La tarjeta especificada está eliminada.")
+
+    valores = {}
+    for field in ['valor', 'fecha']:
+        try:
+            valores[field] = RecepcionPago._meta.get_field(field).clean(movimiento[field], None)
+        except ValidationError as e:
+            errores.append(f"El campo {field} no es válido: {' '.join(e.messages)}")
+
+    fecha = valores.get('fecha')
+    if fecha is not None:
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        # bulk_create no pasa por las señales que protegen los meses cerrados
+        try:
+            validar_periodo_abierto(RecepcionPago, fecha)
+        except PeriodoCerrado as e:
+            errores.append(str(e))
+
+    if errores:
+        return None, errores
+
+    cuatro_por_mil, total = tarifas.calcular(valores['valor'], aplica(tarjeta), fecha)
+    return RecepcionPago(
+        cliente=cliente,
+        tarjeta=tarjeta,
+        valor=valores['valor'],
+        cuatro_por_mil=cuatro_por_mil,
+        total=total,
+        observacion=movimiento.get('observacion', ''),
+        fecha=fecha,
+    ), []
+
+
+def referencias_lote(movimientos, campo):
+    return {str(m[campo]) for m in movimientos if isinstance(m, dict) and str(m.get(campo) or '').isdigit()}
+
+
+def aplicar_saldos_lote(recepciones):
+    """
+    bulk_create no envía señales: aplica al saldo de cada cliente y al
+    resumen diario de cada tarjeta la suma del lote, un UPDATE por clave.
+    """
+    campo_cliente, signo_cliente, _ = MOVIMIENTOS_SALDO[RecepcionPago._meta.label]
+    campo_tarjeta, signo_tarjeta = MOVIMIENTOS_TARJETA[RecepcionPago._meta.label]
+
+    por_cliente, por_tarjeta = defaultdict(Decimal), defaultdict(lambda: [Decimal('0'), 0])
+    for recepcion in recepciones:
+        por_cliente[recepcion.cliente_id] += recepcion.valor
+        resumen = por_tarjeta[(recepcion.tarjeta_id, dia_movimiento(RecepcionPago, recepcion.fecha))]
+        resumen[0] += recepcion.total
+        resumen[1] += 1
+
+    for cliente_id, delta in por_cliente.items():
+        aplicar_delta_cliente(cliente_id, campo_cliente, signo_cliente, delta)
+    for (tarjeta_id, dia), (delta, cantidad) in por_tarjeta.items():
+        aplicar_delta_tarjeta(tarjeta_id, dia, campo_tarjeta, signo_tarjeta, delta, cantidad)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'contador'])])
+def create_recepciones_pago_lote(request):
+    """
+    Crear varias recepciones de pago en una sola transacción.
+    Body: {"movimientos": [{cliente, tarjeta, valor, fecha, observacion}, ...]}.
+    Si alguna fila es inválida no se crea ninguna y se responde 400 con los
+    errores de cada fila (indice = posición en la lista).
+    """
     try:
-        recepciones = RecepcionPago.objects.select_related(
-            'usuario', 'cliente', 'tarjeta'
-        ).all()
-
-        # Filtro de búsqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            recepciones = recepciones.filter(
-                Q(cliente__nombre__icontains=search_query) |
-                Q(tarjeta__numero__icontains=search_query) |
-                Q(tarjeta__titular__icontains=search_query) |
-                Q(observacion__icontains=search_query)
+        movimientos = request.data.get('movimientos')
+        if not isinstance(movimientos, list) or not movimientos:
+            return Response(
+                {"error": "El campo movimientos es requerido y debe ser una lista."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(movimientos) > MAX_MOVIMIENTOS_LOTE:
+            return Response(
+                {"error": f"El lote no puede tener más de {MAX_MOVIMIENTOS_LOTE} movimientos."},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Filtro por cliente
-        cliente_id = request.query_params.get('cliente', None)
-        if cliente_id:
-            recepciones = recepciones.filter(cliente_id=cliente_id)
+        # Una consulta por tabla referenciada para todo el lote
+        clientes = {
+            str(cliente.id): cliente
+            for cliente in Cliente.objects.filter(id__in=referencias_lote(movimientos, 'cliente'))
+        }
+        tarjetas = {
+            str(tarjeta.id): tarjeta
+            for tarjeta in Tarjeta.objects.filter(id__in=referencias_lote(movimientos, 'tarjeta'))
+        }
+
+        tarifas = TablaTarifas()
+        recepciones, errores = [], []
+        for indice, movimiento in enumerate(movimientos):
+            recepcion, errores_fila = validar_movimiento(movimiento, clientes, tarjetas, tarifas)
+            if errores_fila:
+                errores.append({'indice': indice, 'errores': errores_fila})
+            else:
+                recepcion.usuario = request.user
+                recepciones.append(recepcion)
+
+        if errores:
+            return Response(
+                {"error": "Hay filas con errores; no se creó ningún movimiento.", "errores": errores},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        # Filtro por tarjeta
-        tarjeta_id = request.query_params.get('tarjeta', None)
-        if tarjeta_id:
-            recepciones = recepciones.filter(tarjeta_id=tarjeta_id)
+        with transaction.atomic():
+            creadas = bulk_create_with_history(recepciones, RecepcionPago, default_user=request.user)
+            # Revalida con las filas ya insertadas y con bloqueo: un cierre concurrente de esos meses
+            # espera este commit o hace fallar el lote
+            for fecha in {mes_de(RecepcionPago, r.fecha): r.fecha for r in recepciones}.values():
+                validar_periodo_abierto(RecepcionPago, fecha)
+            aplicar_saldos_lote(recepciones)
+            # bulk_create no envía señales: los resúmenes de periodos cerrados se invalidan aquí
+            transaction.on_commit(lambda: invalidar_resumen(RecepcionPago))
+
+        for recepcion in creadas:
+            # Con MySQL bulk_create_with_history devuelve las filas releídas, sin las relaciones cargadas
+            recepcion.usuario = request.user
+            recepcion.cliente = clientes[str(recepcion.cliente_id)]
+            recepcion.tarjeta = tarjetas[str(recepcion.tarjeta_id)]
 
-        # Filtro por usuario
-        usuario_id = request.query_params.get('usuario', None)
-        if usuario_id:
-            recepciones = recepciones.filter(usuario_id=usuario_id)
+        return Response(
+            {'creados': len(creadas), 'results': [serialize_recepcion_pago(r) for r in creadas]},
+            status=status.HTTP_201_CREATED
+        )
 
-        # Filtro por fecha de recepción
-        fecha_start = request.query_params.get('fecha_start', None)
-        fecha_end = request.query_params.get('fecha_end', None)
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except DatabaseError as e:
+        return Response(
+            {"error": f"Error de base de datos: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    except Exception as e:
+        return Response(
+            {"error": f"Error inesperado: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
 
-        if fecha_start:
-            try:
-                start_date = datetime.strptime(fecha_start, '%Y-%m-%d').date()
-                recepciones = recepciones.filter(fecha__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_start debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
 
-        if fecha_end:
-            try:
-                end_date = datetime.strptime(fecha_end, '%Y-%m-%d').date()
-                recepciones = recepciones.filter(fecha__lte=end_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_end debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_recepciones_pago(request):
+    """Listar recepciones de pago con filtros y paginación"""
+    try:
+        return listar(request, LISTADO_RECEPCIONES_PAGO)
+    except Exception as e:
+        return Response(
+            {"error": f"Error al obtener recepciones de pago: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
 
-        # Filtro por fecha de creación
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
 
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                recepciones = recepciones.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+EXPORT_COLUMNAS = {
+    'id': 'id',
+    'fecha': 'fecha',
+    'cliente_id': 'cliente_id',
+    'cliente': 'cliente__nombre',
+    'tarjeta_id': 'tarjeta_id',
+    'tarjeta_numero': 'tarjeta__numero',
+    'tarjeta_titular': 'tarjeta__titular',
+    'usuario_id': 'usuario_id',
+    'usuario_email': 'usuario__email',
+    'valor': 'valor',
+    'cuatro_por_mil': 'cuatro_por_mil',
+    'total': 'total',
+    'observacion': 'observacion',
+    'created_at': 'created_at',
+    'deleted_at': 'deleted_at',
+}
 
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                recepciones = recepciones.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+EXPORT_CHUNK_SIZE = 2000
 
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            recepciones = recepciones.filter(deleted_at__isnull=True)
 
-        # Ordenar
-        recepciones = recepciones.order_by('-created_at')
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'contador'])])
+def export_recepciones_pago(request):
+    """
+    Exportar recepciones de pago en streaming (CSV o NDJSON).
+
+    Acepta los mismos filtros que el listado (cliente, tarjeta, usuario,
+    fecha_start, fecha_end, ...). Query param formato: csv (defecto) | ndjson.
+    Las filas se leen por lotes ordenados por (fecha, id), así que la memoria
+    no crece con el número de filas exportadas.
+    """
+    try:
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in ('csv', 'ndjson'):
+            return Response(
+                {"error": "Formato inválido. Opciones: csv, ndjson"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        # Paginación
-        page_size_param = request.query_params.get('page_size', 10)
         try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
+            recepciones = LISTADO_RECEPCIONES_PAGO.filtrar(RecepcionPago.objects.all(), request.query_params)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_recepciones = paginator.paginate_queryset(recepciones, request)
+        recepciones = recepciones.values(*EXPORT_COLUMNAS.values())
+        filas = (
+            {columna: fila[campo] for columna, campo in EXPORT_COLUMNAS.items()}
+            for fila in iterar_por_lotes(recepciones, orden=('fecha', 'id'), chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        columnas = list(EXPORT_COLUMNAS.keys())
 
-        data = [serialize_recepcion_pago(r) for r in paginated_recepciones]
-        return paginator.get_paginated_response(data)
+        if formato == 'ndjson':
+            response = StreamingHttpResponse(stream_ndjson(filas, columnas), content_type='application/x-ndjson')
+            response['Content-Disposition'] = 'attachment; filename="recepciones_pago.ndjson"'
+        else:
+            response = StreamingHttpResponse(stream_csv(filas, columnas), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = 'attachment; filename="recepciones_pago.csv"'
+        return response
 
     except Exception as e:
         return Response(
-            {"error": f"Error al obtener recepciones de pago: {str(e)}"},
+            {"error": f"Error al exportar recepciones de pago: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
@@ -306,16 +469,18 @@ def update_recepcion_pago(request, pk):
         recepcion.observacion = request.data.get('observacion', recepcion.observacion)
         recepcion.fecha = request.data.get('fecha', recepcion.fecha)
 
-        # Recalcular cuatro_por_mil y total si cambió valor o tarjeta
-        if 'valor' in request.data or 'tarjeta' in request.data:
+        # Recalcular cuatro_por_mil y total si cambió valor, tarjeta o fecha (la tasa depende de la fecha)
+        if 'valor' in request.data or 'tarjeta' in request.data or 'fecha' in request.data:
             valor = Decimal(recepcion.valor)
-            recepcion.cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta)
+            recepcion.cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta, recepcion.fecha)
             recepcion.total = valor + recepcion.cuatro_por_mil
 
         recepcion.save()
 
         return Response(serialize_recepcion_pago(recepcion), status=status.HTTP_200_OK)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -339,6 +504,8 @@ def delete_recepcion_pago(request, pk):
             {"message": "Recepción de pago eliminada correctamente"},
             status=status.HTTP_200_OK
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar recepción de pago: {str(e)}"},
@@ -359,6 +526,8 @@ def restore_recepcion_pago(request, pk):
             )
         recepcion.restore()
         return Response(serialize_recepcion_pago(recepcion), status=status.HTTP_200_OK)
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al restaurar recepción de pago: {str(e)}"},
@@ -377,6 +546,8 @@ def hard_delete_recepcion_pago(request, pk):
             {"message": "Recepción de pago eliminada permanentemente"},
             status=status.HTTP_204_NO_CONTENT
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar recepción de pago: {str(e)}"},
@@ -390,7 +561,7 @@ def recepcion_pago_history(request, pk):
     """Obtener el historial de cambios de una recepción de pago"""
     try:
         recepcion = get_object_or_404(RecepcionPago.objects, pk=pk)
-        history = recepcion.history.all()
+        history = recepcion.history.select_related('history_user')
 
         # Paginación
         page_size_param = request.query_params.get('page_size', 10)
@@ -403,6 +574,10 @@ def recepcion_pago_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recepcion_pago', '0004_historicalrecepcionpago_cuatro_por_mil_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recepcionpago',
+            index=models.Index(fields=['deleted_at', 'created_at'], name='recepcion_del_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recepcionpago',
+            index=models.Index(fields=['cliente', 'deleted_at', 'fecha'], name='recepcion_cli_del_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recepcionpago',
+            index=models.Index(fields=['tarjeta', 'deleted_at', 'fecha'], name='recepcion_tar_del_fecha_idx'),
+        ),
+    ]
@@ -3,8 +3,10 @@ from django.conf import settings
 from clientes.models import Cliente
 from tarjetas.models import Tarjeta
 from simple_history.models import HistoricalRecords
+from backend.history import BufferedHistoricalRecords
+from backend.atomic import GuardadoAtomico
 
-class RecepcionPago(models.Model):
+class RecepcionPago(GuardadoAtomico, models.Model):
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -34,13 +36,18 @@ class RecepcionPago(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
     class Meta:
         db_table = 'recepciones_pago'
         ordering = ['-created_at']
         verbose_name = 'Recepcion Pago'
         verbose_name_plural = 'Recepciones Pago'
+        indexes = [
+            models.Index(fields=['deleted_at', 'created_at'], name='recepcion_del_created_idx'),
+            models.Index(fields=['cliente', 'deleted_at', 'fecha'], name='recepcion_cli_del_fecha_idx'),
+            models.Index(fields=['tarjeta', 'deleted_at', 'fecha'], name='recepcion_tar_del_fecha_idx'),
+        ]
 
     def __str__(self):
         return f'RecepcionPago {self.id} - Cliente: {self.cliente} - Tarjeta: {self.tarjeta} - Valor: {self.valor}'
@@ -1,3 +1,268 @@
-from django.test import TestCase
+import csv
+import json
+from datetime import date, datetime
+from io import StringIO
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from clientes.models import Cliente, ClienteSaldo
+from reportes.cierres import PeriodoCerrado, cerrar_mes
+from tarjetas.models import Tarjeta, TarjetaMovimientoDiario
+from users.models import User
+from .api import views
+from .models import RecepcionPago
+
+
+def a_las(dia, hora=12):
+    return timezone.make_aware(datetime(2024, 1, dia, hora))
+
+class RecepcionPagoIndexesTest(TestCase):
+    """Verifica con EXPLAIN que los filtros comunes del listado usan los índices compuestos"""
+
+    def setUp(self):
+        self.fecha_start = timezone.make_aware(datetime(2024, 1, 1))
+        self.fecha_end = timezone.make_aware(datetime(2024, 1, 31, 23, 59, 59))
+
+    def test_listado_activos_usa_indice_deleted_created(self):
+        plan = RecepcionPago.objects.filter(deleted_at__isnull=True).order_by('-created_at').explain()
+        self.assertIn('recepcion_del_created_idx', plan)
+
+    def test_filtro_cliente_fecha_usa_indice_cliente(self):
+        plan = RecepcionPago.objects.filter(
+            cliente_id=1,
+            deleted_at__isnull=True,
+            fecha__gte=self.fecha_start,
+            fecha__lte=self.fecha_end,
+        ).explain()
+        self.assertIn('recepcion_cli_del_fecha_idx', plan)
+
+    def test_filtro_tarjeta_fecha_usa_indice_tarjeta(self):
+        plan = RecepcionPago.objects.filter(
+            tarjeta_id=1,
+            deleted_at__isnull=True,
+            fecha__gte=self.fecha_start,
+            fecha__lte=self.fecha_end,
+        ).explain()
+        self.assertIn('recepcion_tar_del_fecha_idx', plan)
+
+
+class ExportRecepcionesPagoTest(TestCase):
+    """Exportación CSV / NDJSON: contenido, filtros, formato inválido y lectura por lotes"""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='contador', email='contador@example.com', role='contador')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+        self.otro_cliente = Cliente.objects.create(nombre='Otro cliente')
+        self.tarjeta = Tarjeta.objects.create(numero='1234', titular='Titular', descripcion='Tarjeta')
+
+        self.recepciones = [
+            self.crear('10.00', a_las(3)),
+            self.crear('20.00', a_las(1), observacion='primera'),
+            self.crear('30.00', a_las(2)),
+            self.crear('40.00', a_las(2), cliente=self.otro_cliente),
+            self.crear('50.00', a_las(5)),
+        ]
+        borrada = self.crear('99.00', a_las(4))
+        borrada.soft_delete()
+        self.borrada = borrada
+
+    def crear(self, valor, fecha, cliente=None, observacion=None):
+        return RecepcionPago.objects.create(
+            usuario=self.usuario, cliente=cliente or self.cliente, tarjeta=self.tarjeta,
+            valor=Decimal(valor), total=Decimal(valor), fecha=fecha, observacion=observacion,
+        )
+
+    def exportar(self, **params):
+        response = self.client.get('/api/recepcion_pago/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def ids_exportados(self, **params):
+        return [json.loads(linea)['id'] for linea in self.exportar(formato='ndjson', **params).splitlines()]
+
+    def test_csv(self):
+        filas = list(csv.DictReader(self.exportar().splitlines()))
+
+        self.assertEqual(list(filas[0].keys()), list(views.EXPORT_COLUMNAS.keys()))
+        # Orden por (fecha, id); la borrada no se exporta
+        ordenadas = sorted(self.recepciones, key=lambda r: (r.fecha, r.id))
+        self.assertEqual([int(f['id']) for f in filas], [r.id for r in ordenadas])
+        primera = filas[0]
+        self.assertEqual(primera['valor'], '20.00')
+        self.assertEqual(primera['cliente'], 'Cliente')
+        self.assertEqual(primera['tarjeta_numero'], '1234')
+        self.assertEqual(primera['usuario_email'], 'contador@example.com')
+        self.assertEqual(primera['observacion'], 'primera')
+        self.assertEqual(primera['deleted_at'], '')
+
+    def test_ndjson(self):
+        filas = [json.loads(linea) for linea in self.exportar(formato='ndjson').splitlines()]
+
+        self.assertEqual(len(filas), 5)
+        self.assertEqual(list(filas[0].keys()), list(views.EXPORT_COLUMNAS.keys()))
+        self.assertEqual(filas[0]['valor'], '20.00')
+        self.assertEqual(filas[0]['fecha'], '2024-01-01T12:00:00Z')
+        self.assertIsNone(filas[-1]['observacion'])
+
+    def test_filtros_del_listado(self):
+        ids = self.ids_exportados
+        self.assertEqual(ids(cliente=self.otro_cliente.id), [self.recepciones[3].id])
+        self.assertEqual(
+            ids(fecha_start='2024-01-02', fecha_end='2024-01-03'),
+            [self.recepciones[2].id, self.recepciones[3].id, self.recepciones[0].id],
+        )
+        self.assertEqual(ids(search='primera'), [self.recepciones[1].id])
+        self.assertIn(self.borrada.id, ids(include_deleted='1'))
+
+    def test_parametros_invalidos_responden_400(self):
+        for params in ({'formato': 'xlsx'}, {'fecha_start': '01/01/2024'}, {'cliente': 'uno'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/recepcion_pago/export/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+    def test_lee_por_lotes(self):
+        with mock.patch.object(views, 'EXPORT_CHUNK_SIZE', 2):
+            with CaptureQueriesContext(connection) as consultas:
+                ids = self.ids_exportados()
+
+        ordenadas = sorted(self.recepciones, key=lambda r: (r.fecha, r.id))
+        # Sin repetir ni saltar filas entre lotes, también con fechas empatadas
+        self.assertEqual(ids, [r.id for r in ordenadas])
+        lotes = [q['sql'] for q in consultas.captured_queries if 'FROM "recepciones_pago"' in q['sql']]
+        self.assertEqual(len(lotes), 3)
+        self.assertTrue(all('LIMIT 2' in sql for sql in lotes))
+
+
+@override_settings(REFERENCE_CACHE_LOCAL_TTL=0)
+class CrearRecepcionesLoteTest(TestCase):
+    """create-batch: todo o nada, reporte por fila, meses cerrados y saldos iguales a los recalculados"""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create(username='contador', email='contador@example.com', role='contador')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+        self.otro_cliente = Cliente.objects.create(nombre='Otro cliente')
+        self.tarjeta = Tarjeta.objects.create(numero='1234', titular='Titular', descripcion='Tarjeta', cuatro_por_mil='1')
+        self.exenta = Tarjeta.objects.create(numero='5678', titular='Titular', descripcion='Exenta')
+        # Saldo y resumen diario ya materializados para el cliente y la tarjeta
+        with self.captureOnCommitCallbacks(execute=True):
+            RecepcionPago.objects.create(
+                usuario=self.usuario, cliente=self.cliente, tarjeta=self.tarjeta, valor=Decimal('10.00'),
+                total=Decimal('10.00'), fecha=timezone.make_aware(datetime(2025, 4, 2, 12)),
+            )
+
+    def movimiento(self, **campos):
+        datos = {
+            'cliente': self.cliente.id, 'tarjeta': self.tarjeta.id, 'valor': '1000.00',
+            'fecha': '2025-04-02T12:00:00Z', 'observacion': 'lote',
+        }
+        datos.update(campos)
+        return datos
+
+    def crear_lote(self, movimientos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/recepcion_pago/create-batch/', {'movimientos': movimientos}, format='json')
+
+    def estado(self):
+        """Filas, historial y saldos: lo que un lote rechazado no debe tocar"""
+        return (
+            RecepcionPago.objects.count(),
+            RecepcionPago.history.count(),
+            list(ClienteSaldo.objects.order_by('cliente_id').values()),
+            list(TarjetaMovimientoDiario.objects.order_by('tarjeta_id', 'fecha').values()),
+        )
+
+    def test_lote_con_historial_y_saldos_recalculables(self):
+        response = self.crear_lote([
+            self.movimiento(),
+            self.movimiento(cliente=self.otro_cliente.id, valor='250.50'),
+            self.movimiento(tarjeta=self.exenta.id, fecha='2025-04-03T12:00:00Z', valor='40.00'),
+        ])
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['creados'], 3)
+        self.assertEqual(
+            [(r['cuatro_por_mil'], r['total']) for r in response.data['results']],
+            [('4.00', '1004.00'), ('1.00', '251.50'), ('0.00', '40.00')],
+        )
+
+        historial = RecepcionPago.history.filter(observacion='lote')
+        self.assertEqual(historial.count(), 3)
+        self.assertEqual({(h.history_type, h.history_user_id) for h in historial}, {('+', self.usuario.id)})
+
+        # Los UPDATE incrementales del lote dejan lo mismo que un recálculo desde cero
+        call_command('recalcular_saldos', '--check', stdout=StringIO())
+        call_command('recalcular_movimientos_tarjetas', '--check', stdout=StringIO())
+        self.assertEqual(ClienteSaldo.objects.get(cliente=self.cliente).total_recepciones, Decimal('1050.00'))
+        self.assertEqual(ClienteSaldo.objects.get(cliente=self.otro_cliente).total_recepciones, Decimal('250.50'))
+        self.assertEqual(
+            TarjetaMovimientoDiario.objects.get(tarjeta=self.tarjeta, fecha=date(2025, 4, 2)).total_recepciones,
+            Decimal('1265.50'),
+        )
+
+    def test_errores_por_fila_sin_crear_nada(self):
+        antes = self.estado()
+        response = self.crear_lote([
+            self.movimiento(),
+            self.movimiento(valor=''),
+            self.movimiento(cliente=999999, valor='abc'),
+            'no es un objeto',
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        errores = {error['indice']: error['errores'] for error in response.data['errores']}
+        self.assertEqual(sorted(errores), [1, 2, 3])
+        self.assertEqual(errores[1], ['El campo valor es requerido.'])
+        self.assertEqual(errores[2][0], 'El cliente especificado no existe.')
+        self.assertTrue(errores[2][1].startswith('El campo valor no es válido'))
+        self.assertEqual(errores[3], ['La fila debe ser un objeto.'])
+        self.assertEqual(self.estado(), antes)
+
+    def test_fila_en_mes_cerrado(self):
+        cerrar_mes(date(2025, 3, 1), self.usuario)
+        antes = self.estado()
+
+        response = self.crear_lote([self.movimiento(), self.movimiento(fecha='2025-03-15T12:00:00Z')])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['indice'] for error in response.data['errores']], [1])
+        self.assertEqual(self.estado(), antes)
+
+    def test_cierre_concurrente_revierte_el_lote(self):
+        antes = self.estado()
+        validar = views.validar_periodo_abierto
+
+        def cerrado_al_insertar(model, fecha):
+            # El mes se cierra entre la validación de las filas y el INSERT
+            if RecepcionPago.objects.filter(observacion='lote').exists():
+                raise PeriodoCerrado('El periodo 2025-04 está cerrado.')
+            return validar(model, fecha)
+
+        with mock.patch.object(views, 'validar_periodo_abierto', cerrado_al_insertar):
+            response = self.crear_lote([self.movimiento(), self.movimiento(cliente=self.otro_cliente.id)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.estado(), antes)
+
+    def test_limite_y_formato(self):
+        self.assertEqual(views.MAX_MOVIMIENTOS_LOTE, 500)
+        response = self.crear_lote([self.movimiento()] * (views.MAX_MOVIMIENTOS_LOTE + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('500', response.data['error'])
+
+        for movimientos in ([], {'cliente': self.cliente.id}, None):
+            with self.subTest(movimientos=movimientos):
+                self.assertEqual(self.crear_lote(movimientos).status_code, 400)
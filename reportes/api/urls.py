@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('resumen/',                   views.resumen_financiero, name='resumen_financiero'),
+
+    # Cierre mensual
+    path('cierres/',                   views.list_cierres,       name='list_cierres'),
+    path('cierres/cerrar/',            views.cerrar_periodo,     name='cerrar_periodo'),
+    path('cierres/<str:mes>/reabrir/', views.reabrir_periodo,    name='reabrir_periodo'),
+]
@@ -0,0 +1,161 @@
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from django.utils import timezone
+from datetime import datetime
+
+from clientes.models import Cliente
+from tarjetas.models import Tarjeta
+from backend.listing import leer_fecha
+from ..cierres import cerrar_mes, reabrir_mes
+from ..models import CierrePeriodo
+from ..resumen import PERIODOS, periodos_en_rango, resumen
+from .permissions import RolePermission
+
+MAX_PERIODOS = 400
+
+
+def serialize_totales(totales):
+    """{tipo: {valor, total, cantidad}} con los montos como str"""
+    return {
+        tipo: {'valor': str(t['valor']), 'total': str(t['total']), 'cantidad': t['cantidad']}
+        for tipo, t in totales.items()
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'contador'])])
+def resumen_financiero(request):
+    """
+    Totales de ingresos, devoluciones, cargos, ajustes, gastos y utilidades en
+    el rango start_date..end_date (por defecto el mes actual), por periodo
+    (period=day|week|month), por cliente y por tarjeta.
+    """
+    try:
+        periodo = request.query_params.get('period', 'month')
+        if periodo not in PERIODOS:
+            return Response(
+                {"error": f"Periodo inválido: {periodo}. Opciones: {', '.join(PERIODOS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        hasta = leer_fecha(request.query_params, 'end_date') or timezone.localdate()
+        desde = leer_fecha(request.query_params, 'start_date') or hasta.replace(day=1)
+        if desde > hasta:
+            return Response(
+                {"error": "La fecha de inicio no puede ser mayor a la fecha de fin."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if sum(1 for _ in periodos_en_rango(desde, hasta, periodo)) > MAX_PERIODOS:
+            return Response(
+                {"error": f"El rango no puede tener más de {MAX_PERIODOS} periodos; use un periodo más largo."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        datos = resumen(periodo, desde, hasta)
+
+        clientes = dict(Cliente.objects.filter(id__in=list(datos['clientes'])).values_list('id', 'nombre'))
+        tarjetas = {
+            t['id']: t for t in Tarjeta.objects.filter(id__in=list(datos['tarjetas'])).values('id', 'numero', 'titular')
+        }
+
+        return Response({
+            'period': periodo,
+            'start_date': desde,
+            'end_date': hasta,
+            'totales': serialize_totales(datos['totales']),
+            'periodos': [
+                {'periodo': inicio, 'totales': serialize_totales(totales)}
+                for inicio, totales in datos['periodos'].items()
+            ],
+            'clientes': [
+                {'id': cliente_id, 'nombre': clientes.get(cliente_id), 'totales': serialize_totales(totales)}
+                for cliente_id, totales in sorted(datos['clientes'].items())
+            ],
+            'tarjetas': [
+                {
+                    'id': tarjeta_id,
+                    'numero': tarjetas.get(tarjeta_id, {}).get('numero'),
+                    'titular': tarjetas.get(tarjeta_id, {}).get('titular'),
+                    'totales': serialize_totales(totales),
+                }
+                for tarjeta_id, totales in sorted(datos['tarjetas'].items())
+            ],
+        }, status=status.HTTP_200_OK)
+
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": f"Error al generar el resumen: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def leer_mes(valor):
+    """Mes YYYY-MM como date (primer día); lanza ValueError si el formato es inválido"""
+    try:
+        return datetime.strptime(valor or '', '%Y-%m').date()
+    except ValueError:
+        raise ValueError("El formato de mes debe ser YYYY-MM.")
+
+
+def serialize_cierre(cierre):
+    """Convierte un objeto CierrePeriodo a diccionario"""
+    return {
+        'id': cierre.id,
+        'mes': f'{cierre.mes:%Y-%m}',
+        'usuario': {
+            'id': cierre.usuario.id,
+            'name': f"{cierre.usuario.first_name} {cierre.usuario.last_name}".strip(),
+        } if cierre.usuario else None,
+        'created_at': cierre.created_at,
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'contador'])])
+def list_cierres(request):
+    """Listar los meses cerrados"""
+    try:
+        cierres = CierrePeriodo.objects.select_related('usuario').order_by('-mes')
+        return Response([serialize_cierre(c) for c in cierres], status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response(
+            {"error": f"Error al obtener cierres: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin'])])
+def cerrar_periodo(request):
+    """Cerrar un mes ({"mes": "YYYY-MM"}): congela sus totales y bloquea sus movimientos"""
+    try:
+        cierre = cerrar_mes(leer_mes(request.data.get('mes')), usuario=request.user)
+        return Response(serialize_cierre(cierre), status=status.HTTP_201_CREATED)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": f"Error al cerrar el periodo: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, RolePermission(['SuperAdmin'])])
+def reabrir_periodo(request, mes):
+    """Reabrir un mes cerrado: borra sus totales congelados y vuelve a permitir cambios"""
+    try:
+        if not reabrir_mes(leer_mes(mes)):
+            return Response({"error": f"El periodo {mes} no está cerrado."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"message": f"Periodo {mes} reabierto correctamente"}, status=status.HTTP_200_OK)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": f"Error al reabrir el periodo: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
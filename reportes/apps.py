@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class ReportesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'reportes'
+
+    def ready(self):
+        from .signals import connect_resumen_signals
+        from .cache import connect_cache_signals
+        connect_resumen_signals()
+        connect_cache_signals()
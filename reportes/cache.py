@@ -0,0 +1,14 @@
+from backend.reference_cache import ReferenceCache
+
+from .models import CierrePeriodo
+
+
+def cargar_meses_cerrados():
+    return sorted(CierrePeriodo.objects.values_list('mes', flat=True))
+
+
+meses_cerrados = ReferenceCache('meses_cerrados', cargar_meses_cerrados)
+
+
+def connect_cache_signals():
+    meses_cerrados.connect(CierrePeriodo)
@@ -0,0 +1,116 @@
+"""
+Cierre mensual de periodos.
+
+cerrar_mes() congela en ResumenMensual los totales del mes por tipo de
+movimiento, cliente y tarjeta (las mismas consultas agrupadas del resumen
+financiero) y registra el CierrePeriodo, todo en una transacción. Desde ese
+momento:
+
+- Los reportes por mes leen los meses cerrados de ResumenMensual y solo
+  consultan las tablas de movimientos para los meses abiertos.
+- Las señales de reportes.signals rechazan con PeriodoCerrado cualquier
+  save() / delete() de un movimiento cuya fecha (anterior o nueva) caiga en
+  un mes cerrado. Las correcciones se registran con fecha de un periodo
+  abierto (p. ej. un ajuste de saldo).
+
+reabrir_mes() borra el cierre y sus resúmenes.
+
+Concurrencia: la validación consulta CierrePeriodo en la base de datos (no el
+cache de meses_cerrados, que puede estar atrasado unos segundos en otro
+worker) y, dentro de la transacción del movimiento, con SELECT ... FOR UPDATE.
+Las señales validan con la fila del movimiento ya bloqueada: las
+modificaciones y borrados la bloquean antes de validar y las altas se validan
+después del INSERT. cerrar_mes() inserta el CierrePeriodo antes de leer los
+totales y bloquea las filas del mes:
+
+- un movimiento que se valida después de ese INSERT espera al commit del
+  cierre y entonces lo ve cerrado;
+- uno que se validó antes ya tiene su fila bloqueada, así que cerrar_mes()
+  espera su commit (en InnoDB la lectura con bloqueo también espera las
+  inserciones sin confirmar) y lo incluye en los totales congelados.
+
+Si ambos se bloquean mutuamente la base de datos aborta uno de los dos
+(deadlock) y nada queda a medias.
+"""
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from tarjetas.saldos import dia_movimiento
+
+from .models import CierrePeriodo, ResumenMensual
+from .resumen import MOVIMIENTOS_REPORTE, consultar_tabla, inicio_dia, siguiente_periodo
+
+
+class PeriodoCerrado(ValueError):
+    """Se intentó modificar un movimiento de un mes cerrado"""
+
+
+def mes_de(model, fecha):
+    return dia_movimiento(model, fecha).replace(day=1)
+
+
+def validar_periodo_abierto(model, fecha):
+    """
+    Lanza PeriodoCerrado si la fecha del movimiento cae en un mes cerrado.
+    Dentro de una transacción lee el cierre con bloqueo (espera a un
+    cerrar_mes() en curso para ese mes).
+    """
+    if fecha is None:
+        return
+    mes = mes_de(model, fecha)
+    cierres = CierrePeriodo.objects.filter(mes=mes)
+    if transaction.get_connection().in_atomic_block:
+        cierres = cierres.select_for_update()
+    if cierres.exists():
+        raise PeriodoCerrado(
+            f"El periodo {mes:%Y-%m} está cerrado; registre la corrección con fecha de un "
+            f"periodo abierto (p. ej. un ajuste de saldo)."
+        )
+
+
+def cerrar_mes(mes, usuario=None):
+    """Congela los totales del mes (primer día) y lo marca como cerrado"""
+    mes = mes.replace(day=1)
+    if mes >= timezone.localdate().replace(day=1):
+        raise ValueError("Solo se pueden cerrar meses que ya terminaron.")
+    if CierrePeriodo.objects.filter(mes=mes).exists():
+        raise ValueError(f"El periodo {mes:%Y-%m} ya está cerrado.")
+
+    fin = siguiente_periodo(mes, 'month')
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                cierre = CierrePeriodo.objects.create(mes=mes, usuario=usuario)
+        except IntegrityError:
+            # Otro cierre del mismo mes se confirmó mientras tanto
+            raise ValueError(f"El periodo {mes:%Y-%m} ya está cerrado.")
+
+        # Espera a los movimientos del mes que ya pasaron la validación y siguen en curso
+        for label in MOVIMIENTOS_REPORTE.values():
+            bloquear_mes(apps.get_model(label), mes, fin)
+
+        resumenes = []
+        for tipo in MOVIMIENTOS_REPORTE:
+            for cliente_id, tarjeta_id, valor, total, cantidad in consultar_tabla(tipo, 'month', mes, fin).get(mes, []):
+                resumenes.append(ResumenMensual(
+                    cierre=cierre, mes=mes, tipo=tipo, cliente_id=cliente_id, tarjeta_id=tarjeta_id,
+                    valor=valor, total=total, cantidad=cantidad,
+                ))
+        ResumenMensual.objects.bulk_create(resumenes, batch_size=1000)
+    return cierre
+
+
+def bloquear_mes(model, mes, fin):
+    """Bloquea (SELECT ... FOR UPDATE) las filas del mes, incluidas las eliminadas que se pueden restaurar"""
+    filas = model._default_manager.select_for_update().filter(
+        fecha__gte=inicio_dia(mes), fecha__lt=inicio_dia(fin)
+    ).values_list('pk', flat=True)
+    for _ in filas.iterator(chunk_size=2000):
+        pass
+
+
+def reabrir_mes(mes):
+    """Borra el cierre del mes y sus resúmenes; devuelve False si no estaba cerrado"""
+    borrados, _ = CierrePeriodo.objects.filter(mes=mes.replace(day=1)).delete()
+    return bool(borrados)
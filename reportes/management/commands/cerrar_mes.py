@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reportes.cierres import cerrar_mes
+
+
+class Command(BaseCommand):
+    help = 'Cierra un mes: congela sus totales en los resúmenes mensuales y bloquea sus movimientos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Mes a cerrar (YYYY-MM); por defecto el mes anterior')
+
+    def handle(self, *args, **options):
+        if options['mes']:
+            try:
+                mes = datetime.strptime(options['mes'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('El formato de --mes debe ser YYYY-MM')
+        else:
+            mes = (timezone.localdate().replace(day=1) - timedelta(days=1)).replace(day=1)
+
+        try:
+            cierre = cerrar_mes(mes)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Periodo {mes:%Y-%m} cerrado, {cierre.resumenes.count()} resúmenes congelados'
+        ))
@@ -0,0 +1,58 @@
+# Generated by Django 4.2 on 2026-10-17 04:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tarjetas', '0003_tarjetamovimientodiario'),
+        ('clientes', '0003_clientesaldo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierrePeriodo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primer día del mes cerrado', unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cierres_periodo', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Cierre de Periodo',
+                'verbose_name_plural': 'Cierres de Periodo',
+                'db_table': 'reportes_cierres_periodo',
+                'ordering': ['-mes'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('tipo', models.CharField(max_length=20)),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('cierre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='reportes.cierreperiodo')),
+                ('cliente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_mensuales', to='clientes.cliente')),
+                ('tarjeta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_mensuales', to='tarjetas.tarjeta')),
+            ],
+            options={
+                'verbose_name': 'Resumen Mensual',
+                'verbose_name_plural': 'Resúmenes Mensuales',
+                'db_table': 'reportes_resumenes_mensuales',
+                'ordering': ['mes', 'tipo'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='resumenmensual',
+            index=models.Index(fields=['mes', 'tipo'], name='resumen_mensual_mes_tipo_idx'),
+        ),
+    ]
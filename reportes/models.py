@@ -0,0 +1,72 @@
+from django.db import models
+from django.conf import settings
+
+from clientes.models import Cliente
+from tarjetas.models import Tarjeta
+
+
+class CierrePeriodo(models.Model):
+    """
+    Mes cerrado. Al cerrarlo se congelan sus totales en ResumenMensual y los
+    movimientos con fecha en ese mes ya no se pueden crear, modificar ni
+    eliminar (reportes.signals); las correcciones van en un periodo abierto.
+    """
+    mes = models.DateField(unique=True, help_text='Primer día del mes cerrado')
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='cierres_periodo'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'reportes_cierres_periodo'
+        ordering = ['-mes']
+        verbose_name = 'Cierre de Periodo'
+        verbose_name_plural = 'Cierres de Periodo'
+
+    def __str__(self):
+        return f'Cierre {self.mes:%Y-%m}'
+
+
+class ResumenMensual(models.Model):
+    """Totales congelados de un mes cerrado por tipo de movimiento, cliente y tarjeta"""
+    cierre = models.ForeignKey(
+        CierrePeriodo,
+        on_delete=models.CASCADE,
+        related_name='resumenes'
+    )
+    mes = models.DateField()
+    tipo = models.CharField(max_length=20)
+    cliente = models.ForeignKey(
+        Cliente,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='resumenes_mensuales'
+    )
+    tarjeta = models.ForeignKey(
+        Tarjeta,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='resumenes_mensuales'
+    )
+
+    valor    = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total    = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'reportes_resumenes_mensuales'
+        ordering = ['mes', 'tipo']
+        verbose_name = 'Resumen Mensual'
+        verbose_name_plural = 'Resúmenes Mensuales'
+        indexes = [
+            models.Index(fields=['mes', 'tipo'], name='resumen_mensual_mes_tipo_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.mes:%Y-%m} {self.tipo}: {self.total}'
@@ -0,0 +1,239 @@
+"""
+Resumen financiero por periodo (día / semana / mes), por cliente y por tarjeta.
+
+Cada tabla de movimientos se lee con una sola consulta agrupada por
+(periodo, cliente, tarjeta) y el resto de los cortes se arma en memoria a
+partir de esas filas.
+
+Con period=month, los meses cerrados con cierre mensual (reportes.cierres)
+se leen de ResumenMensual en una sola consulta y las tablas de movimientos
+solo se consultan para el resto del rango.
+
+Los periodos cerrados (los que terminaron antes de hoy) que caen completos
+dentro del rango pedido se guardan en cache, una entrada por tabla, tipo de
+periodo e inicio del periodo. La consulta agrupada solo cubre los periodos que
+faltan en cache (el abierto y los parciales siempre se leen en vivo). Cada tabla
+tiene su versión en `reportes_version:<tipo>`; invalidar_resumen() la
+reemplaza cuando se crea un movimiento con fecha anterior a hoy o se modifica /
+borra cualquier movimiento (reportes.signals). bulk_create / bulk_update no
+envían señales: después de usarlos hay que llamar invalidar_resumen()
+explícitamente.
+
+La versión es un token aleatorio y no un contador: si el cache expulsa la
+clave de versión se genera un token nuevo, y las entradas guardadas con
+versiones anteriores quedan huérfanas en lugar de volver a servirse.
+"""
+import uuid
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .cache import meses_cerrados
+from .models import ResumenMensual
+
+# tipo -> modelo
+MOVIMIENTOS_REPORTE = {
+    'ingresos':     'recepcion_pago.RecepcionPago',
+    'devoluciones': 'devoluciones.Devolucion',
+    'cargos':       'cargos_no_registrados.CargoNoRegistrado',
+    'ajustes':      'ajuste_de_saldo.AjusteDeSaldo',
+    'gastos':       'gastos.GastoRelacion',
+    'utilidades':   'utilidad_ocasional.UtilidadOcasional',
+}
+
+PERIODOS = ('day', 'week', 'month')
+
+CERO = Decimal('0.00')
+
+
+def tipo_de_modelo(model):
+    etiqueta = model._meta.label
+    for tipo, label in MOVIMIENTOS_REPORTE.items():
+        if label == etiqueta:
+            return tipo
+    return None
+
+
+def tiene_campo(model, nombre):
+    return any(field.name == nombre for field in model._meta.concrete_fields)
+
+
+def inicio_periodo(dia, periodo):
+    if periodo == 'week':
+        return dia - timedelta(days=dia.weekday())
+    if periodo == 'month':
+        return dia.replace(day=1)
+    return dia
+
+
+def siguiente_periodo(inicio, periodo):
+    if periodo == 'week':
+        return inicio + timedelta(days=7)
+    if periodo == 'month':
+        return (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return inicio + timedelta(days=1)
+
+
+def periodos_en_rango(desde, hasta, periodo):
+    """Inicios de los periodos que tocan [desde, hasta)"""
+    inicio = inicio_periodo(desde, periodo)
+    while inicio < hasta:
+        yield inicio
+        inicio = siguiente_periodo(inicio, periodo)
+
+
+def inicio_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def version_key(tipo):
+    return f'reportes_version:{tipo}'
+
+
+def nueva_version():
+    return uuid.uuid4().hex
+
+
+def version_actual(tipo):
+    """Versión vigente de la tabla; si la clave no existe (nunca se creó o se expulsó) se crea una nueva"""
+    version = cache.get(version_key(tipo))
+    if version is None:
+        cache.add(version_key(tipo), nueva_version(), None)
+        # add() no pisa la de otro proceso que la creó al mismo tiempo
+        version = cache.get(version_key(tipo)) or nueva_version()
+    return version
+
+
+def invalidar_resumen(model):
+    """Descarta los periodos cacheados de la tabla del modelo (label o clase)"""
+    if isinstance(model, str):
+        model = apps.get_model(model)
+    tipo = tipo_de_modelo(model)
+    if tipo is None:
+        return
+    cache.set(version_key(tipo), nueva_version(), None)
+
+
+def consultar_tabla(tipo, periodo, desde, hasta):
+    """
+    Una consulta agrupada por (periodo, cliente, tarjeta) sobre los movimientos
+    vigentes con fecha en [desde, hasta). Devuelve
+    {inicio_periodo: [(cliente_id, tarjeta_id, valor, total, cantidad)]}.
+    """
+    model = apps.get_model(MOVIMIENTOS_REPORTE[tipo])
+    grupos = [campo for campo in ('cliente_id', 'tarjeta_id') if tiene_campo(model, campo[:-3])]
+    campo_total = 'total' if tiene_campo(model, 'total') else 'valor'
+
+    filas = (
+        model._default_manager
+        .filter(deleted_at__isnull=True, fecha__gte=inicio_dia(desde), fecha__lt=inicio_dia(hasta))
+        .annotate(periodo=Trunc('fecha', periodo, output_field=DateField()))
+        .values('periodo', *grupos)
+        .annotate(suma_valor=Sum('valor'), suma_total=Sum(campo_total), cantidad=Count('id'))
+        .order_by()
+    )
+    resultado = {}
+    for fila in filas:
+        resultado.setdefault(fila['periodo'], []).append((
+            fila.get('cliente_id'),
+            fila.get('tarjeta_id'),
+            (fila['suma_valor'] or CERO).quantize(CERO),
+            (fila['suma_total'] or CERO).quantize(CERO),
+            fila['cantidad'],
+        ))
+    return resultado
+
+
+def resumenes_congelados(desde, hasta):
+    """
+    Filas de ResumenMensual de los meses cerrados que caen completos en
+    [desde, hasta): {tipo: {mes: [(cliente_id, tarjeta_id, valor, total, cantidad)]}}.
+    """
+    meses = [
+        mes for mes in meses_cerrados.get()
+        if mes >= desde and siguiente_periodo(mes, 'month') <= hasta
+    ]
+    if not meses:
+        return {}
+    resultado = {tipo: {mes: [] for mes in meses} for tipo in MOVIMIENTOS_REPORTE}
+    filas = ResumenMensual.objects.filter(mes__in=meses).values_list(
+        'tipo', 'mes', 'cliente_id', 'tarjeta_id', 'valor', 'total', 'cantidad'
+    )
+    for tipo, mes, *fila in filas:
+        if tipo in resultado:
+            resultado[tipo][mes].append(tuple(fila))
+    return resultado
+
+
+def filas_tabla(tipo, periodo, desde, hasta, hoy, congelados=None):
+    """
+    Filas agrupadas de la tabla en [desde, hasta): los periodos de congelados
+    tal cual, los cerrados desde cache y el resto en vivo.
+    """
+    resultado = dict(congelados or {})
+    version = version_actual(tipo)
+    claves = {}
+    for inicio in periodos_en_rango(desde, hasta, periodo):
+        fin = siguiente_periodo(inicio, periodo)
+        if inicio not in resultado and inicio >= desde and fin <= hasta and fin <= hoy:
+            claves[inicio] = f'reportes:{tipo}:{periodo}:{inicio.isoformat()}:{version}'
+
+    cacheados = cache.get_many(list(claves.values()))
+    resultado.update({inicio: cacheados[clave] for inicio, clave in claves.items() if clave in cacheados})
+
+    faltantes = [inicio for inicio in periodos_en_rango(desde, hasta, periodo) if inicio not in resultado]
+    if faltantes:
+        consulta_desde = max(desde, faltantes[0])
+        consulta_hasta = min(hasta, siguiente_periodo(faltantes[-1], periodo))
+        vivos = consultar_tabla(tipo, periodo, consulta_desde, consulta_hasta)
+        nuevos = {}
+        for inicio in faltantes:
+            resultado[inicio] = vivos.get(inicio, [])
+            if inicio in claves:
+                nuevos[claves[inicio]] = resultado[inicio]
+        if nuevos:
+            cache.set_many(nuevos, getattr(settings, 'REPORTES_CACHE_TTL', 86400))
+    return resultado
+
+
+def acumular(destino, tipo, valor, total, cantidad):
+    actual = destino.setdefault(tipo, {'valor': CERO, 'total': CERO, 'cantidad': 0})
+    actual['valor'] += valor
+    actual['total'] += total
+    actual['cantidad'] += cantidad
+
+
+def resumen(periodo, desde, hasta):
+    """
+    Totales de [desde, hasta] (fechas inclusivas) por tipo de movimiento:
+    generales, por periodo, por cliente y por tarjeta. Los montos van como
+    Decimal; `total` incluye el 4x1000 en las tablas que lo tienen.
+    """
+    hasta = hasta + timedelta(days=1)
+    hoy = timezone.localdate()
+
+    congelados = resumenes_congelados(desde, hasta) if periodo == 'month' else {}
+    totales, por_periodo, por_cliente, por_tarjeta = {}, {}, {}, {}
+    for tipo in MOVIMIENTOS_REPORTE:
+        for inicio, filas in filas_tabla(tipo, periodo, desde, hasta, hoy, congelados.get(tipo)).items():
+            for cliente_id, tarjeta_id, valor, total, cantidad in filas:
+                acumular(totales, tipo, valor, total, cantidad)
+                acumular(por_periodo.setdefault(inicio, {}), tipo, valor, total, cantidad)
+                if cliente_id is not None:
+                    acumular(por_cliente.setdefault(cliente_id, {}), tipo, valor, total, cantidad)
+                if tarjeta_id is not None:
+                    acumular(por_tarjeta.setdefault(tarjeta_id, {}), tipo, valor, total, cantidad)
+
+    return {
+        'totales': totales,
+        'periodos': dict(sorted(por_periodo.items())),
+        'clientes': por_cliente,
+        'tarjetas': por_tarjeta,
+    }
+
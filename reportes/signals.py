@@ -0,0 +1,70 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete
+from django.utils import timezone
+
+from tarjetas.saldos import dia_movimiento
+
+from .cierres import validar_periodo_abierto
+from .resumen import MOVIMIENTOS_REPORTE, invalidar_resumen
+
+
+def bloquear_fila(sender, pk):
+    """
+    Bloquea la fila del movimiento antes de validar el periodo: un
+    cerrar_mes() en curso espera a que esta transacción termine. Devuelve la
+    fecha guardada.
+    """
+    return sender._default_manager.select_for_update().filter(pk=pk).values_list('fecha', flat=True).first()
+
+
+def cierre_pre_save(sender, instance, raw=False, **kwargs):
+    """Rechaza modificar movimientos cuya fecha nueva o anterior cae en un mes cerrado"""
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    anterior = bloquear_fila(sender, instance.pk)
+    validar_periodo_abierto(sender, instance.fecha)
+    validar_periodo_abierto(sender, anterior)
+
+
+def cierre_post_save(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Rechaza crear movimientos en un mes cerrado. Se valida después del INSERT
+    (la fila nueva ya está bloqueada por esta transacción) y el save() es
+    atómico (backend.atomic), así que el error revierte el alta.
+    """
+    if raw or not created:
+        return
+    validar_periodo_abierto(sender, instance.fecha)
+
+
+def cierre_pre_delete(sender, instance, **kwargs):
+    bloquear_fila(sender, instance.pk)
+    validar_periodo_abierto(sender, instance.fecha)
+
+
+def resumen_post_save(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Un movimiento nuevo de hoy solo afecta el periodo abierto (que no se
+    cachea); uno con fecha anterior o cualquier modificación puede tocar un
+    periodo cerrado.
+    """
+    if raw:
+        return
+    if created and dia_movimiento(sender, instance.fecha) >= timezone.localdate():
+        return
+    transaction.on_commit(lambda: invalidar_resumen(sender))
+
+
+def resumen_post_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidar_resumen(sender))
+
+
+def connect_resumen_signals():
+    for label in MOVIMIENTOS_REPORTE.values():
+        model = apps.get_model(label)
+        pre_save.connect(cierre_pre_save, sender=model, dispatch_uid=f'cierre_pre_save_{label}')
+        post_save.connect(cierre_post_save, sender=model, dispatch_uid=f'cierre_post_save_{label}')
+        pre_delete.connect(cierre_pre_delete, sender=model, dispatch_uid=f'cierre_pre_delete_{label}')
+        post_save.connect(resumen_post_save, sender=model, dispatch_uid=f'resumen_post_save_{label}')
+        post_delete.connect(resumen_post_delete, sender=model, dispatch_uid=f'resumen_post_delete_{label}')
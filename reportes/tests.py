@@ -0,0 +1,260 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from clientes.models import Cliente
+from devoluciones.models import Devolucion
+from recepcion_pago.models import RecepcionPago
+from tarjetas.models import Tarjeta
+from users.models import User
+from .cache import meses_cerrados
+from .cierres import PeriodoCerrado, cerrar_mes, reabrir_mes
+from .models import CierrePeriodo, ResumenMensual
+from .resumen import resumen, version_key
+
+
+def fecha(dia):
+    return timezone.make_aware(datetime.combine(dia, datetime.min.time()).replace(hour=12))
+
+
+class MovimientosMixin:
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create(username='contador', email='contador@example.com', role='SuperAdmin')
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+        self.otro_cliente = Cliente.objects.create(nombre='Otro cliente')
+        self.tarjeta = Tarjeta.objects.create(numero='1234', titular='Titular', descripcion='Tarjeta')
+        self.otra_tarjeta = Tarjeta.objects.create(numero='5678', titular='Titular', descripcion='Otra tarjeta')
+
+    def crear(self, model, valor, dia, cliente=None, tarjeta=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return model.objects.create(
+                usuario=self.usuario, cliente=cliente or self.cliente, tarjeta=tarjeta or self.tarjeta,
+                valor=valor, total=valor, fecha=fecha(dia),
+            )
+
+
+@override_settings(REFERENCE_CACHE_LOCAL_TTL=0)
+class ResumenFinancieroTest(MovimientosMixin, TestCase):
+    """Totales agrupados del resumen y su cache por periodo cerrado"""
+
+    def setUp(self):
+        super().setUp()
+        self.crear(RecepcionPago, Decimal('100.00'), date(2025, 3, 5))
+        self.crear(RecepcionPago, Decimal('50.00'), date(2025, 3, 20), cliente=self.otro_cliente)
+        self.crear(RecepcionPago, Decimal('30.00'), date(2025, 4, 2), tarjeta=self.otra_tarjeta)
+        self.crear(Devolucion, Decimal('10.00'), date(2025, 4, 3))
+
+    def consultar(self):
+        return resumen('month', date(2025, 3, 1), date(2025, 4, 30))
+
+    def test_totales_agrupados(self):
+        datos = self.consultar()
+
+        self.assertEqual(datos['totales']['ingresos'], {'valor': Decimal('180.00'), 'total': Decimal('180.00'), 'cantidad': 3})
+        self.assertEqual(datos['totales']['devoluciones']['total'], Decimal('10.00'))
+        self.assertEqual(datos['periodos'][date(2025, 3, 1)]['ingresos']['total'], Decimal('150.00'))
+        self.assertEqual(datos['periodos'][date(2025, 4, 1)]['ingresos']['total'], Decimal('30.00'))
+        self.assertNotIn('devoluciones', datos['periodos'][date(2025, 3, 1)])
+        self.assertEqual(datos['clientes'][self.cliente.id]['ingresos']['total'], Decimal('130.00'))
+        self.assertEqual(datos['clientes'][self.otro_cliente.id]['ingresos']['cantidad'], 1)
+        self.assertEqual(datos['tarjetas'][self.tarjeta.id]['ingresos']['total'], Decimal('150.00'))
+        self.assertEqual(datos['tarjetas'][self.otra_tarjeta.id]['ingresos']['total'], Decimal('30.00'))
+
+    def test_periodos_cerrados_se_sirven_del_cache(self):
+        primera = self.consultar()
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = self.consultar()
+
+        self.assertEqual(primera, segunda)
+        self.assertFalse([q for q in consultas.captured_queries if 'recepciones_pago' in q['sql']])
+
+    def test_alta_con_fecha_anterior_invalida(self):
+        self.consultar()
+        self.crear(RecepcionPago, Decimal('5.00'), date(2025, 3, 10))
+        self.assertEqual(self.consultar()['totales']['ingresos']['total'], Decimal('185.00'))
+
+    def test_modificacion_invalida(self):
+        self.consultar()
+        recepcion = RecepcionPago.objects.get(valor=Decimal('100.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            recepcion.total = Decimal('120.00')
+            recepcion.save()
+        self.assertEqual(self.consultar()['totales']['ingresos']['total'], Decimal('200.00'))
+
+    def test_borrado_invalida(self):
+        self.consultar()
+        with self.captureOnCommitCallbacks(execute=True):
+            Devolucion.objects.get().delete()
+        self.assertNotIn('devoluciones', self.consultar()['totales'])
+
+    def test_perder_la_version_no_revive_entradas_anteriores(self):
+        cache.clear()
+        self.consultar()
+        self.crear(RecepcionPago, Decimal('5.00'), date(2025, 3, 10))
+        self.consultar()
+
+        # El cache expulsa la clave de versión: no se deben volver a leer las entradas de la primera consulta
+        cache.delete(version_key('ingresos'))
+        self.assertEqual(self.consultar()['totales']['ingresos']['total'], Decimal('185.00'))
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.usuario)
+        response = client.get('/api/reportes/resumen/', {'period': 'month', 'start_date': '2025-03-01', 'end_date': '2025-04-30'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totales']['ingresos']['total'], '180.00')
+        self.assertEqual([p['periodo'] for p in response.data['periodos']], [date(2025, 3, 1), date(2025, 4, 1)])
+        self.assertEqual(client.get('/api/reportes/resumen/', {'period': 'year'}).status_code, 400)
+
+
+@override_settings(REFERENCE_CACHE_LOCAL_TTL=0)
+class CierrePeriodoTest(MovimientosMixin, TestCase):
+    """Cierre mensual: totales congelados, movimientos bloqueados y reapertura"""
+
+    def setUp(self):
+        super().setUp()
+        self.recepcion = self.crear(RecepcionPago, Decimal('100.00'), date(2025, 3, 5))
+        self.crear(RecepcionPago, Decimal('50.00'), date(2025, 3, 20), cliente=self.otro_cliente)
+        self.devolucion = self.crear(Devolucion, Decimal('10.00'), date(2025, 3, 7))
+        self.crear(RecepcionPago, Decimal('30.00'), date(2025, 4, 2))
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def cerrar(self, mes=date(2025, 3, 1)):
+        with self.captureOnCommitCallbacks(execute=True):
+            return cerrar_mes(mes, usuario=self.usuario)
+
+    def test_cierre_congela_los_totales(self):
+        self.cerrar()
+
+        congelados = {
+            (r.tipo, r.cliente_id, r.tarjeta_id): (r.total, r.cantidad)
+            for r in ResumenMensual.objects.filter(mes=date(2025, 3, 1))
+        }
+        self.assertEqual(congelados, {
+            ('ingresos', self.cliente.id, self.tarjeta.id): (Decimal('100.00'), 1),
+            ('ingresos', self.otro_cliente.id, self.tarjeta.id): (Decimal('50.00'), 1),
+            ('devoluciones', self.cliente.id, self.tarjeta.id): (Decimal('10.00'), 1),
+        })
+
+    def test_no_se_cierra_dos_veces_ni_el_mes_en_curso(self):
+        self.cerrar()
+        with self.assertRaises(ValueError):
+            self.cerrar()
+        with self.assertRaises(ValueError):
+            self.cerrar(timezone.localdate())
+
+    def test_movimientos_del_mes_cerrado_quedan_bloqueados(self):
+        self.cerrar()
+
+        with self.assertRaises(PeriodoCerrado):
+            self.crear(RecepcionPago, Decimal('1.00'), date(2025, 3, 15))
+
+        self.recepcion.valor = Decimal('1.00')
+        with self.assertRaises(PeriodoCerrado):
+            self.recepcion.save()
+
+        # Mover un movimiento de un mes abierto hacia el cerrado
+        abierta = RecepcionPago.objects.get(fecha__month=4)
+        abierta.fecha = fecha(date(2025, 3, 15))
+        with self.assertRaises(PeriodoCerrado):
+            abierta.save()
+
+        with self.assertRaises(PeriodoCerrado):
+            self.devolucion.soft_delete()
+        # El Collector borra con atomic(savepoint=False): sin este bloque el error
+        # rompería la transacción del TestCase
+        with self.assertRaises(PeriodoCerrado), transaction.atomic():
+            self.devolucion.delete()
+
+        self.assertEqual(RecepcionPago.objects.filter(fecha__month=3).count(), 2)
+        self.assertEqual(RecepcionPago.objects.get(pk=self.recepcion.pk).valor, Decimal('100.00'))
+        self.assertIsNone(Devolucion.objects.get(pk=self.devolucion.pk).deleted_at)
+
+    def test_restore_bloqueado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.devolucion.soft_delete()
+        self.cerrar()
+
+        self.devolucion.refresh_from_db()
+        with self.assertRaises(PeriodoCerrado):
+            self.devolucion.restore()
+        response = self.client.post(f'/api/devoluciones/{self.devolucion.pk}/restore/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_endpoints_de_movimientos_responden_400(self):
+        self.cerrar()
+        response = self.client.post('/api/devoluciones/create/', {
+            'cliente': self.cliente.id, 'tarjeta': self.tarjeta.id, 'valor': '3', 'fecha': '2025-03-15T10:00:00Z',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.delete(f'/api/devoluciones/{self.devolucion.pk}/delete/').status_code, 400)
+        with transaction.atomic():
+            response = self.client.delete(f'/api/devoluciones/{self.devolucion.pk}/hard-delete/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_borrado_en_cascada_de_cliente_y_tarjeta_responde_400(self):
+        self.cerrar()
+
+        # Ver test_movimientos_del_mes_cerrado_quedan_bloqueados sobre el atomic()
+        with transaction.atomic():
+            response = self.client.delete(f'/api/clientes/{self.cliente.pk}/hard-delete/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('2025-03', response.data['error'])
+        self.assertTrue(Cliente.objects.filter(pk=self.cliente.pk).exists())
+
+        with transaction.atomic():
+            response = self.client.delete(f'/api/tarjetas/{self.tarjeta.pk}/hard-delete/')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Tarjeta.objects.filter(pk=self.tarjeta.pk).exists())
+        self.assertEqual(RecepcionPago.objects.count(), 3)
+
+    def test_la_validacion_no_depende_del_cache(self):
+        with override_settings(REFERENCE_CACHE_LOCAL_TTL=3600):
+            self.assertEqual(meses_cerrados.get(), [])
+            # Cierre registrado sin invalidar el cache (p. ej. en otro worker, aún sin commit visible al cache)
+            CierrePeriodo.objects.create(mes=date(2025, 3, 1))
+            self.assertEqual(meses_cerrados.get(), [])
+            with self.assertRaises(PeriodoCerrado):
+                self.crear(RecepcionPago, Decimal('1.00'), date(2025, 3, 15))
+
+    def test_reabrir_permite_cambios(self):
+        self.cerrar()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(reabrir_mes(date(2025, 3, 1)))
+        self.assertFalse(ResumenMensual.objects.exists())
+        self.assertFalse(reabrir_mes(date(2025, 3, 1)))
+
+        self.recepcion.valor = Decimal('1.00')
+        self.recepcion.save()
+
+    def test_resumen_mezcla_meses_congelados_y_vivos(self):
+        antes = resumen('month', date(2025, 3, 1), date(2025, 4, 30))
+        self.cerrar()
+
+        # Un cambio en el mes congelado hecho por fuera de las señales no se ve: se lee ResumenMensual
+        RecepcionPago.objects.filter(pk=self.recepcion.pk).update(total=Decimal('999.00'))
+        self.crear(RecepcionPago, Decimal('5.00'), date(2025, 4, 20))
+
+        datos = resumen('month', date(2025, 3, 1), date(2025, 4, 30))
+        self.assertEqual(datos['periodos'][date(2025, 3, 1)], antes['periodos'][date(2025, 3, 1)])
+        self.assertEqual(datos['periodos'][date(2025, 4, 1)]['ingresos']['total'], Decimal('35.00'))
+        self.assertEqual(datos['totales']['ingresos']['total'], Decimal('185.00'))
+
+    def test_endpoints_de_cierre(self):
+        response = self.client.post('/api/reportes/cierres/cerrar/', {'mes': '2025-03'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.post('/api/reportes/cierres/cerrar/', {'mes': '2025-03'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/reportes/cierres/cerrar/', {'mes': 'marzo'}, format='json').status_code, 400)
+        self.assertEqual([c['mes'] for c in self.client.get('/api/reportes/cierres/').data], ['2025-03'])
+
+        self.assertEqual(self.client.post('/api/reportes/cierres/2025-03/reabrir/').status_code, 200)
+        self.assertEqual(self.client.post('/api/reportes/cierres/2025-03/reabrir/').status_code, 404)
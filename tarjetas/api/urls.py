@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('list/',                   views.list_tarjetas,       name='list_tarjetas'),
+    path('activas/',                views.list_tarjetas_activas, name='list_tarjetas_activas'),
     path('create/',                 views.create_tarjeta,      name='create_tarjeta'),
     path('<int:pk>/',               views.get_tarjeta,         name='get_tarjeta'),
     path('<int:pk>/update/',        views.update_tarjeta,      name='update_tarjeta'),
@@ -10,4 +11,6 @@ urlpatterns = [
     path('<int:pk>/restore/',       views.restore_tarjeta,     name='restore_tarjeta'),
     path('<int:pk>/hard-delete/',   views.hard_delete_tarjeta, name='hard_delete_tarjeta'),
     path('<int:pk>/history/',       views.tarjeta_history,     name='tarjeta_history'),
+    path('<int:pk>/saldo/',         views.saldo_tarjeta,       name='saldo_tarjeta'),
+    path('<int:pk>/movimientos-diarios/', views.list_movimientos_diarios, name='list_movimientos_diarios'),
 ]
@@ -5,11 +5,15 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from django.db import DatabaseError
-from django.db.models import Q
 from django.utils import timezone
 from datetime import datetime
 
-from ..models import Tarjeta
+from ..models import Tarjeta, TarjetaMovimientoDiario, CUATRO_POR_MIL_CHOICES
+from ..saldos import calcular_saldo_tarjeta
+from backend.history_diff import diff_historial
+from ..cache import tarjetas_activas
+from backend.listing import ListSpec, listar, campos, display, usuario_anidado
+from reportes.cierres import PeriodoCerrado
 from .permissions import RolePermission
 
 
@@ -75,74 +79,41 @@ def create_tarjeta(request):
         )
 
 
+LISTADO_TARJETAS = ListSpec(
+    queryset=Tarjeta.objects.select_related('usuario'),
+    serializer=serialize_tarjeta,
+    search_fields=('numero', 'titular', 'descripcion'),
+    filters={'cuatro_por_mil': 'cuatro_por_mil'},
+    fields=campos(
+        'id', 'numero', 'titular', 'descripcion', 'cuatro_por_mil', 'created_at', 'updated_at', 'deleted_at',
+        usuario=usuario_anidado('usuario'),
+        cuatro_por_mil_display=display('cuatro_por_mil', CUATRO_POR_MIL_CHOICES),
+    ),
+)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_tarjetas(request):
     """Listar tarjetas con filtros y paginación"""
     try:
-        tarjetas = Tarjeta.objects.select_related('usuario').all()
-
-        # Filtro de búsqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            tarjetas = tarjetas.filter(
-                Q(numero__icontains=search_query) |
-                Q(titular__icontains=search_query) |
-                Q(descripcion__icontains=search_query)
-            )
-
-        # Filtro por cuatro por mil
-        cuatro_por_mil = request.query_params.get('cuatro_por_mil', None)
-        if cuatro_por_mil:
-            tarjetas = tarjetas.filter(cuatro_por_mil=cuatro_por_mil)
-
-        # Filtro por fecha de creación
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                tarjetas = tarjetas.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                tarjetas = tarjetas.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            tarjetas = tarjetas.filter(deleted_at__isnull=True)
-
-        # Ordenar
-        tarjetas = tarjetas.order_by('-created_at')
-
-        # Paginación
-        page_size_param = request.query_params.get('page_size', 10)
-        try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
-
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_tarjetas = paginator.paginate_queryset(tarjetas, request)
+        return listar(request, LISTADO_TARJETAS)
+    except Exception as e:
+        return Response(
+            {"error": f"Error al obtener tarjetas: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
 
-        data = [serialize_tarjeta(t) for t in paginated_tarjetas]
-        return paginator.get_paginated_response(data)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_tarjetas_activas(request):
+    """
+    Todas las tarjetas activas, sin paginar, ordenadas por número (selectores).
+    Se sirven desde el cache de referencia (tarjetas/cache.py).
+    """
+    try:
+        return Response(tarjetas_activas.get(), status=status.HTTP_200_OK)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener tarjetas: {str(e)}"},
@@ -255,6 +226,9 @@ def hard_delete_tarjeta(request, pk):
             {"message": "Tarjeta eliminada permanentemente"},
             status=status.HTTP_204_NO_CONTENT
         )
+    except PeriodoCerrado as e:
+        # Sus movimientos se borran en cascada
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar tarjeta: {str(e)}"},
@@ -268,7 +242,7 @@ def tarjeta_history(request, pk):
     """Obtener el historial de cambios de una tarjeta"""
     try:
         tarjeta = get_object_or_404(Tarjeta.objects, pk=pk)
-        history = tarjeta.history.all()
+        history = tarjeta.history.select_related('history_user')
 
         # Paginación
         page_size_param = request.query_params.get('page_size', 10)
@@ -281,6 +255,10 @@ def tarjeta_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
@@ -305,3 +283,116 @@ def tarjeta_history(request, pk):
             {"error": f"Error al obtener historial: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+# ==================== SALDO Y MOVIMIENTOS DIARIOS ====================
+
+def serialize_movimiento_diario(resumen):
+    """Convierte un objeto TarjetaMovimientoDiario a diccionario"""
+    return {
+        'fecha': resumen.fecha,
+        'total_recepciones': str(resumen.total_recepciones),
+        'total_utilidades': str(resumen.total_utilidades),
+        'total_devoluciones': str(resumen.total_devoluciones),
+        'total_cargos': str(resumen.total_cargos),
+        'total_gastos': str(resumen.total_gastos),
+        'neto': str(resumen.neto),
+        'cantidad': resumen.cantidad,
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'contador'])])
+def saldo_tarjeta(request, pk):
+    """
+    Obtener el saldo de una tarjeta al cierre de un día.
+
+    Query params: fecha (YYYY-MM-DD, por defecto hoy)
+    """
+    try:
+        tarjeta = get_object_or_404(Tarjeta.objects, pk=pk)
+
+        fecha_str = request.query_params.get('fecha', None)
+        if fecha_str:
+            try:
+                fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+            except ValueError:
+                return Response(
+                    {"error": "El formato de fecha debe ser YYYY-MM-DD."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            fecha = timezone.localdate()
+
+        resultado = calcular_saldo_tarjeta(tarjeta.id, fecha)
+        return Response({
+            'tarjeta_id': tarjeta.id,
+            'fecha': fecha,
+            'saldo_anterior': str(resultado['saldo_anterior']),
+            'movimientos_dia': serialize_movimiento_diario(resultado['dia']),
+            'saldo': str(resultado['saldo']),
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response(
+            {"error": f"Error al obtener saldo de la tarjeta: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, RolePermission(['admin', 'SuperAdmin', 'contador'])])
+def list_movimientos_diarios(request, pk):
+    """
+    Listar el resumen diario de movimientos de una tarjeta.
+
+    Query params: fecha_start, fecha_end (YYYY-MM-DD), page, page_size
+    """
+    try:
+        tarjeta = get_object_or_404(Tarjeta.objects, pk=pk)
+        resumenes = TarjetaMovimientoDiario.objects.filter(tarjeta=tarjeta)
+
+        fecha_start = request.query_params.get('fecha_start', None)
+        fecha_end = request.query_params.get('fecha_end', None)
+
+        if fecha_start:
+            try:
+                start_date = datetime.strptime(fecha_start, '%Y-%m-%d').date()
+                resumenes = resumenes.filter(fecha__gte=start_date)
+            except ValueError:
+                return Response(
+                    {"error": "El formato de fecha_start debe ser YYYY-MM-DD."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        if fecha_end:
+            try:
+                end_date = datetime.strptime(fecha_end, '%Y-%m-%d').date()
+                resumenes = resumenes.filter(fecha__lte=end_date)
+            except ValueError:
+                return Response(
+                    {"error": "El formato de fecha_end debe ser YYYY-MM-DD."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        resumenes = resumenes.order_by('-fecha')
+
+        # Paginación
+        page_size_param = request.query_params.get('page_size', 10)
+        try:
+            page_size_int = int(page_size_param)
+        except (ValueError, TypeError):
+            page_size_int = 10
+
+        paginator = PageNumberPagination()
+        paginator.page_size = page_size_int
+        paginated_resumenes = paginator.paginate_queryset(resumenes, request)
+
+        data = [serialize_movimiento_diario(r) for r in paginated_resumenes]
+        return paginator.get_paginated_response(data)
+
+    except Exception as e:
+        return Response(
+            {"error": f"Error al obtener movimientos diarios: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TarjetasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tarjetas'
+
+    def ready(self):
+        from .signals import connect_movimiento_signals
+        from .cache import connect_cache_signals
+        connect_movimiento_signals()
+        connect_cache_signals()
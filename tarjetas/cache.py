@@ -0,0 +1,16 @@
+from backend.reference_cache import ReferenceCache
+
+from .models import Tarjeta
+
+
+def cargar_tarjetas_activas():
+    from .api.views import serialize_tarjeta
+    tarjetas = Tarjeta.objects.select_related('usuario').filter(deleted_at__isnull=True).order_by('numero', 'id')
+    return [serialize_tarjeta(t) for t in tarjetas]
+
+
+tarjetas_activas = ReferenceCache('tarjetas_activas', cargar_tarjetas_activas)
+
+
+def connect_cache_signals():
+    tarjetas_activas.connect(Tarjeta)
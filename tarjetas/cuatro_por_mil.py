@@ -0,0 +1,113 @@
+"""
+Gravamen a los movimientos financieros (4x1000) de los movimientos con tarjeta.
+
+Un movimiento paga el gravamen si su tarjeta lo tiene activo
+(Tarjeta.cuatro_por_mil == '1'; '0' = exenta):
+
+    cuatro_por_mil = redondear(valor * tasa vigente en la fecha del movimiento)
+    total          = valor + cuatro_por_mil
+
+La tasa sale de settings.CUATRO_POR_MIL_TARIFAS, una lista de
+(vigente_desde 'YYYY-MM-DD', tasa) ordenable por fecha: rige la última cuyo
+vigente_desde sea menor o igual al día del movimiento. El redondeo es a
+CUATRO_POR_MIL_DECIMALES decimales con CUATRO_POR_MIL_REDONDEO (por defecto
+ROUND_HALF_EVEN, el mismo que aplicaba la base de datos al guardar el valor
+sin redondear que se calculaba antes).
+
+calcular_lote() resuelve la tasa de cada día una sola vez, para calcular
+miles de movimientos sin repetir la búsqueda por fila.
+"""
+import decimal
+from bisect import bisect_right
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+ACTIVO = '1'
+
+
+def tarifas():
+    """[(vigente_desde, tasa)] ordenada por fecha"""
+    configuradas = getattr(settings, 'CUATRO_POR_MIL_TARIFAS', [('2000-01-01', '0.004')])
+    return sorted((parse_date(str(desde)), Decimal(str(tasa))) for desde, tasa in configuradas)
+
+
+def cuantizador():
+    return Decimal(1).scaleb(-getattr(settings, 'CUATRO_POR_MIL_DECIMALES', 2))
+
+
+def redondeo():
+    return getattr(decimal, getattr(settings, 'CUATRO_POR_MIL_REDONDEO', 'ROUND_HALF_EVEN'))
+
+
+def dia(fecha):
+    """Día del movimiento; fecha puede ser date, datetime, str (request.data) o None (hoy)"""
+    if fecha is None or fecha == '':
+        return timezone.localdate()
+    if isinstance(fecha, str):
+        fecha = parse_datetime(fecha) or parse_date(fecha)
+        if fecha is None:
+            raise ValueError("La fecha del movimiento no es válida.")
+    if isinstance(fecha, datetime):
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        return timezone.localdate(fecha)
+    if isinstance(fecha, date):
+        return fecha
+    raise ValueError("La fecha del movimiento no es válida.")
+
+
+class TablaTarifas:
+    """Tarifas leídas una vez; la tasa de cada día se resuelve con búsqueda binaria y se memoriza"""
+
+    def __init__(self):
+        tabla = tarifas()
+        self.desde = [desde for desde, _ in tabla]
+        self.tasas = [tasa for _, tasa in tabla]
+        self.por_dia = {}
+        self.cuantizador = cuantizador()
+        self.redondeo = redondeo()
+
+    def tasa(self, fecha):
+        dia_movimiento = dia(fecha)
+        tasa = self.por_dia.get(dia_movimiento)
+        if tasa is None:
+            i = bisect_right(self.desde, dia_movimiento)
+            tasa = self.tasas[i - 1] if i else Decimal('0')
+            self.por_dia[dia_movimiento] = tasa
+        return tasa
+
+    def calcular(self, valor, activo, fecha=None):
+        """(cuatro_por_mil, total) de un movimiento"""
+        valor = Decimal(str(valor))
+        if not activo:
+            return Decimal('0').quantize(self.cuantizador), valor
+        impuesto = (valor * self.tasa(fecha)).quantize(self.cuantizador, rounding=self.redondeo)
+        return impuesto, valor + impuesto
+
+
+def aplica(tarjeta):
+    """True si la tarjeta (instancia o valor del campo cuatro_por_mil) paga el gravamen"""
+    return getattr(tarjeta, 'cuatro_por_mil', tarjeta) == ACTIVO
+
+
+def tasa_vigente(fecha=None):
+    return TablaTarifas().tasa(fecha)
+
+
+def calcular_cuatro_por_mil(valor, tarjeta, fecha=None):
+    """Gravamen de un movimiento de `valor` con `tarjeta` en `fecha` (hoy si no se indica)"""
+    return TablaTarifas().calcular(valor, aplica(tarjeta), fecha)[0]
+
+
+def calcular_lote(movimientos):
+    """
+    Gravamen y total de muchos movimientos a la vez. movimientos: iterable de
+    (valor, tarjeta o flag cuatro_por_mil, fecha). Devuelve [(cuatro_por_mil, total)]
+    en el mismo orden.
+    """
+    tabla = TablaTarifas()
+    return [tabla.calcular(valor, aplica(tarjeta), fecha) for valor, tarjeta, fecha in movimientos]
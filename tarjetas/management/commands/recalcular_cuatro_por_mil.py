@@ -0,0 +1,107 @@
+from collections import defaultdict
+from datetime import datetime
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from simple_history.utils import bulk_update_with_history
+
+from reportes.cache import meses_cerrados
+from reportes.cierres import mes_de
+from reportes.resumen import invalidar_resumen
+from tarjetas.cuatro_por_mil import TablaTarifas, aplica
+from tarjetas.models import Tarjeta
+from tarjetas.saldos import CERO, MOVIMIENTOS_TARJETA, aplicar_delta, dia_movimiento
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula cuatro_por_mil y total de los movimientos con tarjeta según el estado actual '
+        'de la tarjeta y la tabla de tarifas (p. ej. después de cambiar su exención)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tarjeta', type=int, action='append', help='Limitar a una o más tarjetas (repetible)')
+        parser.add_argument('--desde', help='Solo movimientos con fecha desde este día (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Movimientos por lote')
+        parser.add_argument('--check', action='store_true', help='Solo reporta diferencias, no escribe')
+
+    def handle(self, *args, **options):
+        tarjetas = Tarjeta.objects.all()
+        if options['tarjeta']:
+            tarjetas = tarjetas.filter(id__in=options['tarjeta'])
+        activas = {tarjeta_id: aplica(flag) for tarjeta_id, flag in tarjetas.values_list('id', 'cuatro_por_mil')}
+
+        desde = None
+        if options['desde']:
+            try:
+                desde = timezone.make_aware(datetime.strptime(options['desde'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('El formato de --desde debe ser YYYY-MM-DD')
+
+        tarifas = TablaTarifas()
+        # Los meses cerrados tienen sus totales congelados: sus movimientos no se tocan
+        cerrados = set(meses_cerrados.get())
+        revisados = diferencias = omitidos = 0
+        for label in MOVIMIENTOS_TARJETA:
+            model = apps.get_model(label)
+            movimientos = model._default_manager.filter(tarjeta_id__in=list(activas)).order_by('pk')
+            if desde is not None:
+                movimientos = movimientos.filter(fecha__gte=desde)
+
+            # Recorrido por pk (keyset): cada lote es una consulta acotada por índice
+            ultimo_pk = 0
+            actualizados = 0
+            while True:
+                lote = list(movimientos.filter(pk__gt=ultimo_pk)[:options['chunk_size']])
+                if not lote:
+                    break
+                ultimo_pk = lote[-1].pk
+                revisados += len(lote)
+
+                calculados = [tarifas.calcular(m.valor, activas[m.tarjeta_id], m.fecha) for m in lote]
+                modificados = []
+                deltas = defaultdict(lambda: CERO)
+                ahora = timezone.now()
+                for movimiento, (cuatro_por_mil, total) in zip(lote, calculados):
+                    if movimiento.cuatro_por_mil == cuatro_por_mil and movimiento.total == total:
+                        continue
+                    if cerrados and mes_de(model, movimiento.fecha) in cerrados:
+                        omitidos += 1
+                        continue
+                    if movimiento.deleted_at is None:
+                        dia = dia_movimiento(model, movimiento.fecha)
+                        deltas[(movimiento.tarjeta_id, dia)] += total - movimiento.total
+                    movimiento.cuatro_por_mil = cuatro_por_mil
+                    movimiento.total = total
+                    movimiento.updated_at = ahora
+                    modificados.append(movimiento)
+
+                diferencias += len(modificados)
+                if options['check'] or not modificados:
+                    continue
+
+                campo, signo = MOVIMIENTOS_TARJETA[label]
+                with transaction.atomic():
+                    bulk_update_with_history(
+                        modificados, model, ['cuatro_por_mil', 'total', 'updated_at'],
+                        batch_size=options['chunk_size'], default_change_reason='Recálculo 4x1000',
+                    )
+                    # bulk_update no envía señales: el resumen diario se ajusta con la diferencia del lote
+                    for (tarjeta_id, dia), delta in deltas.items():
+                        aplicar_delta(tarjeta_id, dia, campo, signo, delta, 0)
+                actualizados += len(modificados)
+
+            if actualizados:
+                invalidar_resumen(model)
+
+        resumen = f'{revisados} movimientos revisados, {diferencias} con diferencias'
+        if omitidos:
+            resumen += f' ({omitidos} en meses cerrados sin modificar)'
+        if options['check']:
+            if diferencias:
+                raise CommandError(resumen, returncode=1)
+            self.stdout.write(resumen)
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{resumen}, movimientos actualizados'))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tarjetas.models import Tarjeta, TarjetaMovimientoDiario
+from tarjetas.saldos import CAMPOS_TOTALES, construir_resumen, movimientos_por_dia
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero el resumen diario de movimientos por tarjeta y reporta las diferencias encontradas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Solo reporta diferencias, no escribe')
+        parser.add_argument('--tarjeta', type=int, action='append', help='Limitar a una o más tarjetas (repetible)')
+
+    def handle(self, *args, **options):
+        campos = CAMPOS_TOTALES + ['neto', 'cantidad']
+        tarjeta_ids = options['tarjeta'] or list(Tarjeta.objects.order_by('id').values_list('id', flat=True))
+
+        revisados = diferencias = 0
+        # Una tarjeta por vez: mantiene acotada la memoria y las transacciones cortas
+        for tarjeta_id in tarjeta_ids:
+            esperados = movimientos_por_dia([tarjeta_id])
+            actuales = {r.fecha: r for r in TarjetaMovimientoDiario.objects.filter(tarjeta_id=tarjeta_id)}
+
+            nuevos, modificados, sobrantes = [], [], []
+            for (_, fecha), totales in esperados.items():
+                esperado = construir_resumen(tarjeta_id, fecha, totales)
+                actual = actuales.pop(fecha, None)
+                revisados += 1
+
+                if actual is None:
+                    diferencias += 1
+                    self.stdout.write(self.style.WARNING(f'Tarjeta {tarjeta_id} {fecha}: falta el resumen (neto {esperado.neto})'))
+                    nuevos.append(esperado)
+                    continue
+
+                campos_distintos = [c for c in campos if getattr(actual, c) != getattr(esperado, c)]
+                if not campos_distintos:
+                    continue
+
+                diferencias += 1
+                detalle = ', '.join(f'{c}: {getattr(actual, c)} -> {getattr(esperado, c)}' for c in campos_distintos)
+                self.stdout.write(self.style.WARNING(f'Tarjeta {tarjeta_id} {fecha}: {detalle}'))
+                for c in campos:
+                    setattr(actual, c, getattr(esperado, c))
+                modificados.append(actual)
+
+            # Resúmenes de días que ya no tienen movimientos
+            for fecha, actual in actuales.items():
+                if actual.cantidad or actual.neto:
+                    diferencias += 1
+                    self.stdout.write(self.style.WARNING(f'Tarjeta {tarjeta_id} {fecha}: resumen sin movimientos (neto {actual.neto})'))
+                sobrantes.append(actual.id)
+
+            if options['check']:
+                continue
+
+            with transaction.atomic():
+                TarjetaMovimientoDiario.objects.bulk_create(nuevos)
+                TarjetaMovimientoDiario.objects.bulk_update(modificados, campos)
+                TarjetaMovimientoDiario.objects.filter(id__in=sobrantes).delete()
+
+        resumen = f'{revisados} días revisados, {diferencias} con diferencias'
+        if options['check']:
+            if diferencias:
+                raise CommandError(resumen, returncode=1)
+            self.stdout.write(resumen)
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{resumen}, resúmenes reconstruidos'))
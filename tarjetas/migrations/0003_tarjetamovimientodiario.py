@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-17 03:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tarjetas', '0002_historicaltarjeta_usuario_tarjeta_usuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarjetaMovimientoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('total_recepciones', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_utilidades', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_devoluciones', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_cargos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_gastos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('neto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tarjeta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_diarios', to='tarjetas.tarjeta')),
+            ],
+            options={
+                'verbose_name': 'Movimiento Diario Tarjeta',
+                'verbose_name_plural': 'Movimientos Diarios Tarjetas',
+                'db_table': 'tarjetas_movimientos_diarios',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tarjetamovimientodiario',
+            constraint=models.UniqueConstraint(fields=('tarjeta', 'fecha'), name='tarjeta_movimiento_diario_unico'),
+        ),
+    ]
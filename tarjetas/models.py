@@ -38,4 +38,42 @@ class Tarjeta(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.titular} - {self.numero[-4:]}"
\ No newline at end of file
+        return f"{self.titular} - {self.numero[-4:]}"
+
+class TarjetaMovimientoDiario(models.Model):
+    """
+    Resumen diario de movimientos por tarjeta (sobre el campo `total`, que
+    incluye el 4x1000), actualizado de forma incremental por las señales de
+    tarjetas.signals. Se puede reconstruir con
+    `python manage.py recalcular_movimientos_tarjetas`.
+
+    neto = recepciones + utilidades - devoluciones - cargos - gastos
+    """
+    tarjeta = models.ForeignKey(
+        Tarjeta,
+        on_delete=models.CASCADE,
+        related_name='movimientos_diarios'
+    )
+    fecha = models.DateField()
+
+    total_recepciones  = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_utilidades   = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_devoluciones = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_cargos       = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_gastos       = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    neto               = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad           = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'tarjetas_movimientos_diarios'
+        ordering = ['-fecha']
+        verbose_name = 'Movimiento Diario Tarjeta'
+        verbose_name_plural = 'Movimientos Diarios Tarjetas'
+        constraints = [
+            models.UniqueConstraint(fields=['tarjeta', 'fecha'], name='tarjeta_movimiento_diario_unico'),
+        ]
+
+    def __str__(self):
+        return f'Tarjeta {self.tarjeta_id} - {self.fecha}: {self.neto}'
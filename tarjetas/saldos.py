@@ -0,0 +1,170 @@
+"""
+Resumen diario de movimientos y saldo por tarjeta.
+
+Cada movimiento aporta su `total` (valor + 4x1000) al día de su `fecha`:
+
+    RecepcionPago      +total -> total_recepciones
+    UtilidadOcasional  +total -> total_utilidades
+    Devolucion         -total -> total_devoluciones
+    CargoNoRegistrado  -total -> total_cargos
+    GastoRelacion      -total -> total_gastos
+
+Los movimientos eliminados (soft delete) no aportan.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import TarjetaMovimientoDiario
+
+
+# modelo -> (campo en TarjetaMovimientoDiario, signo en el neto)
+MOVIMIENTOS_TARJETA = {
+    'recepcion_pago.RecepcionPago':            ('total_recepciones', 1),
+    'utilidad_ocasional.UtilidadOcasional':    ('total_utilidades', 1),
+    'devoluciones.Devolucion':                 ('total_devoluciones', -1),
+    'cargos_no_registrados.CargoNoRegistrado': ('total_cargos', -1),
+    'gastos.GastoRelacion':                    ('total_gastos', -1),
+}
+
+CAMPOS_TOTALES = [campo for campo, _ in MOVIMIENTOS_TARJETA.values()]
+
+CERO = Decimal('0.00')
+
+
+def dia_movimiento(model, fecha):
+    """Día (zona horaria actual) de un movimiento; `fecha` puede venir como str desde request.data"""
+    fecha = model._meta.get_field('fecha').to_python(fecha)
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return timezone.localdate(fecha)
+
+
+def valores_instancia(instance):
+    return {
+        'tarjeta_id': instance.tarjeta_id,
+        'deleted_at': instance.deleted_at,
+        'fecha': instance.fecha,
+        'total': instance.total,
+    }
+
+
+def valores_guardados(model, pk):
+    """Valores actualmente guardados en la base de datos para el movimiento"""
+    return model._default_manager.filter(pk=pk).values('tarjeta_id', 'deleted_at', 'fecha', 'total').first()
+
+
+def aporte(model, valores):
+    """((tarjeta_id, dia), total) con el que un movimiento aporta al resumen, o None si no aporta"""
+    if valores is None or valores['deleted_at'] is not None or not valores['tarjeta_id']:
+        return None
+    dia = dia_movimiento(model, valores['fecha'])
+    return (valores['tarjeta_id'], dia), Decimal(str(valores['total'] or 0))
+
+
+def aplicar_delta(tarjeta_id, fecha, campo, signo, delta, cantidad, crear=True):
+    """Suma `delta` al resumen del día con un UPDATE atómico, creando la fila si no existe"""
+    cambios = {
+        campo: F(campo) + delta,
+        'neto': F('neto') + signo * delta,
+        'cantidad': F('cantidad') + cantidad,
+    }
+    resumen = TarjetaMovimientoDiario.objects.filter(tarjeta_id=tarjeta_id, fecha=fecha)
+    if resumen.update(**cambios) or not crear:
+        return
+    try:
+        with transaction.atomic():
+            TarjetaMovimientoDiario.objects.create(
+                tarjeta_id=tarjeta_id, fecha=fecha,
+                **{campo: delta, 'neto': signo * delta, 'cantidad': cantidad}
+            )
+    except IntegrityError:
+        # Otra petición creó la fila del día entre el UPDATE y el INSERT
+        resumen.update(**cambios)
+
+
+def registrar_cambio(model, anterior, nuevo, crear=True):
+    """Aplica al resumen diario la diferencia entre el estado anterior y el nuevo de un movimiento"""
+    campo, signo = MOVIMIENTOS_TARJETA[model._meta.label]
+    aporte_anterior = aporte(model, anterior)
+    aporte_nuevo = aporte(model, nuevo)
+    if aporte_anterior == aporte_nuevo:
+        return
+
+    deltas = {}
+    if aporte_anterior:
+        delta, cantidad = deltas.get(aporte_anterior[0], (CERO, 0))
+        deltas[aporte_anterior[0]] = (delta - aporte_anterior[1], cantidad - 1)
+    if aporte_nuevo:
+        delta, cantidad = deltas.get(aporte_nuevo[0], (CERO, 0))
+        deltas[aporte_nuevo[0]] = (delta + aporte_nuevo[1], cantidad + 1)
+
+    for (tarjeta_id, fecha), (delta, cantidad) in deltas.items():
+        if delta or cantidad:
+            aplicar_delta(tarjeta_id, fecha, campo, signo, delta, cantidad, crear=crear)
+
+
+def movimientos_por_dia(tarjeta_ids=None, fecha_start=None, fecha_end=None):
+    """
+    Calcula desde las tablas de movimientos los totales por (tarjeta, día)
+    con un GROUP BY por tabla. Devuelve {(tarjeta_id, fecha): {campo: total, 'cantidad': n}}.
+    """
+    resultado = {}
+    for label, (campo, signo) in MOVIMIENTOS_TARJETA.items():
+        model = apps.get_model(label)
+        movimientos = model._default_manager.filter(deleted_at__isnull=True)
+        if tarjeta_ids is not None:
+            movimientos = movimientos.filter(tarjeta_id__in=tarjeta_ids)
+        if fecha_start is not None:
+            movimientos = movimientos.filter(fecha__gte=fecha_start)
+        if fecha_end is not None:
+            movimientos = movimientos.filter(fecha__lt=fecha_end)
+
+        filas = movimientos.order_by().annotate(dia=TruncDate('fecha')).values('tarjeta_id', 'dia').annotate(
+            total_dia=Sum('total'), cantidad=Count('id')
+        )
+        for fila in filas:
+            resumen = resultado.setdefault((fila['tarjeta_id'], fila['dia']), {'cantidad': 0})
+            resumen[campo] = resumen.get(campo, CERO) + (fila['total_dia'] or CERO).quantize(CERO)
+            resumen['cantidad'] += fila['cantidad']
+    return resultado
+
+
+def construir_resumen(tarjeta_id, fecha, totales):
+    """Arma un TarjetaMovimientoDiario (sin guardar) a partir de los totales calculados"""
+    resumen = TarjetaMovimientoDiario(tarjeta_id=tarjeta_id, fecha=fecha, cantidad=totales.get('cantidad', 0))
+    neto = CERO
+    for campo, signo in MOVIMIENTOS_TARJETA.values():
+        total = totales.get(campo, CERO)
+        setattr(resumen, campo, total)
+        neto += signo * total
+    resumen.neto = neto
+    return resumen
+
+
+def calcular_saldo_tarjeta(tarjeta_id, fecha):
+    """
+    Saldo de la tarjeta al cierre de `fecha`: suma de los resúmenes de los
+    días anteriores más el día consultado calculado en vivo desde las tablas
+    de movimientos (día abierto).
+    """
+    anteriores = TarjetaMovimientoDiario.objects.filter(tarjeta_id=tarjeta_id, fecha__lt=fecha).aggregate(
+        neto=Sum('neto'), cantidad=Sum('cantidad')
+    )
+
+    inicio = timezone.make_aware(datetime.combine(fecha, datetime.min.time()))
+    fin = inicio + timedelta(days=1)
+    dia = movimientos_por_dia([tarjeta_id], inicio, fin).get((tarjeta_id, fecha), {})
+    resumen_dia = construir_resumen(tarjeta_id, fecha, dia)
+
+    saldo_anterior = (anteriores['neto'] or CERO).quantize(CERO)
+    return {
+        'saldo_anterior': saldo_anterior,
+        'dia': resumen_dia,
+        'saldo': saldo_anterior + resumen_dia.neto,
+    }
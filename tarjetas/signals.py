@@ -0,0 +1,35 @@
+from django.apps import apps
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from .saldos import MOVIMIENTOS_TARJETA, registrar_cambio, valores_guardados, valores_instancia
+
+
+def movimiento_pre_save(sender, instance, raw=False, **kwargs):
+    """Guarda el estado previo del movimiento para calcular la diferencia en post_save"""
+    if raw:
+        return
+    if instance._state.adding or instance.pk is None:
+        instance._movimiento_anterior = None
+    else:
+        instance._movimiento_anterior = valores_guardados(sender, instance.pk)
+
+
+def movimiento_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_movimiento_anterior', None)
+    registrar_cambio(sender, anterior, valores_instancia(instance))
+    instance._movimiento_anterior = None
+
+
+def movimiento_post_delete(sender, instance, **kwargs):
+    # crear=False: en un borrado en cascada de la tarjeta sus resúmenes ya no existen
+    registrar_cambio(sender, valores_instancia(instance), None, crear=False)
+
+
+def connect_movimiento_signals():
+    for label in MOVIMIENTOS_TARJETA:
+        model = apps.get_model(label)
+        pre_save.connect(movimiento_pre_save, sender=model, dispatch_uid=f'movimiento_pre_save_{label}')
+        post_save.connect(movimiento_post_save, sender=model, dispatch_uid=f'movimiento_post_save_{label}')
+        post_delete.connect(movimiento_post_delete, sender=model, dispatch_uid=f'movimiento_post_delete_{label}')
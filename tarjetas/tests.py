@@ -1,3 +1,324 @@
-from django.test import TestCase
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from cargos_no_registrados.models import CargoNoRegistrado
+from clientes.models import Cliente, ClienteSaldo
+from devoluciones.models import Devolucion
+from gastos.models import Gasto, GastoRelacion
+from recepcion_pago.models import RecepcionPago
+from reportes.cierres import cerrar_mes
+from users.models import User
+from utilidad_ocasional.models import UtilidadOcasional
+from . import cuatro_por_mil
+from .cuatro_por_mil import TablaTarifas, aplica, calcular_lote
+from .models import Tarjeta, TarjetaMovimientoDiario
+from .saldos import MOVIMIENTOS_TARJETA, calcular_saldo_tarjeta
+
+DIA_1 = date(2024, 1, 10)
+DIA_2 = date(2024, 1, 11)
+
+
+def a_las_doce(dia):
+    return timezone.make_aware(datetime.combine(dia, datetime.min.time()).replace(hour=12))
+
+
+class TarjetaMovimientoDiarioTest(TestCase):
+    """El resumen diario por tarjeta sigue a cada movimiento de las cinco tablas que lo alimentan"""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='contador', email='contador@example.com')
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+        self.tarjeta = Tarjeta.objects.create(numero='1234', titular='Titular', descripcion='Tarjeta')
+        self.otra_tarjeta = Tarjeta.objects.create(numero='5678', titular='Titular', descripcion='Otra tarjeta')
+        self.gasto = Gasto.objects.create(nombre='Gasto', descripcion='Gasto')
+
+    def crear(self, model, total, dia=DIA_1, tarjeta=None):
+        campos = {
+            'usuario': self.usuario, 'tarjeta': tarjeta or self.tarjeta,
+            'valor': total, 'total': total, 'fecha': a_las_doce(dia),
+        }
+        if model is GastoRelacion:
+            campos['gasto'] = self.gasto
+        elif model is not UtilidadOcasional:
+            campos['cliente'] = self.cliente
+        return model.objects.create(**campos)
+
+    def resumen(self, dia=DIA_1, tarjeta=None):
+        return TarjetaMovimientoDiario.objects.filter(tarjeta=tarjeta or self.tarjeta, fecha=dia).first()
+
+    def assertResumen(self, model, total, cantidad, dia=DIA_1, tarjeta=None):
+        campo, signo = MOVIMIENTOS_TARJETA[model._meta.label]
+        resumen = self.resumen(dia, tarjeta)
+        self.assertEqual(getattr(resumen, campo), total)
+        self.assertEqual(resumen.neto, signo * total)
+        self.assertEqual(resumen.cantidad, cantidad)
+
+    def por_modelo(self, prueba):
+        """Ejecuta la prueba con cada una de las cinco tablas, partiendo de cero en cada una"""
+        for model in (RecepcionPago, UtilidadOcasional, Devolucion, CargoNoRegistrado, GastoRelacion):
+            with self.subTest(model=model.__name__):
+                prueba(model)
+            model.objects.all().delete()
+            TarjetaMovimientoDiario.objects.all().delete()
+
+    def test_crear_suma_al_dia(self):
+        def prueba(model):
+            self.crear(model, Decimal('100.00'))
+            self.crear(model, Decimal('50.00'))
+            self.crear(model, Decimal('7.00'), dia=DIA_2)
+            self.assertResumen(model, Decimal('150.00'), 2)
+            self.assertResumen(model, Decimal('7.00'), 1, dia=DIA_2)
+
+        self.por_modelo(prueba)
+
+    def test_cambiar_total_aplica_la_diferencia(self):
+        def prueba(model):
+            movimiento = self.crear(model, Decimal('100.00'))
+            movimiento.total = Decimal('80.00')
+            movimiento.save()
+            self.assertResumen(model, Decimal('80.00'), 1)
+
+        self.por_modelo(prueba)
+
+    def test_cambiar_fecha_mueve_el_movimiento_de_dia(self):
+        def prueba(model):
+            self.crear(model, Decimal('20.00'))
+            movimiento = self.crear(model, Decimal('100.00'))
+            movimiento.fecha = a_las_doce(DIA_2)
+            movimiento.save()
+            self.assertResumen(model, Decimal('20.00'), 1)
+            self.assertResumen(model, Decimal('100.00'), 1, dia=DIA_2)
+
+        self.por_modelo(prueba)
+
+    def test_cambiar_tarjeta_mueve_el_movimiento(self):
+        def prueba(model):
+            movimiento = self.crear(model, Decimal('100.00'))
+            movimiento.tarjeta = self.otra_tarjeta
+            movimiento.save()
+            self.assertResumen(model, Decimal('0.00'), 0)
+            self.assertResumen(model, Decimal('100.00'), 1, tarjeta=self.otra_tarjeta)
+
+        self.por_modelo(prueba)
+
+    def test_soft_delete_y_restore(self):
+        def prueba(model):
+            movimiento = self.crear(model, Decimal('100.00'))
+            self.crear(model, Decimal('20.00'))
+            movimiento.deleted_at = timezone.now()
+            movimiento.save()
+            self.assertResumen(model, Decimal('20.00'), 1)
+            movimiento.deleted_at = None
+            movimiento.save()
+            self.assertResumen(model, Decimal('120.00'), 2)
+
+        self.por_modelo(prueba)
+
+    def test_hard_delete_resta_del_dia(self):
+        def prueba(model):
+            movimiento = self.crear(model, Decimal('100.00'))
+            self.crear(model, Decimal('20.00'))
+            movimiento.delete()
+            self.assertResumen(model, Decimal('20.00'), 1)
+
+        self.por_modelo(prueba)
+
+    def test_error_en_el_delta_revierte_el_movimiento(self):
+        def prueba(model):
+            self.crear(model, Decimal('20.00'))
+            with mock.patch('tarjetas.signals.registrar_cambio', side_effect=DatabaseError('sin conexión')):
+                with self.assertRaises(DatabaseError):
+                    self.crear(model, Decimal('100.00'))
+            self.assertEqual(model.objects.count(), 1)
+            self.assertResumen(model, Decimal('20.00'), 1)
+
+        self.por_modelo(prueba)
+
+    def test_saldo_en_fecha_pasada_y_dia_abierto(self):
+        self.crear(RecepcionPago, Decimal('100.00'))
+        self.crear(GastoRelacion, Decimal('30.00'))
+        self.crear(RecepcionPago, Decimal('50.00'), dia=DIA_2)
+
+        # Al cierre de DIA_1 no cuenta nada de DIA_2
+        resultado = calcular_saldo_tarjeta(self.tarjeta.id, DIA_1)
+        self.assertEqual(resultado['saldo_anterior'], Decimal('0.00'))
+        self.assertEqual(resultado['saldo'], Decimal('70.00'))
+
+        # El día consultado se lee en vivo de las tablas de movimientos, no del resumen
+        TarjetaMovimientoDiario.objects.filter(tarjeta=self.tarjeta, fecha=DIA_2).update(neto=Decimal('999.00'))
+        resultado = calcular_saldo_tarjeta(self.tarjeta.id, DIA_2)
+        self.assertEqual(resultado['saldo_anterior'], Decimal('70.00'))
+        self.assertEqual(resultado['dia'].total_recepciones, Decimal('50.00'))
+        self.assertEqual(resultado['dia'].cantidad, 1)
+        self.assertEqual(resultado['saldo'], Decimal('120.00'))
+
+    def test_recalcular_movimientos_tarjetas_check(self):
+        self.crear(RecepcionPago, Decimal('100.00'))
+        call_command('recalcular_movimientos_tarjetas', '--check', stdout=StringIO())
+
+        TarjetaMovimientoDiario.objects.filter(tarjeta=self.tarjeta).update(neto=Decimal('1.00'))
+        with self.assertRaises(CommandError):
+            call_command('recalcular_movimientos_tarjetas', '--check', stdout=StringIO())
+
+        call_command('recalcular_movimientos_tarjetas', stdout=StringIO())
+        self.assertResumen(RecepcionPago, Decimal('100.00'), 1)
+
+
+@override_settings(CUATRO_POR_MIL_TARIFAS=[('2025-07-01', '0.005'), ('2025-01-01', '0.004')])
+class TablaTarifasTest(SimpleTestCase):
+    """Tasa vigente por fecha, redondeo al par y cálculo por lotes"""
+
+    def test_tasa_en_los_bordes_de_vigencia(self):
+        tabla = TablaTarifas()
+        casos = [
+            (date(2024, 12, 31), Decimal('0')),
+            (date(2025, 1, 1), Decimal('0.004')),
+            (date(2025, 6, 30), Decimal('0.004')),
+            (date(2025, 7, 1), Decimal('0.005')),
+            (timezone.make_aware(datetime(2025, 6, 30, 23, 59, 59)), Decimal('0.004')),
+            ('2025-07-01T00:00:00Z', Decimal('0.005')),
+            ('2025-07-01', Decimal('0.005')),
+        ]
+        for fecha, tasa in casos:
+            with self.subTest(fecha=fecha):
+                self.assertEqual(tabla.tasa(fecha), tasa)
+
+        with self.assertRaises(ValueError):
+            tabla.tasa('ayer')
+
+    def test_redondeo_al_par(self):
+        tabla = TablaTarifas()
+        fecha = date(2025, 3, 1)
+        # valor * 0.004 termina en 5 en el tercer decimal: se redondea hacia el centavo par
+        casos = [
+            ('1.25', Decimal('0.00')), ('3.75', Decimal('0.02')), ('6.25', Decimal('0.02')), ('8.75', Decimal('0.04')),
+            ('1000', Decimal('4.00')),
+        ]
+        for valor, impuesto in casos:
+            with self.subTest(valor=valor):
+                self.assertEqual(tabla.calcular(valor, True, fecha), (impuesto, Decimal(valor) + impuesto))
+
+        with override_settings(CUATRO_POR_MIL_REDONDEO='ROUND_HALF_UP'):
+            self.assertEqual(TablaTarifas().calcular('6.25', True, fecha)[0], Decimal('0.03'))
+
+    def test_tarjeta_exenta(self):
+        self.assertEqual(TablaTarifas().calcular('1000.00', False, date(2025, 3, 1)), (Decimal('0.00'), Decimal('1000.00')))
+        self.assertFalse(aplica('0'))
+        self.assertTrue(aplica(Tarjeta(cuatro_por_mil='1')))
+
+    def test_calcular_lote(self):
+        movimientos = [
+            ('100.00', '1', date(2025, 3, 1)),
+            ('100.00', '0', date(2025, 3, 1)),
+            ('100.00', '1', date(2025, 8, 1)),
+            ('6.25', '1', date(2025, 3, 1)),
+        ]
+        with mock.patch.object(cuatro_por_mil, 'bisect_right', wraps=cuatro_por_mil.bisect_right) as busqueda:
+            resultado = calcular_lote(movimientos)
+
+        self.assertEqual(resultado, [
+            (Decimal('0.40'), Decimal('100.40')),
+            (Decimal('0.00'), Decimal('100.00')),
+            (Decimal('0.50'), Decimal('100.50')),
+            (Decimal('0.02'), Decimal('6.27')),
+        ])
+        # Una búsqueda por día distinto con gravamen, no por movimiento
+        self.assertEqual(busqueda.call_count, 2)
+
+
+@override_settings(REFERENCE_CACHE_LOCAL_TTL=0)
+class RecalcularCuatroPorMilTest(TestCase):
+    """recalcular_cuatro_por_mil reescribe total y ajusta los resúmenes diarios sin tocar meses cerrados"""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create(username='contador', email='contador@example.com')
+        self.cliente = Cliente.objects.create(nombre='Cliente')
+        self.tarjeta = Tarjeta.objects.create(numero='1234', titular='Titular', descripcion='Tarjeta')
+        # Movimientos guardados con la tarjeta exenta; luego la tarjeta pasa a pagar el gravamen
+        self.recepcion = self.crear(RecepcionPago, DIA_1)
+        self.devolucion = self.crear(Devolucion, DIA_2)
+        self.borrada = self.crear(RecepcionPago, DIA_2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.borrada.soft_delete()
+        self.tarjeta.cuatro_por_mil = '1'
+        self.tarjeta.save()
+
+    def crear(self, model, dia):
+        with self.captureOnCommitCallbacks(execute=True):
+            return model.objects.create(
+                usuario=self.usuario, cliente=self.cliente, tarjeta=self.tarjeta,
+                valor=Decimal('1000.00'), total=Decimal('1000.00'), fecha=a_las_doce(dia),
+            )
+
+    def recalcular(self, *args):
+        salida = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('recalcular_cuatro_por_mil', *args, stdout=salida)
+        return salida.getvalue()
+
+    def resumen(self, dia):
+        return TarjetaMovimientoDiario.objects.get(tarjeta=self.tarjeta, fecha=dia)
+
+    def test_reescribe_total_y_ajusta_resumenes(self):
+        saldo = ClienteSaldo.objects.values().get(cliente=self.cliente)
+
+        salida = self.recalcular()
+
+        self.assertIn('3 movimientos revisados, 3 con diferencias', salida)
+        for movimiento in (self.recepcion, self.devolucion, self.borrada):
+            movimiento.refresh_from_db()
+            self.assertEqual((movimiento.cuatro_por_mil, movimiento.total), (Decimal('4.00'), Decimal('1004.00')))
+        self.assertEqual(self.resumen(DIA_1).total_recepciones, Decimal('1004.00'))
+        self.assertEqual(self.resumen(DIA_2).total_devoluciones, Decimal('1004.00'))
+        # La recepción borrada no está en el resumen: su cambio no lo mueve
+        self.assertEqual(self.resumen(DIA_2).total_recepciones, Decimal('0.00'))
+        call_command('recalcular_movimientos_tarjetas', '--check', stdout=StringIO())
+
+        # El saldo del cliente se calcula sobre valor, que no cambia
+        self.assertEqual(ClienteSaldo.objects.values().get(cliente=self.cliente), saldo)
+        call_command('recalcular_saldos', '--check', stdout=StringIO())
+
+        ultimo = self.recepcion.history.first()
+        self.assertEqual((ultimo.history_type, ultimo.history_change_reason), ('~', 'Recálculo 4x1000'))
+
+        # Una segunda pasada ya no encuentra diferencias
+        self.assertIn('0 con diferencias', self.recalcular('--check'))
+
+    def test_check_no_escribe(self):
+        with self.assertRaises(CommandError):
+            self.recalcular('--check')
+        self.recepcion.refresh_from_db()
+        self.assertEqual(self.recepcion.total, Decimal('1000.00'))
+        self.assertEqual(self.resumen(DIA_1).total_recepciones, Decimal('1000.00'))
+
+    def test_meses_cerrados_no_se_modifican(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cerrar_mes(DIA_1, self.usuario)
+        cerrado = self.resumen(DIA_1).total_recepciones
+
+        salida = self.recalcular()
+
+        self.assertIn('(3 en meses cerrados sin modificar)', salida)
+        self.recepcion.refresh_from_db()
+        self.assertEqual(self.recepcion.total, Decimal('1000.00'))
+        self.assertEqual(self.resumen(DIA_1).total_recepciones, cerrado)
+
+    def test_filtros(self):
+        otra = Tarjeta.objects.create(numero='5678', titular='Titular', descripcion='Otra', cuatro_por_mil='1')
+        self.assertIn('0 movimientos revisados', self.recalcular('--tarjeta', str(otra.id)))
+        self.assertIn('2 movimientos revisados', self.recalcular('--desde', DIA_2.isoformat(), '--chunk-size', '1'))
+        self.recepcion.refresh_from_db()
+        self.assertEqual(self.recepcion.total, Decimal('1000.00'))
+
+        with self.assertRaises(CommandError):
+            self.recalcular('--desde', '10/01/2024')
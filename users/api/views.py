@@ -7,6 +7,7 @@ from django.shortcuts import get_object_or_404
 from django.contrib.auth.hashers import make_password
 from django.db import DatabaseError
 from users.models import User
+from reportes.cierres import PeriodoCerrado
 from .permissions import RolePermission
 
 from django.db.models import Q # Importar Q para búsquedas complejas
@@ -293,6 +294,9 @@ def delete_user(request, pk):
             {"message": "User deleted successfully"},
             status=status.HTTP_204_NO_CONTENT
         )
+    except PeriodoCerrado as e:
+        # Los movimientos que registró se borran en cascada
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error deleting user: {str(e)}"},
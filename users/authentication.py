@@ -0,0 +1,97 @@
+"""
+Autenticación JWT con el usuario en cache.
+
+JWTAuthentication consulta users_user en cada petición. Aquí los datos del
+usuario se guardan en el cache compartido por AUTH_USER_CACHE_TTL segundos,
+bajo una clave que incluye una versión por usuario. invalidar_usuario_cache()
+sube la versión: las peticiones siguientes van a la base de datos y una
+petición concurrente que guarde el usuario leído antes del cambio lo deja
+bajo la versión anterior, que ya nadie consulta.
+
+Solo se cachean los campos de CAMPOS_CACHE, nunca el hash de la contraseña
+(con CHECK_REVOKE_TOKEN se guarda el md5 que compara simplejwt). El usuario
+se arma con from_db() y el resto de campos quedan diferidos: si alguna vista
+los lee, Django los trae de la base de datos.
+
+La versión se sube en post_save / post_delete del modelo de usuario (después
+del commit), así cualquier cambio invalida: vistas, admin, shell o comandos.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+# Lo que usan las peticiones autenticadas: permisos por rol, is_active y nombres
+CAMPOS_CACHE = ('id', 'username', 'email', 'first_name', 'last_name', 'role', 'is_active', 'is_staff', 'is_superuser')
+
+
+def version_key(user_id):
+    return f'auth_user_version:{user_id}'
+
+
+def user_cache_key(user_id):
+    version = cache.get(version_key(user_id), 0)
+    return f'auth_user:{user_id}:{version}'
+
+
+def invalidar_usuario_cache(user_id):
+    """Descarta el usuario cacheado"""
+    try:
+        cache.incr(version_key(user_id))
+    except ValueError:
+        cache.set(version_key(user_id), 1, None)
+
+
+def invalidar_usuario(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidar_usuario_cache(user_id))
+
+
+def connect_auth_signals():
+    model = get_user_model()
+    post_save.connect(invalidar_usuario, sender=model, dispatch_uid='auth_user_cache_save')
+    post_delete.connect(invalidar_usuario, sender=model, dispatch_uid='auth_user_cache_delete')
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication que resuelve el usuario desde el cache"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        key = user_cache_key(user_id)
+        datos = cache.get(key)
+        if datos is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            datos = {campo: getattr(user, campo) for campo in CAMPOS_CACHE}
+            if api_settings.CHECK_REVOKE_TOKEN:
+                datos['password_md5'] = get_md5_hash_password(user.password)
+            cache.set(key, datos, settings.AUTH_USER_CACHE_TTL)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not datos['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != datos.get('password_md5'):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        # from_db() espera los valores en el orden de los campos del modelo
+        campos = [f.attname for f in self.user_model._meta.concrete_fields if f.attname in CAMPOS_CACHE]
+        return self.user_model.from_db(
+            router.db_for_read(self.user_model), campos, [datos[campo] for campo in campos]
+        )
@@ -0,0 +1,140 @@
+"""
+Registro de usuarios en línea compartido entre workers, guardado en Redis.
+
+Estructura:
+- {presence}:users            HASH  user_id -> JSON con los datos del usuario
+- {presence}:conn:<user_id>   ZSET  channel_name -> timestamp de expiración
+
+Cada pestaña/conexión es un miembro del ZSET del usuario y se mantiene viva
+con los ping del cliente (heartbeat). Un usuario está en línea mientras
+tenga al menos una conexión sin expirar; las conexiones de un worker que
+murió sin ejecutar disconnect expiran solas y se limpian al listar. Un ping
+que llega después de esa limpieza vuelve a registrar la conexión y al usuario.
+
+La limpieza devuelve los usuarios que se quedaron sin conexiones para que el
+consumer envíe user_disconnected (si no, los demás clientes los seguirían
+viendo). Además de al listar, se barre con los ping: sweep() ejecuta la
+limpieza como mucho una vez por TTL entre todos los workers ({presence}:sweep
+con SET NX EX).
+
+Todas las claves comparten el hash tag {presence}: caen en el mismo slot de
+Redis Cluster y los scripts reciben en KEYS todas las claves que tocan.
+"""
+import json
+import time
+
+import redis.asyncio as redis
+from django.conf import settings
+
+USERS_KEY = '{presence}:users'
+CONN_PREFIX = '{presence}:conn:'
+SWEEP_KEY = '{presence}:sweep'
+
+# Registra la conexión; devuelve 1 si es la primera conexión viva del usuario
+JOIN_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[5])
+local primera = redis.call('ZCARD', KEYS[1]) == 0
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('HSET', KEYS[2], ARGV[3], ARGV[4])
+if primera then return 1 end
+return 0
+"""
+
+# Elimina la conexión; devuelve 1 si el usuario ya no tiene conexiones vivas
+LEAVE_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+if redis.call('ZCARD', KEYS[1]) == 0 then
+  redis.call('DEL', KEYS[1])
+  redis.call('HDEL', KEYS[2], ARGV[3])
+  return 1
+end
+return 0
+"""
+
+# Lista los usuarios con conexiones vivas y limpia los que ya no tienen.
+# KEYS[1] es el HASH de usuarios y KEYS[2..n] los ZSET de conexiones de los
+# usuarios ARGV[2..n]. Devuelve {datos de los vivos, user_id de los limpiados}
+LIST_SCRIPT = """
+local vivos = {}
+local expirados = {}
+for i = 2, #KEYS do
+  redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', ARGV[1])
+  if redis.call('ZCARD', KEYS[i]) == 0 then
+    if redis.call('HDEL', KEYS[1], ARGV[i]) == 1 then table.insert(expirados, ARGV[i]) end
+  else
+    local datos = redis.call('HGET', KEYS[1], ARGV[i])
+    if datos then table.insert(vivos, datos) end
+  end
+end
+return {vivos, expirados}
+"""
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.from_url(settings.PRESENCE_REDIS_URL, decode_responses=True)
+    return _client
+
+
+class PresenceRegistry:
+    """Operaciones de presencia; todas son atómicas (scripts Lua) y O(1) salvo users_list"""
+
+    def __init__(self, client=None, ttl=None):
+        self.client = client or get_client()
+        self.ttl = ttl or settings.PRESENCE_TTL
+        self._join = self.client.register_script(JOIN_SCRIPT)
+        self._leave = self.client.register_script(LEAVE_SCRIPT)
+        self._list = self.client.register_script(LIST_SCRIPT)
+
+    def conn_key(self, user_id):
+        return f'{CONN_PREFIX}{user_id}'
+
+    async def join(self, user_id, channel_name, user_data):
+        """Registra la conexión; devuelve True si es la primera conexión viva del usuario"""
+        now = time.time()
+        primera = await self._join(
+            keys=[self.conn_key(user_id), USERS_KEY],
+            args=[channel_name, now + self.ttl, user_id, json.dumps(user_data), now, self.ttl * 2],
+        )
+        return bool(primera)
+
+    async def heartbeat(self, user_id, channel_name, user_data):
+        """
+        Extiende la expiración de la conexión. Si ya había expirado y se limpió
+        (ping tardío), la vuelve a registrar junto con el usuario; en ese caso
+        devuelve True, igual que join().
+        """
+        return await self.join(user_id, channel_name, user_data)
+
+    async def leave(self, user_id, channel_name):
+        ultima = await self._leave(
+            keys=[self.conn_key(user_id), USERS_KEY],
+            args=[channel_name, time.time(), user_id],
+        )
+        return bool(ultima)
+
+    async def users_list(self):
+        """
+        Usuarios en línea. Devuelve (usuarios, expirados): expirados son los
+        user_id que se limpiaron porque todas sus conexiones vencieron.
+        """
+        user_ids = await self.client.hkeys(USERS_KEY)
+        if not user_ids:
+            return [], []
+        usuarios, expirados = await self._list(
+            keys=[USERS_KEY, *(self.conn_key(user_id) for user_id in user_ids)],
+            args=[time.time(), *user_ids],
+        )
+        return [json.loads(u) for u in usuarios], list(expirados)
+
+    async def sweep(self):
+        """Limpia los usuarios expirados como mucho una vez por TTL (entre todos los workers); devuelve sus user_id"""
+        if not await self.client.set(SWEEP_KEY, '1', nx=True, ex=self.ttl):
+            return []
+        _, expirados = await self.users_list()
+        return expirados
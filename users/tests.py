@@ -1,3 +1,264 @@
-from django.test import TestCase
+import json
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from channels.layers import channel_layers
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import DEFAULTS, IMPORT_STRINGS, APISettings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import presence
+from .authentication import CAMPOS_CACHE, CachedJWTAuthentication, user_cache_key
+from .consumers import PresenceConsumer
+from .models import User
+from .presence import PresenceRegistry
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+TTL = 30
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    """El usuario autenticado se lee del cache sin datos sensibles y se invalida con cualquier cambio"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='ana', email='ana@example.com', password='secreta', role='vendedor',
+            first_name='Ana', last_name='Gómez',
+        )
+        self.token = AccessToken.for_user(self.user)
+        self.auth = CachedJWTAuthentication()
+
+    def autenticar(self):
+        return self.auth.get_user(self.token)
+
+    def guardar(self, **campos):
+        with self.captureOnCommitCallbacks(execute=True):
+            for campo, valor in campos.items():
+                setattr(self.user, campo, valor)
+            self.user.save()
+
+    def test_segunda_peticion_sale_del_cache(self):
+        with self.assertNumQueries(1):
+            self.autenticar()
+        with self.assertNumQueries(0):
+            user = self.autenticar()
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual((user.role, user.first_name, user.email), ('vendedor', 'Ana', 'ana@example.com'))
+        self.assertTrue(user.is_authenticated)
+
+    def test_el_cache_no_guarda_la_contrasena(self):
+        self.autenticar()
+        datos = cache.get(user_cache_key(self.user.pk))
+        self.assertEqual(set(datos), set(CAMPOS_CACHE))
+        self.assertNotIn(self.user.password, datos.values())
+
+    def test_revocacion_por_cambio_de_contrasena(self):
+        # api_settings de simplejwt se importa por nombre: override_settings no llega a estos módulos
+        revocable = APISettings({'CHECK_REVOKE_TOKEN': True}, DEFAULTS, IMPORT_STRINGS)
+        for modulo in ('users.authentication', 'rest_framework_simplejwt.tokens'):
+            patcher = mock.patch(f'{modulo}.api_settings', revocable)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.token = AccessToken.for_user(self.user)
+
+        self.autenticar()
+        self.assertNotIn(self.user.password, cache.get(user_cache_key(self.user.pk)).values())
+
+        self.user.set_password('otra')
+        self.guardar()
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticar()
+
+    def test_cambio_de_rol_fuera_de_las_vistas_invalida(self):
+        self.autenticar()
+        self.guardar(role='contador')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.autenticar().role, 'contador')
+
+    def test_usuario_desactivado_o_eliminado(self):
+        self.autenticar()
+        self.guardar(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticar()
+        # También desde el cache
+        with self.assertNumQueries(0), self.assertRaises(AuthenticationFailed):
+            self.autenticar()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticar()
+
+    def test_peticion_con_bearer(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        response = client.get('/api/user/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['role'], 'vendedor')
+        self.assertEqual(response.data['date_joined'], self.user.date_joined)
+
+        # Sin permiso por rol: la lista de usuarios es solo para admin
+        self.assertEqual(client.get('/api/user/list/').status_code, 403)
+        self.guardar(role='admin')
+        self.assertEqual(client.get('/api/user/list/').status_code, 200)
+
+
+class Reloj:
+    """Reemplaza time.time() dentro de users.presence (solo ahí: Redis sigue con su propio reloj)"""
+
+    def __init__(self, inicio=1000.0):
+        self.ahora = inicio
+
+    def __call__(self):
+        return self.ahora
+
+    def avanzar(self, segundos):
+        self.ahora += segundos
+
+
+@skipUnless(fakeredis, 'requiere fakeredis[lua]')
+class PresenceRegistryTest(SimpleTestCase):
+    """Conexiones por usuario en Redis: join, leave, heartbeat y expiración"""
+
+    def setUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        self.registry = PresenceRegistry(client=self.redis, ttl=TTL)
+        self.reloj = Reloj()
+        patcher = mock.patch.object(presence, 'time', mock.Mock(time=self.reloj))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def en_linea(self):
+        usuarios, _ = await self.registry.users_list()
+        return sorted(u['id'] for u in usuarios)
+
+    async def test_join_avisa_solo_la_primera_conexion(self):
+        self.assertTrue(await self.registry.join('1', 'pestana-a', {'id': '1'}))
+        self.assertFalse(await self.registry.join('1', 'pestana-b', {'id': '1'}))
+        self.assertTrue(await self.registry.join('2', 'pestana-c', {'id': '2'}))
+        self.assertEqual(await self.en_linea(), ['1', '2'])
+
+    async def test_leave_avisa_solo_la_ultima_conexion(self):
+        await self.registry.join('1', 'pestana-a', {'id': '1'})
+        await self.registry.join('1', 'pestana-b', {'id': '1'})
+
+        self.assertFalse(await self.registry.leave('1', 'pestana-a'))
+        self.assertEqual(await self.en_linea(), ['1'])
+        self.assertTrue(await self.registry.leave('1', 'pestana-b'))
+        self.assertEqual(await self.en_linea(), [])
+        self.assertEqual(await self.redis.keys('*'), [])
+
+    async def test_conexion_vencida_se_limpia_y_se_reporta(self):
+        await self.registry.join('1', 'pestana-a', {'id': '1'})
+        await self.registry.join('2', 'pestana-b', {'id': '2'})
+        self.reloj.avanzar(TTL - 1)
+        await self.registry.heartbeat('2', 'pestana-b', {'id': '2'})
+        self.reloj.avanzar(2)
+
+        usuarios, expirados = await self.registry.users_list()
+        self.assertEqual([u['id'] for u in usuarios], ['2'])
+        self.assertEqual(expirados, ['1'])
+        self.assertFalse(await self.redis.hexists(presence.USERS_KEY, '1'))
+
+        # Un segundo listado ya no lo reporta
+        self.assertEqual(await self.registry.users_list(), ([{'id': '2'}], []))
+
+    async def test_heartbeat_tardio_vuelve_a_registrar(self):
+        await self.registry.join('1', 'pestana-a', {'id': '1', 'name': 'Ana'})
+        self.assertFalse(await self.registry.heartbeat('1', 'pestana-a', {'id': '1', 'name': 'Ana'}))
+
+        self.reloj.avanzar(TTL + 1)
+        await self.registry.users_list()
+        self.assertEqual(await self.en_linea(), [])
+
+        self.assertTrue(await self.registry.heartbeat('1', 'pestana-a', {'id': '1', 'name': 'Ana'}))
+        usuarios, _ = await self.registry.users_list()
+        self.assertEqual(usuarios, [{'id': '1', 'name': 'Ana'}])
+
+    async def test_sweep_una_vez_por_ttl(self):
+        await self.registry.join('1', 'pestana-a', {'id': '1'})
+        await self.registry.join('2', 'pestana-b', {'id': '2'})
+        self.reloj.avanzar(TTL + 1)
+
+        self.assertEqual(sorted(await self.registry.sweep()), ['1', '2'])
+        await self.registry.join('3', 'pestana-c', {'id': '3'})
+        self.reloj.avanzar(TTL + 1)
+        # La marca {presence}:sweep sigue vigente (en Redis, no en el reloj simulado)
+        self.assertEqual(await self.registry.sweep(), [])
+
+        await self.redis.delete(presence.SWEEP_KEY)
+        self.assertEqual(await self.registry.sweep(), ['3'])
+
+
+@skipUnless(fakeredis, 'requiere fakeredis[lua]')
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class PresenceConsumerTest(SimpleTestCase):
+    """El consumer avisa a los demás cuando un usuario vence sin cerrar su conexión"""
+
+    def setUp(self):
+        channel_layers.backends.clear()
+        self.addCleanup(channel_layers.backends.clear)
+        self.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        self.reloj = Reloj()
+        for patcher in (
+            mock.patch.object(presence, 'time', mock.Mock(time=self.reloj)),
+            mock.patch('users.consumers.PresenceRegistry', lambda: PresenceRegistry(client=self.redis, ttl=TTL)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def conectar(self, user_id):
+        communicator = WebsocketCommunicator(PresenceConsumer.as_asgi(), '/ws/presence/')
+        conectado, _ = await communicator.connect()
+        self.assertTrue(conectado)
+        await communicator.send_to(text_data=json.dumps({'action': 'join', 'user_id': user_id, 'name': user_id}))
+        return communicator
+
+    async def recibir(self, communicator):
+        return json.loads(await communicator.receive_from())
+
+    async def mensajes(self, communicator):
+        recibidos = []
+        while not await communicator.receive_nothing(timeout=0.05):
+            recibidos.append(await self.recibir(communicator))
+        return recibidos
+
+    async def test_ping_barre_y_notifica_usuarios_vencidos(self):
+        fantasma = await self.conectar('1')
+        activo = await self.conectar('2')
+        await self.mensajes(fantasma)
+        await self.mensajes(activo)
+
+        # El worker de '1' murió sin disconnect: su conexión vence
+        self.reloj.avanzar(TTL + 1)
+        await activo.send_to(text_data=json.dumps({'action': 'ping'}))
+
+        recibidos = await self.mensajes(activo)
+        self.assertIn({'type': 'pong'}, recibidos)
+        self.assertIn({'type': 'user_disconnected', 'user_id': '1'}, recibidos)
+
+        await fantasma.disconnect()
+        await activo.disconnect()
+
+    async def test_join_notifica_los_vencidos_encontrados_al_listar(self):
+        fantasma = await self.conectar('1')
+        await self.mensajes(fantasma)
+        self.reloj.avanzar(TTL + 1)
+
+        nuevo = await self.conectar('2')
+        recibidos = await self.mensajes(nuevo)
+        lista = next(m for m in recibidos if m['type'] == 'users_list')
+        self.assertEqual([u['id'] for u in lista['users']], ['2'])
+        self.assertIn({'type': 'user_disconnected', 'user_id': '1'}, recibidos)
+
+        await fantasma.disconnect()
+        await nuevo.disconnect()
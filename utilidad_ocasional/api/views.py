@@ -5,22 +5,17 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from django.db import DatabaseError
-from django.db.models import Q
-from datetime import datetime
 from decimal import Decimal
 
 from ..models import UtilidadOcasional
 from tarjetas.models import Tarjeta
+from tarjetas.cuatro_por_mil import calcular_cuatro_por_mil
+from backend.history_diff import diff_historial
+from backend.listing import ListSpec, listar, campos, relacion, usuario_anidado
+from reportes.cierres import PeriodoCerrado
 from .permissions import RolePermission
 
 
-def calcular_cuatro_por_mil(valor, tarjeta):
-    """Calcula el cuatro por mil si la tarjeta lo tiene activo"""
-    if tarjeta.cuatro_por_mil == '1':
-        return (Decimal(valor) * Decimal('4')) / Decimal('1000')
-    return Decimal('0')
-
-
 def serialize_utilidad_ocasional(utilidad):
     """Convierte un objeto UtilidadOcasional a diccionario"""
     return {
@@ -82,7 +77,7 @@ def create_utilidad_ocasional(request):
             )
 
         valor = Decimal(request.data.get('valor'))
-        cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta)
+        cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta, request.data.get('fecha'))
         total = valor + cuatro_por_mil
 
         utilidad = UtilidadOcasional.objects.create(
@@ -97,6 +92,8 @@ def create_utilidad_ocasional(request):
 
         return Response(serialize_utilidad_ocasional(utilidad), status=status.HTTP_201_CREATED)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -109,105 +106,26 @@ def create_utilidad_ocasional(request):
         )
 
 
+LISTADO_UTILIDADES_OCASIONALES = ListSpec(
+    queryset=UtilidadOcasional.objects.select_related('usuario', 'tarjeta'),
+    serializer=serialize_utilidad_ocasional,
+    search_fields=('tarjeta__numero', 'tarjeta__titular', 'observacion'),
+    filters={'tarjeta': 'tarjeta_id', 'usuario': 'usuario_id'},
+    date_ranges=('fecha',),
+    fields=campos(
+        'id', 'valor', 'cuatro_por_mil', 'total', 'observacion', 'fecha', 'created_at', 'updated_at', 'deleted_at',
+        usuario=usuario_anidado('usuario'),
+        tarjeta=relacion('tarjeta', 'numero', 'titular', 'cuatro_por_mil'),
+    ),
+)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_utilidades_ocasionales(request):
     """Listar utilidades ocasionales con filtros y paginación"""
     try:
-        utilidades = UtilidadOcasional.objects.select_related(
-            'usuario', 'tarjeta'
-        ).all()
-
-        # Filtro de búsqueda
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            utilidades = utilidades.filter(
-                Q(tarjeta__numero__icontains=search_query) |
-                Q(tarjeta__titular__icontains=search_query) |
-                Q(observacion__icontains=search_query)
-            )
-
-        # Filtro por tarjeta
-        tarjeta_id = request.query_params.get('tarjeta', None)
-        if tarjeta_id:
-            utilidades = utilidades.filter(tarjeta_id=tarjeta_id)
-
-        # Filtro por usuario
-        usuario_id = request.query_params.get('usuario', None)
-        if usuario_id:
-            utilidades = utilidades.filter(usuario_id=usuario_id)
-
-        # Filtro por fecha
-        fecha_start = request.query_params.get('fecha_start', None)
-        fecha_end = request.query_params.get('fecha_end', None)
-
-        if fecha_start:
-            try:
-                start_date = datetime.strptime(fecha_start, '%Y-%m-%d').date()
-                utilidades = utilidades.filter(fecha__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_start debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if fecha_end:
-            try:
-                end_date = datetime.strptime(fecha_end, '%Y-%m-%d').date()
-                utilidades = utilidades.filter(fecha__lte=end_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de fecha_end debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro por fecha de creación
-        start_date_str = request.query_params.get('start_date', None)
-        end_date_str = request.query_params.get('end_date', None)
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                utilidades = utilidades.filter(created_at__gte=start_date)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de inicio debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date_inclusive = datetime.combine(end_date, datetime.max.time())
-                utilidades = utilidades.filter(created_at__lte=end_date_inclusive)
-            except ValueError:
-                return Response(
-                    {"error": "El formato de la fecha de fin debe ser YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-        # Filtro para incluir eliminados
-        include_deleted = request.query_params.get('include_deleted', None)
-        if include_deleted != '1':
-            utilidades = utilidades.filter(deleted_at__isnull=True)
-
-        # Ordenar
-        utilidades = utilidades.order_by('-created_at')
-
-        # Paginación
-        page_size_param = request.query_params.get('page_size', 10)
-        try:
-            page_size_int = int(page_size_param)
-        except (ValueError, TypeError):
-            page_size_int = 10
-
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size_int
-        paginated_utilidades = paginator.paginate_queryset(utilidades, request)
-
-        data = [serialize_utilidad_ocasional(u) for u in paginated_utilidades]
-        return paginator.get_paginated_response(data)
-
+        return listar(request, LISTADO_UTILIDADES_OCASIONALES)
     except Exception as e:
         return Response(
             {"error": f"Error al obtener utilidades ocasionales: {str(e)}"},
@@ -262,16 +180,18 @@ def update_utilidad_ocasional(request, pk):
         utilidad.observacion = request.data.get('observacion', utilidad.observacion)
         utilidad.fecha = request.data.get('fecha', utilidad.fecha)
 
-        # Recalcular cuatro_por_mil y total si cambió valor o tarjeta
-        if 'valor' in request.data or 'tarjeta' in request.data:
+        # Recalcular cuatro_por_mil y total si cambió valor, tarjeta o fecha (la tasa depende de la fecha)
+        if 'valor' in request.data or 'tarjeta' in request.data or 'fecha' in request.data:
             valor = Decimal(utilidad.valor)
-            utilidad.cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta)
+            utilidad.cuatro_por_mil = calcular_cuatro_por_mil(valor, tarjeta, utilidad.fecha)
             utilidad.total = valor + utilidad.cuatro_por_mil
 
         utilidad.save()
 
         return Response(serialize_utilidad_ocasional(utilidad), status=status.HTTP_200_OK)
 
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except DatabaseError as e:
         return Response(
             {"error": f"Error de base de datos: {str(e)}"},
@@ -295,6 +215,8 @@ def delete_utilidad_ocasional(request, pk):
             {"message": "Utilidad ocasional eliminada correctamente"},
             status=status.HTTP_200_OK
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar utilidad ocasional: {str(e)}"},
@@ -315,6 +237,8 @@ def restore_utilidad_ocasional(request, pk):
             )
         utilidad.restore()
         return Response(serialize_utilidad_ocasional(utilidad), status=status.HTTP_200_OK)
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al restaurar utilidad ocasional: {str(e)}"},
@@ -333,6 +257,8 @@ def hard_delete_utilidad_ocasional(request, pk):
             {"message": "Utilidad ocasional eliminada permanentemente"},
             status=status.HTTP_204_NO_CONTENT
         )
+    except PeriodoCerrado as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error al eliminar utilidad ocasional: {str(e)}"},
@@ -346,7 +272,7 @@ def utilidad_ocasional_history(request, pk):
     """Obtener el historial de cambios de una utilidad ocasional"""
     try:
         utilidad = get_object_or_404(UtilidadOcasional.objects, pk=pk)
-        history = utilidad.history.all()
+        history = utilidad.history.select_related('history_user')
 
         # Paginación
         page_size_param = request.query_params.get('page_size', 10)
@@ -359,6 +285,10 @@ def utilidad_ocasional_history(request, pk):
         paginator.page_size = page_size_int
         paginated_history = paginator.paginate_queryset(history, request)
 
+        # ?diff=1: solo los campos que cambiaron respecto al registro anterior
+        if request.query_params.get('diff') == '1':
+            return paginator.get_paginated_response(diff_historial(paginated_history, history))
+
         data = []
         for h in paginated_history:
             data.append({
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utilidad_ocasional', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='utilidadocasional',
+            index=models.Index(fields=['deleted_at', 'created_at'], name='utilidad_del_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='utilidadocasional',
+            index=models.Index(fields=['tarjeta', 'deleted_at', 'fecha'], name='utilidad_tar_del_fecha_idx'),
+        ),
+    ]
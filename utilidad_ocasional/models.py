@@ -2,9 +2,10 @@ from django.db import models
 from django.conf import settings
 from tarjetas.models import Tarjeta
 from simple_history.models import HistoricalRecords
+from backend.atomic import GuardadoAtomico
 
 
-class UtilidadOcasional(models.Model):
+class UtilidadOcasional(GuardadoAtomico, models.Model):
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -35,6 +36,10 @@ class UtilidadOcasional(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Utilidad Ocasional'
         verbose_name_plural = 'Utilidades Ocasionales'
+        indexes = [
+            models.Index(fields=['deleted_at', 'created_at'], name='utilidad_del_created_idx'),
+            models.Index(fields=['tarjeta', 'deleted_at', 'fecha'], name='utilidad_tar_del_fecha_idx'),
+        ]
 
     def __str__(self):
         return f'UtilidadOcasional {self.id} - Tarjeta: {self.tarjeta} - Valor: {self.valor}'
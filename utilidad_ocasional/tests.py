@@ -1,3 +1,27 @@
+from datetime import datetime
+
 from django.test import TestCase
+from django.utils import timezone
+
+from .models import UtilidadOcasional
+
+
+class UtilidadOcasionalIndexesTest(TestCase):
+    """Verifica con EXPLAIN que los filtros comunes del listado usan los índices compuestos"""
+
+    def setUp(self):
+        self.fecha_start = timezone.make_aware(datetime(2024, 1, 1))
+        self.fecha_end = timezone.make_aware(datetime(2024, 1, 31, 23, 59, 59))
+
+    def test_listado_activos_usa_indice_deleted_created(self):
+        plan = UtilidadOcasional.objects.filter(deleted_at__isnull=True).order_by('-created_at').explain()
+        self.assertIn('utilidad_del_created_idx', plan)
 
-# Create your tests here.
+    def test_filtro_tarjeta_fecha_usa_indice_tarjeta(self):
+        plan = UtilidadOcasional.objects.filter(
+            tarjeta_id=1,
+            deleted_at__isnull=True,
+            fecha__gte=self.fecha_start,
+            fecha__lte=self.fecha_end,
+        ).explain()
+        self.assertIn('utilidad_tar_del_fecha_idx', plan)